@@ -4,13 +4,15 @@
 
 # Import general libraries
 import pandas as pd
-import numpy as np
-import random
 import time
 import re
 from multiprocessing import Pool  
+from multiprocessing import Process
 from multiprocessing import cpu_count
 import os
+import sys
+import argparse
+from functools import partial
 
 # Import BeautifulSoup for webscraping
 from bs4 import BeautifulSoup
@@ -20,16 +22,122 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# Import the asyncio fetch engine (single event loop and shared connection pool)
+from fetch_engine import scrape_all, crawl_frontier
+
+# Import the shared per-host rate limiter
+from rate_limiter import RateLimiter, SharedRateLimiter, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR, DEFAULT_STATUS_FORCELIST, RETRY_AFTER_STATUSES, backoff_time
+
+# Import the crawl metrics (request latencies, retries, bytes, parse times and worker utilization)
+from crawl_metrics import CrawlMetrics
+
+# Import the on-disk progress journal used to resume interrupted crawls
+from crawl_journal import CrawlJournal
+
+# Import the url frontier (deduplicated, persisted links; index pages crawled alongside the movie pages)
+from url_frontier import UrlFrontier, crawl_with_pool, INDEX, PAGE
+
+# Import the SQLite work queue that leases pages to any number of worker processes
+from work_queue import WorkQueue, run_worker, worker_name, DONE
+
+# Import the single-pass lxml movie page parser and the name helpers it shares with the BeautifulSoup functions
+from mojo_parser import parse_movie_html_with_credits, combine_jrs, remove_titles_from_list
+
+# Import the person dictionary and movie-person-role table every credit of a movie page is saved to
+from people_store import CreditTable, row_credits
+
+# Import the raw html cache so pages can be reparsed without crawling again
+from page_cache import PageCache, reparse_from_cache, NOT_MODIFIED, conditional_headers, is_unchanged
+
+# Import the streaming row sink and the fixed schema of the Box Office Mojo dataset
+from row_sink import RowSink
+from movie_store import MOJO_COLUMNS, MOJO_SCHEMA
+
+# Import the vectorized money, runtime and date conversions
+from normalize import parse_money, parse_runtime, parse_date, MOJO_DATE_FORMAT
+
 ############################################################
 # STEP 2: DEFINE ALL FUNCTIONS NEEDED
 ############################################################
 
+# Rate limiter, page cache and metrics shared by every worker process. Set through `init_worker` when the pool starts.
+rate_limiter = None
+page_cache = None
+metrics = None
+
+# Pool initializer so every worker process draws from the same token buckets, stores pages in the same cache
+# and records into the same metrics
+def init_worker(shared_rate_limiter, shared_page_cache=None, shared_metrics=None):
+    global rate_limiter, page_cache, metrics
+    rate_limiter = shared_rate_limiter
+    page_cache = shared_page_cache
+    metrics = shared_metrics
+
+# Fall back to a one request per second limiter (the old `time.sleep(1)` pace) when none was shared
+def get_rate_limiter():
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(requests_per_second=1.0, burst=1)
+    return rate_limiter
+
+# Metrics that are only kept by this process when none were shared
+def get_metrics():
+    global metrics
+    if metrics is None:
+        metrics = CrawlMetrics()
+    return metrics
+
+# Wait for a token, fetch a url, report the response back to the rate limiter and store the raw page in the cache.
+# Connection errors, `status_forcelist` and `RETRY_AFTER_STATUSES` responses are retried here with the schedule of
+# `fetch_engine.fetch_text`, and every attempt waits for its own token and reports its own response (or its failure).
+# After the last attempt the error is raised, like the urllib3 retries used to.
+# The time of the request (all attempts, without the waits for a token), its size and its retries are recorded in the metrics
+def polite_get(url, headers=None, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, status_forcelist=DEFAULT_STATUS_FORCELIST):
+    limiter = get_rate_limiter()
+    session = requests_retry_session(retries=0)
+    elapsed = 0
+
+    for attempt in range(retries + 1):
+        time.sleep(backoff_time(attempt, backoff_factor))
+        limiter.wait(url)
+
+        t0 = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers)
+        except requests.RequestException:
+            elapsed += time.perf_counter() - t0
+            limiter.report(url, None)
+
+            if attempt < retries:
+                continue
+            get_metrics().observe_request(url, elapsed, retries=attempt, failed=True)
+            raise
+
+        elapsed += time.perf_counter() - t0
+        limiter.report(url, response.status_code, response.headers)
+
+        if response.status_code not in status_forcelist and response.status_code not in RETRY_AFTER_STATUSES:
+            break
+
+        if attempt == retries:
+            get_metrics().observe_request(url, elapsed, len(response.content), attempt, failed=True)
+            raise requests.exceptions.RetryError("{} answered {} after {} attempts".format(url, response.status_code, attempt + 1), response=response)
+
+    get_metrics().observe_request(url, elapsed, len(response.content), attempt, response.status_code >= 400)
+
+    # A 304 response has no body, the cache keeps the copy it already has
+    if page_cache is not None and response.status_code != 304:
+        response.digest = page_cache.put(url, response.text, response.status_code, response.headers)
+
+    return response
+
 # Use a custom wrapper to allow fetching with retries if failures happen
 # https://www.peterbe.com/plog/best-practice-with-retries-with-requests
+# Responses are never retried here, not even with a `Retry-After` header: `polite_get` retries them through the rate limiter,
+# so urllib3 never sends a request or sleeps without the shared limiter knowing.
 def requests_retry_session(
     retries=3,
     backoff_factor=0.3,
-    status_forcelist=(500, 502, 504),
     session=None,
 ):
     session = session or requests.Session()
@@ -37,8 +145,9 @@ def requests_retry_session(
         total=retries,
         read=retries,
         connect=retries,
+        status=0,
         backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
+        respect_retry_after_header=False,
     )
     adapter = HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
@@ -46,6 +155,9 @@ def requests_retry_session(
     return session
 
 
+# Columns of the rows returned by `parse_movie_page`
+MOVIE_DATA_COLUMNS = MOJO_COLUMNS
+
 # BeautifulSoup helper functions
 def find_profession(soup_instance, profession_type_regex, how_many):
     # Create a list for how many results to find
@@ -80,39 +192,6 @@ def find_profession(soup_instance, profession_type_regex, how_many):
     else:
         return results_list
 
-def combine_jrs(names_list):
-    new_list = []
-    temp_name = ""
-    
-    for i in range(len(names_list)):
-        if names_list[i] != " Jr.":
-            
-            if temp_name == "":
-                temp_name = names_list[i]
-            else:
-                new_list.append(temp_name)
-                temp_name = names_list[i]
-                
-            if i == len(names_list) - 1:
-                new_list.append(temp_name)
-                
-        elif names_list[i] == " Jr.":
-            temp_name = "{},{}".format(temp_name, names_list[i])
-            new_list.append(temp_name)
-            temp_name = ""
-            
-    return new_list
-
-def remove_titles_from_list(names_list):
-    new_list = []
-    
-    for name in names_list:
-        if re.search(r"^\(.+\)$", name, re.IGNORECASE):
-            continue
-        else:
-            new_list.append(name)
-    return new_list
-
 def find_box_office(soup_instance, box_office_type):
     box_office = soup_instance.find("div", {"class": "mp_box_content"})
     
@@ -196,26 +275,29 @@ def find_items_by_bold_tag(soup_instance):
     
     return [title, adjusted_domestic_gross_2019, distributor, release_date, genres, runtime, rating, production_budget]
 
-# Function to scrape a url and extract all movie data from it
-def scrapeWebsite(url):
-    try:
-        # Fix an encoding error with these movies' urls
-        if "elizabeth" in url and "elizabethtown" not in url:
-            url="http://www.boxofficemojo.com/movies/?id=elizabeth%A0.htm&adjust_yr=2019&p=.htm"
+# Fix an encoding error with these movies' urls
+def fix_movie_url(url):
+    if "elizabeth" in url and "elizabethtown" not in url:
+        url="http://www.boxofficemojo.com/movies/?id=elizabeth%A0.htm&adjust_yr=2019&p=.htm"
 
-        if "simpleplan" in url:
-            url="http://www.boxofficemojo.com/movies/?id=simpleplan%A0.htm&adjust_yr=2019&p=.htm"
+    if "simpleplan" in url:
+        url="http://www.boxofficemojo.com/movies/?id=simpleplan%A0.htm&adjust_yr=2019&p=.htm"
 
-        # Fetch the movie page
-        try:
-            response = requests_retry_session().get(url)
-        except Exception:
-            return 0
+    return url
 
-        soup = BeautifulSoup(response.text, "html.parser")
+# Function to extract all movie data from the html of a movie page
+# Kept separate from fetching so the async engine can run it in a CPU worker pool
+# Uses the single-pass lxml parser; `parse_movie_page_soup` is the original BeautifulSoup version
+# The row is the 31 columns followed by the list of every credit on the page, which goes to the credit table
+def parse_movie_page(html):
+    return parse_movie_html_with_credits(html)
 
-        # Sleep to prevent fetching too many pages at once
-        time.sleep(1)
+# Function to extract all movie data from the html of a movie page with BeautifulSoup
+# Walks the soup once per field; kept as the reference implementation for the single-pass parser
+# `parser` is the BeautifulSoup tree builder ("html.parser" or "lxml")
+def parse_movie_page_soup(html, parser="html.parser"):
+    try:
+        soup = BeautifulSoup(html, parser)
 
         try:
             director1, director2 = find_profession(soup, "Director&", 2)
@@ -272,190 +354,386 @@ def scrapeWebsite(url):
     
     return [title, distributor, runtime, rating, release_date, genres, domestic_gross, foreign_gross, worldwide_gross, adjusted_domestic_gross_2019, production_budget, director1, director2, writer1, writer2, writer3, actor1, actor2, actor3, actor4, actor5, actor6, producer1, producer2, producer3, producer4, producer5, producer6, cinematographer, composer1, composer2]
 
-# Function to convert runtime from `1 hrs. 30min.` format to an integer of total minutes
-def convert_runtime_to_integer(runtime):
-    if pd.isna(runtime):
-        return np.nan
-    
-    if "hrs." not in runtime:
-        return np.nan
-    
-    runtime_split = runtime.split(" ")
-    
-    hrs = int(runtime_split[0]) * 60
-    mins = int(runtime_split[2])
-    
-    return hrs + mins 
+# Function to scrape a url and extract all movie data from it
+def scrapeWebsite(url):
+    url = fix_movie_url(url)
+
+    with get_metrics().task():
+        # Fetch the movie page (the rate limiter spaces out requests across all workers)
+        try:
+            response = polite_get(url)
+        except Exception:
+            return 0
+
+        return get_metrics().parse(parse_movie_page, response.text)
+
+# Function to refresh a movie page that was scraped before
+# Sends a conditional GET with the cached ETag/Last-Modified and returns NOT_MODIFIED instead of parsing
+# when the server answers 304 or the page's content hash has not changed
+def refreshWebsite(url):
+    url = fix_movie_url(url)
+    previous = page_cache.latest(url)
+
+    with get_metrics().task():
+        try:
+            response = polite_get(url, headers=conditional_headers(previous))
+        except Exception:
+            return 0
+
+        if response.status_code == 304 or is_unchanged(previous, response.digest):
+            return NOT_MODIFIED
+
+        return get_metrics().parse(parse_movie_page, response.text)
 
-# Function to clear the console between print statements
-def clear():
-    os.system("cls")
+# Start page of the alphabetical index, which links to every letter page
+ALPHABETICAL_URL = "https://www.boxofficemojo.com/movies/alphabetical.htm"
+
+# Added to every movie link to adjust all dollar amounts to year 2019 for analysis purposes
+ADJUST_2019 = "&adjust_yr=2019&p=.htm"
+
+# Links on a page of the alphabetical index, as (url, kind) pairs for the url frontier:
+# the letter pages (e.g. A, B, C, #), the other pages of this letter (e.g. A-Ab, Ac-Ad) and the movie pages
+# Duplicates (e.g. the second navbar with the same letters) are left to the frontier
+def index_page_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+
+    for link in soup.findAll("a", href=re.compile("letter=")):
+        # Other pages for this letter are in the `alpha-nav-holder` navbar
+        if link.find_parent("div", "alpha-nav-holder") is not None:
+            links.append(("https://www.boxofficemojo.com{}{}".format(link["href"], ADJUST_2019), INDEX))
+        else:
+            links.append(("https://www.boxofficemojo.com{}".format(link["href"]), INDEX))
+
+    # Movie links are within <tr> tags
+    for tr in soup.findAll("tr"):
+        for link in tr.findAll("a", href=re.compile("id=")):
+            links.append(("https://boxofficemojo.com{}{}".format(link["href"], ADJUST_2019), PAGE))
+
+    return links
+
+# Parse a page of the frontier crawl: returns (result, links)
+# An index page's result is the number of links on it (0, a failure, if the layout has changed), a movie page's is its row
+def parse_mojo_page(kind, html):
+    if kind == INDEX:
+        links = index_page_links(html)
+        return len(links), links
+
+    return parse_movie_page(html), []
+
+# Fetch and parse a page of the frontier crawl in a pool worker
+def scrapeFrontierPage(url, kind):
+    with get_metrics().task():
+        try:
+            response = polite_get(fix_movie_url(url))
+        except Exception:
+            return 0, []
+
+        return get_metrics().parse(partial(parse_mojo_page, kind), response.text)
+
+# Refresh a movie page for a queue crawl, returning (result, links) like `scrapeFrontierPage`
+def refreshFrontierPage(url, kind):
+    return refreshWebsite(url), []
+
+# Functions a work queue can be filled for. The name is stored in the queue, so workers that join later run the same one.
+QUEUE_FUNCTIONS = {"scrape": scrapeFrontierPage, "refresh": refreshFrontierPage}
+
+# Worker process of a queue crawl, drawing from the same token buckets and recording into the same metrics as the process that started it
+def queue_worker(queue, shared_rate_limiter, shared_page_cache=None, shared_metrics=None):
+    init_worker(shared_rate_limiter, shared_page_cache, shared_metrics)
+    run_worker(queue, QUEUE_FUNCTIONS[queue.option("function")])
+
+# Run `workers` queue workers on this machine until the queue is finished. Workers started elsewhere may be leasing from it too.
+def run_queue_workers(queue, workers):
+    processes = [Process(target=queue_worker, args=(queue, rate_limiter, page_cache, metrics)) for _ in range(workers)]
+
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+# Preliminary data cleanup -- converting appropriate data to numeric or datetime type
+# Works on any slice of the rows, so it can be applied to one batch at a time
+def format_movie_data(movie_data):
+    movie_data["domestic_gross_formatted"] = parse_money(movie_data["domestic_gross"])
+    movie_data["foreign_gross_formatted"] = parse_money(movie_data["foreign_gross"])
+    movie_data["worldwide_gross_formatted"] = parse_money(movie_data["worldwide_gross"])
+    movie_data["adjusted_domestic_gross_2019_formatted"] = parse_money(movie_data["adjusted_domestic_gross_2019"])
+
+    # movie_data["production_budget_formatted"] = parse_money(movie_data["production_budget"])
+
+    movie_data["release_date_formatted"] = parse_date(movie_data["release_date"], MOJO_DATE_FORMAT)
+
+    movie_data["runtime_formatted"] = parse_runtime(movie_data["runtime"])
+
+    return movie_data
 
 #############################################################
 # STEP 3: MAIN PROGRAM
 #############################################################
 
 if __name__ == "__main__":
-    # Initiate empty list to store all movie links
-    movie_links = []
+    parser = argparse.ArgumentParser(description="Scrape movie data from Box Office Mojo")
+    parser.add_argument("--fetch-mode", choices=["async", "pool", "queue"], default="async",
+                        help="async: one event loop and shared connection pool; pool: one process per request (original behaviour); "
+                             "queue: worker processes lease pages from --queue, and more can join with --join-queue")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Maximum number of movie page requests in flight when using the async fetch mode")
+    parser.add_argument("--requests-per-second", type=float, default=4.0,
+                        help="Sustained request rate allowed against boxofficemojo.com, shared by all workers")
+    parser.add_argument("--burst", type=int, default=8,
+                        help="Number of requests that may be sent back to back before the rate applies")
+    parser.add_argument("--journal", default="movie_data_journal.jsonl",
+                        help="Progress journal; urls already recorded as done are skipped when the crawl is restarted")
+    parser.add_argument("--refresh-links", action="store_true",
+                        help="Crawl the alphabetical index again to find the movies added since the last crawl")
+    parser.add_argument("--frontier", default="movie_links_frontier.jsonl",
+                        help="Every index and movie link found so far; known links are queued at once and only new ones are discovered")
+    parser.add_argument("--cache-dir", default="page_cache",
+                        help="Directory of the raw html page cache")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help="Don't store fetched pages in the page cache")
+    parser.add_argument("--reparse-from-cache", action="store_true",
+                        help="Don't crawl: rerun the extraction functions over the cached movie pages")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Refresh every movie page with conditional GETs and only reparse the pages that changed")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of rows formatted and written to the output files at a time")
+    parser.add_argument("--queue", default="movie_queue.sqlite",
+                        help="Work queue file of the queue fetch mode")
+    parser.add_argument("--workers", type=int, default=cpu_count() * 2,
+                        help="Number of worker processes this run starts in the queue fetch mode")
+    parser.add_argument("--lease-seconds", type=float, default=300,
+                        help="How long a queue worker may hold a page before it is handed to another worker")
+    parser.add_argument("--join-queue", action="store_true",
+                        help="Only add --workers workers to the unfinished crawl in --queue (from another terminal on the same machine) and exit when it is finished")
+    parser.add_argument("--people", default="people",
+                        help="Folder the person dictionary (people.arrow) and the movie-person-role table (credits.arrow) are written to")
+    parser.add_argument("--metrics",
+                        help="File the crawl metrics are written to at the end of the run (.json, or .prom for the Prometheus text format). "
+                             "Defaults to crawl_metrics.json, or crawl_metrics_<host>_<pid>.json for --join-queue")
+    args = parser.parse_args()
+
+    # Workers that join a crawl keep their own metrics instead of overwriting the ones of the run that started it
+    if args.metrics is None:
+        args.metrics = "crawl_metrics_{}.json".format(worker_name().replace(":", "_")) if args.join_queue else "crawl_metrics.json"
+
+    # One rate limiter for the whole crawl, shared with every worker process.
+    # A queue crawl keeps its buckets in the queue file, so the workers of every run that joins it share the same budget.
+    host_limits = {"boxofficemojo.com": (args.requests_per_second, args.burst)}
+    if args.fetch_mode == "queue" or args.join_queue:
+        rate_limiter = SharedRateLimiter(args.queue, host_limits, requests_per_second=args.requests_per_second, burst=args.burst)
+    else:
+        rate_limiter = RateLimiter(host_limits, requests_per_second=args.requests_per_second, burst=args.burst)
 
-    # Base url to find all movie pages from
-    url = "https://www.boxofficemojo.com/movies/alphabetical.htm"
+    # Request, parse, worker and stage metrics for the whole run, shared with every worker process like the rate limiter
+    metrics = CrawlMetrics(["boxofficemojo.com"])
 
-    try:
-        t0 = time.time()
-        response = requests_retry_session().get(url)
-    except Exception as e:
-        print("Initial URL fetch failed", e.__class__.__name__)
-    else:
-        print("Initial URL fetch eventually worked", response.status_code)
-    finally:
-        t1 = time.time()
-        print("Initial fetch took", t1 - t0, "seconds")
-        
-    soup = BeautifulSoup(response.text, "html.parser")
+    if (args.reparse_from_cache or args.incremental) and args.no_page_cache:
+        parser.error("--reparse-from-cache and --incremental need the page cache")
 
-    # Find links to all letters of the alphabet that movies can start with (e.g. A, B, C, #)
-    letters = soup.findAll("a", href=re.compile("letter="))
+    # Extra workers for a queue crawl started by another run: lease pages until the queue is finished, then exit.
+    # The pages go to the page cache of the run that started the crawl, so its `--reparse-from-cache` sees them.
+    if args.join_queue:
+        if not os.path.exists(args.queue):
+            parser.error("--join-queue needs the --queue file of a running crawl")
 
-    # Remove duplicates from second navbar with the same information
-    unique_letters = list(set(letters))
+        queue = WorkQueue(args.queue, args.lease_seconds)
+        cache_dir = queue.option("cache_dir")
+        page_cache = None if cache_dir is None else PageCache(cache_dir)
 
-    # Create a list to store the links to each individual letter
-    letters_list = []
+        run_queue_workers(queue, args.workers)
 
-    for letter in unique_letters:
-        letters_list.append("https://www.boxofficemojo.com{}".format(letter["href"]))
-        
-    for letter in letters_list:
-        print(letter)
-
-    # Save the list of letters links 
-    letters_list_df = pd.DataFrame({"letters_list": letters_list})
-    letters_list_df.to_csv("letters_list.csv", index=False)
-
-    # Now go through each letter and find all movies associated with it
-    for i in range(0,27):
-        current_url = letters_list[i]
-        time.sleep(1)
-        clear()
-        
-        try:
-            t0 = time.time()
-            response = requests_retry_session().get(current_url)
-        except Exception as e:
-            print("Fetching {} failed".format(current_url), e.__class__.__name__)
-        else:
-            print("Fetching {} eventually worked".format(current_url), response.status_code)
-        finally:
-            t1 = time.time()
-            print("Fetching {} took".format(current_url), t1 - t0, "seconds")
+        rate_limiter.print_stats()
+        metrics.print_summary()
+        metrics.write(args.metrics)
+        print("Metrics written to {}".format(args.metrics))
+        sys.exit(0)
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Find all movie links on this page (the links are within <tr> tags)
-        trs = soup.findAll("tr")
-        
-        # Append all movie links to the list and adjust all dollar amounts to year 2019 for analysis purposes    
-        for tr in trs:
-            found_links = tr.findAll("a", href=re.compile("id="))
-            for link in found_links:
-                movie_links.append("https://boxofficemojo.com{}{}".format(link["href"], "&adjust_yr=2019&p=.htm"))
-        
-        # Find if there are other pages for this letter (e.g. A-Ab, Ac-Ad)
-        navbar = soup.find("div", "alpha-nav-holder")
-        pages = navbar.findAll("a", href=re.compile("letter="))
-        
-        # Initiate an empty pages_list for each letter
-        pages_list = []
-        
-        for page in pages:
-            pages_list.append("https://www.boxofficemojo.com{}{}".format(page["href"], "&adjust_yr=2019&p=.htm"))
-            
-        if len(pages_list) > 0:
-            for page in pages_list:
-                time.sleep(1)
-                
-                try:
-                    t0 = time.time()
-                    response = requests_retry_session().get(page)
-                except Exception as e:
-                    print("Fetching {} failed".format(page), e.__class__.__name__)
-                else:
-                    print("Fetching {} eventually worked".format(page), response.status_code)
-                finally:
-                    t1 = time.time()
-                    print("Fetching {} took".format(page), t1 - t0, "seconds")
-                
-                soup = BeautifulSoup(response.text, "html.parser")
-                
-                trs = soup.findAll("tr")
-                
-                for tr in trs:
-                    found_links = tr.findAll("a", href=re.compile("id="))
-                    for link in found_links:
-                        movie_links.append("https://boxofficemojo.com{}{}".format(link["href"], "&adjust_yr=2019&p=.htm"))
-                        
-        print("Number of movie links:", len(movie_links))
-    print("Movie links scraping finished!") 
-    print("Total number of movie links:", len(movie_links))
-
-    # Save the list of movie links 
-    movie_links_df = pd.DataFrame({"movie_links": movie_links})
-    movie_links_df.to_csv("movie_links.csv", index=False)
+    # Raw html of every fetched page is kept so the extraction functions can be rerun later
+    page_cache = None if args.no_page_cache else PageCache(args.cache_dir)
+
+    # Work queue of the queue fetch mode. An unfinished queue is picked up where it stopped, as long as it was filled for the same function.
+    def open_queue(function):
+        queue = WorkQueue(args.queue, args.lease_seconds)
+
+        if queue.option("function", function) != function and not queue.finished():
+            parser.error("{} holds an unfinished {} crawl".format(args.queue, queue.option("function")))
+
+        queue.set_option("function", function)
+        queue.set_option("cache_dir", None if page_cache is None else os.path.abspath(page_cache.directory))
+        return queue
+
+    # Reuse the links found by earlier runs. The index pages already crawled are only crawled again when asked to.
+    frontier = UrlFrontier(args.frontier)
+
+    if not frontier.urls(PAGE) and os.path.exists("movie_links.csv"):
+        # Links collected before there was a frontier: the index was crawled, so the start page counts as done
+        frontier.add((link, PAGE) for link in pd.read_csv("movie_links.csv", usecols=["movie_links"])["movie_links"])
+        frontier.add([(ALPHABETICAL_URL, INDEX)])
+        frontier.mark_done(ALPHABETICAL_URL)
+        print("Loaded {} movie links from movie_links.csv".format(len(frontier.urls(PAGE))))
+
+    frontier.add([(ALPHABETICAL_URL, INDEX)])
+    if args.refresh_links:
+        frontier.refresh(INDEX)
+
+    movie_links = frontier.urls(PAGE)
+
+    # Queue of a queue crawl that finished, to be removed at the end of the crawl
+    finished_queue = None
 
     ############################################################
     # STEP 4: USE THREADS TO SPEED UP WEBSCRAPING
     ############################################################
 
-    print("Starting scrape")
+    if args.reparse_from_cache:
+        # Rerun the extraction functions over the latest cached copy of every movie page, without any network access
+        frontier.close()
+        print("Reparsing cached movie pages")
+        results = (result for _, result in reparse_from_cache(page_cache, parse_movie_page, url_like="%/movies/?id=%", metrics=metrics))
+    elif args.incremental:
+        frontier.close()
+        journal = CrawlJournal(args.journal)
+        delta_links = []
+        delta_rows = []
+
+        # Unchanged pages are skipped and failed fetches keep the row from the previous crawl.
+        # Changed pages are journaled, so the latest row for each url replaces the old one.
+        def record_refresh(link, result):
+            if result == NOT_MODIFIED or result == 0:
+                return
+            journal.record(link, result)
+            delta_links.append(link)
+            delta_rows.append(result)
+
+        print("Starting incremental refresh of {} movie links".format(len(movie_links)))
+
+        with journal, metrics.stage("refresh"):
+            if args.fetch_mode == "async":
+                scrape_all([fix_movie_url(link) for link in movie_links], parse_movie_page,
+                           concurrency=args.concurrency, rate_limiter=rate_limiter, page_cache=page_cache, conditional=True,
+                           on_result=lambda position, result: record_refresh(movie_links[position], result), metrics=metrics)
+            elif args.fetch_mode == "queue":
+                queue = open_queue("refresh")
+                queue.add((link, PAGE) for link in movie_links)
+                run_queue_workers(queue, args.workers)
+
+                for link, _, status, result in queue.tasks():
+                    if status == DONE:
+                        record_refresh(link, result)
+
+                # The next refresh starts from an empty queue (removed once the rate limiter's stats have been read from it)
+                if queue.finished():
+                    finished_queue = queue
+            else:
+                pool = Pool(cpu_count() * 2, initializer=init_worker, initargs=(rate_limiter, page_cache, metrics))
+                for link, result in zip(movie_links, pool.imap(refreshWebsite, movie_links, chunksize=16)):
+                    record_refresh(link, result)
+                pool.close()
+                pool.join()
 
-    # Set up threads to speed up web-scraping
-    pool = Pool(cpu_count() * 2)  
-    results = pool.map(scrapeWebsite, movie_links)
-    pool.close()
-    pool.join()
+        rate_limiter.print_stats()
+        if finished_queue is not None:
+            finished_queue.delete()
 
-    print("Scrape finished")
+        print("Refresh finished: {} of {} movie pages changed".format(len(delta_rows), len(movie_links)))
 
-    ############################################################
-    # STEP 5: PRELIMINARY CLEANUP
-    ############################################################
+        # Save the changed rows on their own, then merge them into the full dataset through the journal
+        delta = pd.DataFrame.from_records([row[:len(MOVIE_DATA_COLUMNS)] for row in delta_rows], columns=MOVIE_DATA_COLUMNS)
+        delta.insert(0, "movie_link", delta_links)
+        delta.to_csv("movie_data_delta.csv", index=False)
+
+        results = journal.rows()
+    else:
+        journal = CrawlJournal(args.journal)
+
+        # Skip every movie page a previous (possibly interrupted) run already scraped.
+        # The index pages left are crawled by the same workers, and the movie links they turn up are scraped as they are found.
+        completed = journal.completed_urls()
+        pending = [(url, kind) for url, kind in frontier.pending() if kind == INDEX or url not in completed]
+        print("Starting scrape: {} index pages and {} of {} known movie links left to scrape".format(
+            sum(kind == INDEX for _, kind in pending), sum(kind == PAGE for _, kind in pending), len(movie_links)))
+
+        # Only the movie pages have rows to journal
+        def record_page(url, kind, result):
+            if kind == PAGE:
+                journal.record(url, result)
+
+        with frontier, journal, metrics.stage("scrape"):
+            if args.fetch_mode == "async":
+                # Fetch every page through one shared connection pool and parse them in a CPU worker pool
+                crawl_frontier(frontier, parse_mojo_page, pending, concurrency=args.concurrency, prepare_url=fix_movie_url,
+                               on_result=record_page, metrics=metrics, rate_limiter=rate_limiter, page_cache=page_cache)
+            elif args.fetch_mode == "queue":
+                # Lease the pages to worker processes through the queue file. The links they find are queued as new tasks.
+                queue = open_queue("scrape")
+                queue.add(pending)
+                run_queue_workers(queue, args.workers)
+
+                # Copy the links and rows back out of the queue, then start the next crawl from an empty queue
+                for url, kind, status, result in queue.tasks():
+                    frontier.add([(url, kind)])
+                    if status == DONE:
+                        frontier.mark_done(url)
+                        record_page(url, kind, result)
+
+                if queue.finished():
+                    finished_queue = queue
+            else:
+                # Set up threads to speed up web-scraping
+                pool = Pool(cpu_count() * 2, initializer=init_worker, initargs=(rate_limiter, page_cache, metrics))
+                crawl_with_pool(pool, frontier, scrapeFrontierPage, pending, on_result=record_page, window=cpu_count() * 4)
+                pool.close()
+                pool.join()
 
-    # Eliminate bad records
-    results = [result for result in results if result is not 0]
+        rate_limiter.print_stats()
+        if finished_queue is not None:
+            finished_queue.delete()
 
-    # Store the results in a DataFrame
-    movie_data = pd.DataFrame.from_records(results, columns=["title", "distributor", "runtime", "rating", "release_date", "genres", "domestic_gross", "foreign_gross", "worldwide_gross", "adjusted_domestic_gross_2019", "production_budget", "director1", "director2", "writer1", "writer2", "writer3", "actor1", "actor2", "actor3", "actor4", "actor5", "actor6", "producer1", "producer2", "producer3", "producer4", "producer5", "producer6", "cinematographer", "composer1", "composer2"])
+        # Keep the full list of movie links for `--incremental` and anything else that reads it
+        movie_links = frontier.urls(PAGE)
+        pd.DataFrame({"movie_links": movie_links}).to_csv("movie_links.csv", index=False)
 
-    # Preliminary data cleanup -- converting appropriate data to numeric or datetime type
-    movie_data["domestic_gross_formatted"] = movie_data["domestic_gross"].str.replace(",", "").str.replace("$", "")
-    movie_data["domestic_gross_formatted"] = pd.to_numeric(movie_data["domestic_gross_formatted"], errors="coerce")
+        print("Scrape finished ({} movie links known)".format(len(movie_links)))
 
-    movie_data["foreign_gross_formatted"] = movie_data["foreign_gross"].str.replace(",", "").str.replace("$", "")
-    movie_data["foreign_gross_formatted"] = pd.to_numeric(movie_data["foreign_gross_formatted"], errors="coerce")
+        # Every successfully scraped page, including the ones from earlier runs
+        results = journal.rows()
 
-    movie_data["worldwide_gross_formatted"] = movie_data["worldwide_gross"].str.replace(",", "").str.replace("$", "")
-    movie_data["worldwide_gross_formatted"] = pd.to_numeric(movie_data["worldwide_gross_formatted"], errors="coerce")
+    ############################################################
+    # STEP 5: PRELIMINARY CLEANUP
+    ############################################################
 
-    movie_data["adjusted_domestic_gross_2019_formatted"] = movie_data["adjusted_domestic_gross_2019"].str.replace(",", "").str.replace("$", "")
-    movie_data["adjusted_domestic_gross_2019_formatted"] = pd.to_numeric(movie_data["adjusted_domestic_gross_2019_formatted"], errors="coerce")
+    # Rows are formatted and written in batches as they are read back, instead of building one big DataFrame first.
+    # movie_data.arrow keeps the column types, movie_data.csv is the same data as text.
+    # When reparsing from the cache, the parsing happens as the rows are read back and is timed with this stage
+    sink = RowSink("movie_data.arrow", MOVIE_DATA_COLUMNS, MOJO_SCHEMA, transform=format_movie_data,
+                   csv_path="movie_data.csv", batch_size=args.batch_size)
 
-    # movie_data["production_budget_formatted"] = movie_data["production_budget"].str.replace(",", "").str.replace("$", "")
-    # movie_data["production_budget_formatted"] = pd.to_numeric(movie_data["production_budget"], errors="coerce")
+    # Every credit of a movie goes to the credit table, under the movie's row number in movie_data.arrow.
+    # The wide people columns only keep the first few names of each profession.
+    credits = CreditTable()
 
-    movie_data["release_date_formatted"] = pd.to_datetime(movie_data["release_date"], errors="coerce")
+    def movie_rows(results):
+        for movie_id, row in enumerate(results):
+            credits.add_movie(movie_id, row_credits(row))
+            yield row[:len(MOVIE_DATA_COLUMNS)]
 
-    movie_data["runtime_formatted"] = movie_data["runtime"].apply(lambda x:convert_runtime_to_integer(x))
+    with metrics.stage("format_and_write"), sink:
+
+        # Eliminate bad records
+        sink.extend(movie_rows(result for result in results if result != 0))
+
+        credits.write(args.people)
 
     ############################################################
     # STEP 6: SAVE SCRAPED DATA FOR FURTHER ANALYSIS
     ############################################################
 
-    # Save movie_data as a pickle
-    movie_data.to_pickle("movie_data.pkl")
-
-    # Save movie_data as a CSV
-    movie_data.to_csv("movie_data.csv", index=False)
+    # Both files are complete once the sink is closed
+    print("Files written! ({} movies, {} credits of {} people)".format(sink.rows_written, len(credits), len(credits.persons)))
 
-    print("Files written!")
+    # Where the time went: network, parsing or formatting
+    metrics.print_summary()
+    metrics.write(args.metrics)
+    print("Metrics written to {}".format(args.metrics))
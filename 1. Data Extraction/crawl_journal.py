@@ -0,0 +1,109 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import json
+import os
+import time
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Statuses written to the journal. Only "done" urls are skipped on restart, "failed" ones are tried again.
+DONE = "done"
+FAILED = "failed"
+
+
+# Append-only record of every url the crawl has finished, one JSON object per line:
+# {"url": ..., "status": "done" | "failed", "row": [...] | null, "time": ...}
+# Entries are buffered and written to disk in batches, so a crash loses at most one batch.
+class CrawlJournal:
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    # Read back every entry in the journal, skipping a half-written last line left by a crash
+    def entries(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    # Latest status of every url in the journal
+    def statuses(self):
+        return {entry["url"]: entry["status"] for entry in self.entries()}
+
+    # Urls that do not need to be fetched again
+    def completed_urls(self):
+        return {url for url, status in self.statuses().items() if status == DONE}
+
+    # Keep only the urls from `urls` that have not been completed yet, in their original order
+    def pending(self, urls):
+        completed = self.completed_urls()
+        return [url for url in urls if url not in completed]
+
+    # Record the outcome of a url. Scraper functions return 0 for a failed page, which is journaled as "failed".
+    def record(self, url, result):
+        if result == 0 or result is None:
+            entry = {"url": url, "status": FAILED, "row": None, "time": time.time()}
+        else:
+            entry = {"url": url, "status": DONE, "row": result, "time": time.time()}
+
+        self.buffer.append(json.dumps(entry))
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    # Write buffered entries and make sure they reach the disk
+    def flush(self):
+        if not self.buffer:
+            return
+
+        self.open()
+        self.file.write("\n".join(self.buffer) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.buffer = []
+
+    # Parsed rows of every completed url (the latest one if a url was journaled more than once)
+    # Yields the rows one at a time so the whole crawl never has to be held in memory:
+    # the first pass only remembers which line holds the latest row of each url, the second pass yields those lines.
+    def rows(self):
+        latest = {}
+
+        for position, entry in enumerate(self.entries()):
+            if entry["status"] == DONE:
+                latest[entry["url"]] = position
+
+        keep = set(latest.values())
+        del latest
+
+        for position, entry in enumerate(self.entries()):
+            if position in keep:
+                yield entry["row"]
@@ -0,0 +1,303 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import bisect
+import json
+import os
+import time
+import multiprocessing
+from contextlib import contextmanager
+
+# Import the host normalization the rate limiter buckets requests by
+from rate_limiter import DEFAULT_HOST, host_for_url
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Upper bounds (in seconds) of the request latency and page parse time histogram buckets. The last bucket catches everything slower.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PARSE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+# Positions of each value in a host's slice of the shared state array (followed by the latency bucket counts)
+REQUESTS = 0
+FAILED_REQUESTS = 1
+RETRIES = 2
+BYTES = 3
+LATENCY_SUM = 4
+FIELDS_PER_HOST = 5 + len(LATENCY_BUCKETS) + 1
+
+# Positions of the parse totals (followed by the parse time bucket counts)
+PAGES_PARSED = 0
+FAILED_PARSES = 1
+PARSE_SUM = 2
+PARSE_FIELDS = 3 + len(PARSE_BUCKETS) + 1
+
+# Positions of each value in a worker's slice
+WORKER_PID = 0
+WORKER_TASKS = 1
+WORKER_BUSY = 2
+WORKER_FIRST_TASK = 3
+WORKER_LAST_TASK = 4
+FIELDS_PER_WORKER = 5
+
+
+# Counters and histograms of a crawl, shared by every process the metrics are handed to (e.g. through a Pool initializer),
+# like the rate limiter's token buckets. Requests are counted per host, parse times per page and busy time per worker process.
+# Stage timings are only kept by the process that records them (the main program).
+class CrawlMetrics:
+    def __init__(self, hosts=(), max_workers=64):
+        self.hosts = [DEFAULT_HOST] + [host for host in hosts if host != DEFAULT_HOST]
+        self.max_workers = max_workers
+        self.started = time.time()
+        self.stages = {}
+
+        self.lock = multiprocessing.Lock()
+        self.requests = multiprocessing.Array("d", len(self.hosts) * FIELDS_PER_HOST, lock=False)
+        self.parses = multiprocessing.Array("d", PARSE_FIELDS, lock=False)
+        self.workers = multiprocessing.Array("d", max_workers * FIELDS_PER_WORKER, lock=False)
+
+        # Slot of the worker process this copy of the metrics runs in, claimed on its first task
+        self.worker_pid = None
+        self.worker_slot = None
+
+    def _host_offset(self, url):
+        host = host_for_url(url)
+
+        if host in self.hosts:
+            return self.hosts.index(host) * FIELDS_PER_HOST
+        return self.hosts.index(DEFAULT_HOST) * FIELDS_PER_HOST
+
+    # Slot of the calling process in the worker array, or None once every slot is taken
+    def _worker_offset(self):
+        pid = os.getpid()
+
+        if self.worker_pid != pid:
+            self.worker_pid = pid
+            self.worker_slot = None
+
+            with self.lock:
+                for slot in range(self.max_workers):
+                    offset = slot * FIELDS_PER_WORKER
+                    if self.workers[offset + WORKER_PID] in (0, pid):
+                        self.workers[offset + WORKER_PID] = pid
+                        self.worker_slot = slot
+                        break
+
+        if self.worker_slot is None:
+            return None
+        return self.worker_slot * FIELDS_PER_WORKER
+
+    # One request to `url`: wall time including retries, body size, number of retries and whether it failed in the end
+    def observe_request(self, url, seconds, size=0, retries=0, failed=False):
+        offset = self._host_offset(url)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+
+        with self.lock:
+            self.requests[offset + REQUESTS] += 1
+            self.requests[offset + FAILED_REQUESTS] += failed
+            self.requests[offset + RETRIES] += retries
+            self.requests[offset + BYTES] += size
+            self.requests[offset + LATENCY_SUM] += seconds
+            self.requests[offset + 5 + bucket] += 1
+
+    # One page run through a parser
+    def observe_parse(self, seconds, failed=False):
+        bucket = bisect.bisect_left(PARSE_BUCKETS, seconds)
+
+        with self.lock:
+            self.parses[PAGES_PARSED] += 1
+            self.parses[FAILED_PARSES] += failed
+            self.parses[PARSE_SUM] += seconds
+            self.parses[3 + bucket] += 1
+
+    # One task of the calling worker process, `seconds` long and ending now
+    def observe_task(self, seconds):
+        offset = self._worker_offset()
+        if offset is None:
+            return
+
+        now = time.time()
+        with self.lock:
+            if self.workers[offset + WORKER_TASKS] == 0:
+                self.workers[offset + WORKER_FIRST_TASK] = now - seconds
+            self.workers[offset + WORKER_TASKS] += 1
+            self.workers[offset + WORKER_BUSY] += seconds
+            self.workers[offset + WORKER_LAST_TASK] = now
+
+    # Run a page parser and time it. A parser result of 0 is a page it couldn't parse.
+    def parse(self, parse_page, html):
+        t0 = time.perf_counter()
+        result = parse_page(html)
+        self.observe_parse(time.perf_counter() - t0, failed=isinstance(result, int) and result == 0)
+
+        return result
+
+    # Time the block as a pool task of the calling worker process
+    @contextmanager
+    def task(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_task(time.perf_counter() - t0)
+
+    # Time the block as a stage of the run (e.g. "collect_movie_links" or a cleaning stage). Repeated stages add up.
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - t0
+
+    # Every counter as plain numbers: per host, parse, per worker and per stage
+    def snapshot(self):
+        elapsed = time.time() - self.started
+
+        with self.lock:
+            requests = list(self.requests)
+            parses = list(self.parses)
+            workers = list(self.workers)
+
+        hosts = {}
+        for slot, host in enumerate(self.hosts):
+            values = requests[slot * FIELDS_PER_HOST:(slot + 1) * FIELDS_PER_HOST]
+            if values[REQUESTS] == 0:
+                continue
+
+            hosts[host] = {
+                "requests": int(values[REQUESTS]),
+                "failed_requests": int(values[FAILED_REQUESTS]),
+                "retries": int(values[RETRIES]),
+                "bytes": int(values[BYTES]),
+                "latency_seconds_sum": round(values[LATENCY_SUM], 6),
+                "latency_buckets": [int(count) for count in values[5:]],
+            }
+
+        worker_stats = {}
+        for slot in range(self.max_workers):
+            values = workers[slot * FIELDS_PER_WORKER:(slot + 1) * FIELDS_PER_WORKER]
+            if values[WORKER_TASKS] == 0:
+                continue
+
+            # Share of the time between the worker's first and last task spent working
+            active = values[WORKER_LAST_TASK] - values[WORKER_FIRST_TASK]
+            worker_stats[str(int(values[WORKER_PID]))] = {
+                "tasks": int(values[WORKER_TASKS]),
+                "busy_seconds": round(values[WORKER_BUSY], 6),
+                "utilization": round(min(1.0, values[WORKER_BUSY] / active), 3) if active > 0 else 1.0,
+            }
+
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "latency_bucket_bounds": list(LATENCY_BUCKETS),
+            "parse_bucket_bounds": list(PARSE_BUCKETS),
+            "hosts": hosts,
+            "parse": {
+                "pages": int(parses[PAGES_PARSED]),
+                "failed_pages": int(parses[FAILED_PARSES]),
+                "seconds_sum": round(parses[PARSE_SUM], 6),
+                "buckets": [int(count) for count in parses[3:]],
+            },
+            "workers": worker_stats,
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+        }
+
+    # Write the snapshot as JSON, or in the Prometheus text format when `path` ends in ".prom"
+    # (e.g. for node_exporter's textfile collector). The file is written next to `path` and moved into place.
+    def write(self, path):
+        snapshot = self.snapshot()
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+
+        with open(temporary_path, "w") as output_file:
+            if path.endswith(".prom"):
+                output_file.write(prometheus_text(snapshot))
+            else:
+                json.dump(snapshot, output_file, indent=1, sort_keys=True)
+
+        os.replace(temporary_path, path)
+
+    # Print where the time went, for the end of a run
+    def print_summary(self):
+        snapshot = self.snapshot()
+
+        for host, stats in snapshot["hosts"].items():
+            print("{}: {} requests ({} failed, {} retries), {:.1f} MB, {:.3f} s average latency".format(
+                host, stats["requests"], stats["failed_requests"], stats["retries"], stats["bytes"] / 1000000,
+                stats["latency_seconds_sum"] / stats["requests"],
+            ))
+
+        if snapshot["parse"]["pages"] > 0:
+            print("parse: {} pages ({} failed), {:.2f} s in total, {:.2f} ms per page".format(
+                snapshot["parse"]["pages"], snapshot["parse"]["failed_pages"], snapshot["parse"]["seconds_sum"],
+                1000 * snapshot["parse"]["seconds_sum"] / snapshot["parse"]["pages"],
+            ))
+
+        for pid, stats in snapshot["workers"].items():
+            print("worker {}: {} tasks, {:.0%} busy".format(pid, stats["tasks"], stats["utilization"]))
+
+        for name, seconds in snapshot["stages"].items():
+            print("{}: {:.2f} s".format(name, seconds))
+
+# Histogram lines in the Prometheus text format: cumulative bucket counts, then the sum and count
+def prometheus_histogram(name, labels, bounds, counts, total):
+    label_text = "".join('{}="{}",'.format(key, value) for key, value in labels.items())
+    lines = []
+
+    cumulative = 0
+    for bound, count in zip(list(bounds) + ["+Inf"], counts):
+        cumulative += count
+        lines.append('{}_bucket{{{}le="{}"}} {}'.format(name, label_text, bound, cumulative))
+
+    braces = "{{{}}}".format(label_text.rstrip(",")) if labels else ""
+    lines.append("{}_sum{} {}".format(name, braces, total))
+    lines.append("{}_count{} {}".format(name, braces, cumulative))
+
+    return lines
+
+# A snapshot in the Prometheus text exposition format
+def prometheus_text(snapshot):
+    lines = ["# TYPE crawl_request_latency_seconds histogram"]
+    for host, stats in snapshot["hosts"].items():
+        lines += prometheus_histogram("crawl_request_latency_seconds", {"host": host}, snapshot["latency_bucket_bounds"],
+                                      stats["latency_buckets"], stats["latency_seconds_sum"])
+
+    for metric, key in [("crawl_failed_requests_total", "failed_requests"), ("crawl_retries_total", "retries"), ("crawl_bytes_total", "bytes")]:
+        lines.append("# TYPE {} counter".format(metric))
+        lines += ['{}{{host="{}"}} {}'.format(metric, host, stats[key]) for host, stats in snapshot["hosts"].items()]
+
+    lines.append("# TYPE crawl_parse_seconds histogram")
+    lines += prometheus_histogram("crawl_parse_seconds", {}, snapshot["parse_bucket_bounds"], snapshot["parse"]["buckets"], snapshot["parse"]["seconds_sum"])
+    lines.append("# TYPE crawl_failed_parses_total counter")
+    lines.append("crawl_failed_parses_total {}".format(snapshot["parse"]["failed_pages"]))
+
+    lines.append("# TYPE crawl_worker_busy_seconds counter")
+    lines += ['crawl_worker_busy_seconds{{pid="{}"}} {}'.format(pid, stats["busy_seconds"]) for pid, stats in snapshot["workers"].items()]
+    lines.append("# TYPE crawl_worker_utilization gauge")
+    lines += ['crawl_worker_utilization{{pid="{}"}} {}'.format(pid, stats["utilization"]) for pid, stats in snapshot["workers"].items()]
+
+    lines.append("# TYPE pipeline_stage_seconds gauge")
+    lines += ['pipeline_stage_seconds{{stage="{}"}} {}'.format(name, seconds) for name, seconds in snapshot["stages"].items()]
+
+    return "\n".join(lines) + "\n"
+
+
+# Metrics shared by every worker process. Set through `init_metrics` when a pool starts.
+metrics = None
+
+# Pool initializer for the parsing processes of the fetch engine
+def init_metrics(shared_metrics):
+    global metrics
+    metrics = shared_metrics
+
+# Run a page parser in a worker process and time it, both as a parse and as a task of the worker.
+# Module-level so it can be sent to the worker processes (e.g. as `partial(measure_parse, parse_movie_page)`).
+def measure_parse(parse_page, html):
+    if metrics is None:
+        return parse_page(html)
+
+    with metrics.task():
+        return metrics.parse(parse_page, html)
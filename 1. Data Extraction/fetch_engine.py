@@ -0,0 +1,242 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import asyncio
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import cpu_count
+
+# Imports for the shared HTTP client
+import aiohttp
+from yarl import URL
+
+# Imports for conditional (incremental) fetching
+from page_cache import NOT_MODIFIED, conditional_headers, is_unchanged
+
+# Imports for the crawl metrics (request latencies in the event loop, parse times in the CPU pool)
+from crawl_metrics import init_metrics, measure_parse
+
+# Imports for crawling a url frontier (index pages first, new links queued as they are found)
+from url_frontier import KINDS
+
+# Import the retry schedule the requests-based `polite_get` uses as well
+from rate_limiter import DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR, DEFAULT_STATUS_FORCELIST, RETRY_AFTER_STATUSES, backoff_time
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Create one keep-alive client that every request in the crawl shares
+def create_session(concurrency):
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+    )
+    timeout = aiohttp.ClientTimeout(total=60)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+# Fetch a url with the shared session, retrying connection errors, `status_forcelist` and `RETRY_AFTER_STATUSES` responses
+# Returns the page text, or None if every attempt failed (the same cases where `polite_get` raises)
+# If a `rate_limiter` is given, every attempt waits for a token and reports its status back to the limiter
+# If a `page_cache` is given, the raw page is stored in it
+# With `conditional=True` the cached ETag/Last-Modified are sent along, and NOT_MODIFIED is returned
+# for a 304 response or for a page whose content hash has not changed since it was cached
+# If `metrics` are given, the request is recorded once with the time spent in all its attempts, its size and its retries
+async def fetch_text(
+    session,
+    url,
+    retries=DEFAULT_RETRIES,
+    backoff_factor=DEFAULT_BACKOFF_FACTOR,
+    status_forcelist=DEFAULT_STATUS_FORCELIST,
+    rate_limiter=None,
+    page_cache=None,
+    conditional=False,
+    metrics=None,
+):
+    # Some movie urls are already percent-encoded (e.g. `elizabeth%A0.htm`) and must be sent as-is
+    request_url = URL(url, encoded=True)
+
+    previous = page_cache.latest(url) if conditional and page_cache is not None else None
+    headers = conditional_headers(previous)
+
+    elapsed = 0
+    size = 0
+    failed = True
+    attempt = 0
+
+    try:
+        for attempt in range(retries + 1):
+            await asyncio.sleep(backoff_time(attempt, backoff_factor))
+
+            if rate_limiter is not None:
+                await asyncio.sleep(rate_limiter.reserve(url))
+
+            t0 = time.perf_counter()
+            try:
+                async with session.get(request_url, headers=headers) as response:
+                    if rate_limiter is not None:
+                        rate_limiter.report(url, response.status, response.headers)
+
+                    if response.status in status_forcelist or response.status in RETRY_AFTER_STATUSES:
+                        continue
+
+                    if response.status == 304:
+                        failed = False
+                        return NOT_MODIFIED
+
+                    body = await response.read()
+                    size = len(body)
+                    failed = response.status >= 400
+
+                    # `requests` falls back to ISO-8859-1 when the server does not send a charset
+                    text = body.decode(response.charset or "ISO-8859-1", errors="replace")
+
+                    if page_cache is not None:
+                        digest = page_cache.put(url, text, response.status, response.headers)
+
+                        if is_unchanged(previous, digest):
+                            return NOT_MODIFIED
+
+                    return text
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if rate_limiter is not None:
+                    rate_limiter.report(url, None)
+                continue
+            finally:
+                elapsed += time.perf_counter() - t0
+    finally:
+        if metrics is not None:
+            metrics.observe_request(url, elapsed, size, attempt, failed)
+
+    return None
+
+# Worker coroutine: pull (position, url) pairs off the queue, fetch them and hand the html to the CPU pool
+# `on_result(position, result)` is called as soon as each page is done (e.g. to journal it)
+async def scrape_worker(queue, session, executor, parse_page, results, on_result, fetch_options):
+    loop = asyncio.get_running_loop()
+
+    while True:
+        position, url = await queue.get()
+
+        try:
+            text = await fetch_text(session, url, **fetch_options)
+
+            if text is None:
+                results[position] = 0
+            elif text == NOT_MODIFIED:
+                results[position] = NOT_MODIFIED
+            else:
+                results[position] = await loop.run_in_executor(executor, parse_page, text)
+        except Exception:
+            results[position] = 0
+        finally:
+            if on_result is not None:
+                on_result(position, results[position])
+            queue.task_done()
+
+# Scrape every url with a single event loop, a single connection pool and at most `concurrency` requests in flight
+# `parse_page` must be a module-level function so it can be sent to the parsing processes
+# If `metrics` are given, they are shared with the parsing processes, which record the parse time of every page
+async def scrape_all_async(urls, parse_page, concurrency=16, processes=None, on_result=None, metrics=None, **fetch_options):
+    results = [0] * len(urls)
+
+    queue = asyncio.Queue()
+    for position, url in enumerate(urls):
+        queue.put_nowait((position, url))
+
+    if metrics is not None:
+        parse_page = partial(measure_parse, parse_page)
+        fetch_options["metrics"] = metrics
+
+    with ProcessPoolExecutor(processes or cpu_count(), initializer=init_metrics, initargs=(metrics,)) as executor:
+        async with create_session(concurrency) as session:
+            workers = [
+                asyncio.ensure_future(scrape_worker(queue, session, executor, parse_page, results, on_result, fetch_options))
+                for _ in range(concurrency)
+            ]
+
+            await queue.join()
+
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    return results
+
+# Worker coroutine of a frontier crawl: pull the next url (index pages first) off the priority queue, fetch it,
+# parse it in the CPU pool with `parse_page(kind, html)` -> (result, links), and queue every link the frontier hadn't seen
+async def frontier_worker(queue, sequence, session, executor, frontier, parse_page, prepare_url, on_result, metrics, fetch_options):
+    loop = asyncio.get_running_loop()
+
+    while True:
+        _, _, url, kind = await queue.get()
+
+        result = 0
+        try:
+            text = await fetch_text(session, prepare_url(url) if prepare_url is not None else url, **fetch_options)
+
+            if text is None:
+                result = 0
+            elif text == NOT_MODIFIED:
+                result = NOT_MODIFIED
+            else:
+                parse = partial(parse_page, kind)
+                if metrics is not None:
+                    parse = partial(measure_parse, parse)
+
+                result, links = await loop.run_in_executor(executor, parse, text)
+
+                # Queued before this page is marked as finished, so `queue.join()` can't return while links are still coming
+                for link in frontier.add(links):
+                    queue.put_nowait((KINDS.index(link[1]), next(sequence), link[0], link[1]))
+        except Exception:
+            result = 0
+        finally:
+            if result != 0:
+                frontier.mark_done(url)
+            if on_result is not None:
+                on_result(url, kind, result)
+            queue.task_done()
+
+# Crawl the pending urls of a `UrlFrontier` with one event loop and one connection pool, like `scrape_all_async`.
+# Links found on a page are fetched by the same workers as soon as they are found, index pages ahead of the others,
+# so discovering the site and scraping it overlap instead of being two phases.
+# `parse_page(kind, html)` must be a module-level function returning (result, links), with 0 as the result of a failed page.
+# `prepare_url(url)` turns a frontier url into the url to request (e.g. `fix_movie_url`).
+# `on_result(url, kind, result)` is called as soon as each page is done.
+async def crawl_frontier_async(frontier, parse_page, pending=None, concurrency=16, processes=None, on_result=None, prepare_url=None, metrics=None, **fetch_options):
+    # (priority of the kind, order the url was queued in, url, kind)
+    queue = asyncio.PriorityQueue()
+    sequence = itertools.count()
+    for url, kind in frontier.pending() if pending is None else pending:
+        queue.put_nowait((KINDS.index(kind), next(sequence), url, kind))
+
+    if metrics is not None:
+        fetch_options["metrics"] = metrics
+
+    with ProcessPoolExecutor(processes or cpu_count(), initializer=init_metrics, initargs=(metrics,)) as executor:
+        async with create_session(concurrency) as session:
+            workers = [
+                asyncio.ensure_future(frontier_worker(queue, sequence, session, executor, frontier, parse_page, prepare_url, on_result, metrics, fetch_options))
+                for _ in range(concurrency)
+            ]
+
+            await queue.join()
+
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+# Blocking entry point of `crawl_frontier_async`
+def crawl_frontier(frontier, parse_page, pending=None, concurrency=16, processes=None, on_result=None, prepare_url=None, metrics=None, **fetch_options):
+    asyncio.run(crawl_frontier_async(frontier, parse_page, pending, concurrency, processes, on_result, prepare_url, metrics, **fetch_options))
+
+# Blocking entry point with the same shape as `pool.map(scrapeWebsite, urls)`: one result per url, 0 for failures
+def scrape_all(urls, parse_page, concurrency=16, processes=None, on_result=None, metrics=None, **fetch_options):
+    return asyncio.run(scrape_all_async(urls, parse_page, concurrency, processes, on_result, metrics, **fetch_options))
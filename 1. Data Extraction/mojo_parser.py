@@ -0,0 +1,234 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import re
+import sys
+import time
+
+# Import lxml for a fast, C-based html tree
+import lxml.html
+from lxml import etree
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# The people sections of a movie page: (name, pattern in the link to the section, how many names to keep)
+# The order matches the columns `parse_movie_page` returns (the credit table keeps every name, not just `how many`)
+PROFESSIONS = [
+    ("director", "Director", 2),
+    ("writer", "Writer", 3),
+    ("actor", "Actor", 6),
+    ("producer", "Producer", 6),
+    ("cinematographer", "Cinematographer", 1),
+    ("composer", "Composer", 2),
+]
+
+# Labels of the rows in the box office summary box, in the order of the returned columns
+BOX_OFFICE_TYPES = ["Domestic", "Foreign", "Worldwide"]
+
+# Compile every pattern once instead of once per page
+PROFESSION_HREF_REGEX = re.compile(r"({})&".format("|".join(pattern for _, pattern, _ in PROFESSIONS)))
+BOX_OFFICE_TYPE_REGEXES = [(box_office_type, re.compile(box_office_type, re.IGNORECASE)) for box_office_type in BOX_OFFICE_TYPES]
+DOLLAR_AMOUNT_REGEX = re.compile(r"\$[0-9,]+")
+TITLE_IN_PARENTHESES_REGEX = re.compile(r"^\(.+\)$", re.IGNORECASE)
+
+
+# Fix ", Jr." problem for names after splitting a list of names on commas
+def combine_jrs(names_list):
+    new_list = []
+    temp_name = ""
+
+    for i in range(len(names_list)):
+        if names_list[i] != " Jr.":
+
+            if temp_name == "":
+                temp_name = names_list[i]
+            else:
+                new_list.append(temp_name)
+                temp_name = names_list[i]
+
+            if i == len(names_list) - 1:
+                new_list.append(temp_name)
+
+        elif names_list[i] == " Jr.":
+            temp_name = "{},{}".format(temp_name, names_list[i])
+            new_list.append(temp_name)
+            temp_name = ""
+
+    return new_list
+
+# Remove things like '(executive producer)' from a list of names
+def remove_titles_from_list(names_list):
+    return [name for name in names_list if not TITLE_IN_PARENTHESES_REGEX.search(name)]
+
+# Every name in the comma separated text of a people section, in billing order
+def split_all_names(text):
+    return remove_titles_from_list(combine_jrs(text.replace("*", "").split(",")))
+
+# Turn the comma separated text of a people section into exactly `how_many` names, padded with "N/A"
+def split_names(text, how_many):
+    names = split_all_names(text)
+    return names[:how_many] + ["N/A"] * (how_many - len(names))
+
+# Pick the fields that are found by their position among the page's bold tags
+# `bold_texts` is the stripped text of every <b> tag on the page, in document order
+def select_bold_items(bold_texts):
+    def bold_text(position):
+        try:
+            return bold_texts[position] or "N/A"
+        except IndexError:
+            return "N/A"
+
+    title = bold_text(1)
+
+    # Check if "Domestic Total Gross" or "Domestic Lifetime Gross" are present
+    # For each one present, the search items are located one bold tag deeper in the soup
+    domestic_total_gross_check = len(bold_texts) > 2 and "$" in bold_texts[2]
+    domestic_lifetime_gross_check = len(bold_texts) > 3 and "$" in bold_texts[3]
+    offset_sum = domestic_total_gross_check + domestic_lifetime_gross_check
+
+    # We only return `Adjusted Domestic Gross 2019` if the `Domestic Total Gross` is present
+    adjusted_domestic_gross_2019 = bold_text(2) if domestic_total_gross_check else "N/A"
+
+    distributor = bold_text(2 + offset_sum)
+    release_date = bold_text(3 + offset_sum)
+    genres = bold_text(4 + offset_sum)
+    runtime = bold_text(5 + offset_sum)
+    rating = bold_text(6 + offset_sum)
+    production_budget = bold_text(7 + offset_sum)
+
+    return [title, adjusted_domestic_gross_2019, distributor, release_date, genres, runtime, rating, production_budget]
+
+# Text of an element the way BeautifulSoup's `get_text(separator, strip=True)` returns it
+def stripped_text(element, separator=""):
+    return separator.join(text.strip() for text in element.itertext() if text.strip())
+
+# Parse html into an lxml tree (None for an empty document)
+def parse_html_tree(html):
+    try:
+        return lxml.html.fromstring(html)
+    except etree.ParserError:
+        return None
+    except ValueError:
+        # lxml refuses unicode strings that carry an XML encoding declaration
+        return lxml.html.fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+# Walk an lxml tree once and collect everything a movie page row needs:
+# the text of every <b> tag, the first <td> after the first link to each people section,
+# and the rows of the box office summary box.
+def extract_page_parts(root):
+    bold_texts = []
+    people_texts = {}
+    waiting_for_td = []
+    box_office = {}
+    box_office_found = False
+
+    if root is None:
+        return bold_texts, people_texts, box_office
+
+    for element in root.iter("a", "b", "td", "div"):
+        tag = element.tag
+
+        if tag == "b":
+            bold_texts.append(stripped_text(element))
+
+        elif tag == "a":
+            href = element.get("href")
+            if href and "&" in href:
+                for pattern in PROFESSION_HREF_REGEX.findall(href):
+                    if pattern not in people_texts and pattern not in waiting_for_td:
+                        waiting_for_td.append(pattern)
+
+        elif tag == "td":
+            # The names are in the first <td> that follows the section link in the document
+            if waiting_for_td:
+                text = stripped_text(element, separator=",")
+                for pattern in waiting_for_td:
+                    people_texts[pattern] = text
+                waiting_for_td = []
+
+        elif not box_office_found and "mp_box_content" in (element.get("class") or "").split():
+            # Only the first summary box counts. Scan its rows once for all three box office types.
+            box_office_found = True
+
+            for tr in element.iter("tr"):
+                tr_text = "".join(tr.itertext())
+
+                for box_office_type, regex in BOX_OFFICE_TYPE_REGEXES:
+                    if box_office_type not in box_office and regex.search(tr_text):
+                        amount = DOLLAR_AMOUNT_REGEX.search(tr_text)
+                        box_office[box_office_type] = amount[0] if amount is not None else "N/A"
+
+    return bold_texts, people_texts, box_office
+
+# The 31 fields of a movie page row from the parts `extract_page_parts` collected
+def movie_fields(bold_texts, people_texts, box_office):
+    people = []
+    for _, pattern, how_many in PROFESSIONS:
+        if pattern in people_texts:
+            people.extend(split_names(people_texts[pattern], how_many))
+        else:
+            people.extend(["N/A"] * how_many)
+
+    title, adjusted_domestic_gross_2019, distributor, release_date, genres, runtime, rating, production_budget = select_bold_items(bold_texts)
+    domestic_gross, foreign_gross, worldwide_gross = [box_office.get(box_office_type, "N/A") for box_office_type in BOX_OFFICE_TYPES]
+
+    director1, director2, writer1, writer2, writer3, actor1, actor2, actor3, actor4, actor5, actor6, producer1, producer2, producer3, producer4, producer5, producer6, cinematographer, composer1, composer2 = people
+
+    return [title, distributor, runtime, rating, release_date, genres, domestic_gross, foreign_gross, worldwide_gross, adjusted_domestic_gross_2019, production_budget, director1, director2, writer1, writer2, writer3, actor1, actor2, actor3, actor4, actor5, actor6, producer1, producer2, producer3, producer4, producer5, producer6, cinematographer, composer1, composer2]
+
+# Every credit on a movie page as [profession, name] pairs, in the order of `PROFESSIONS` and billing order within each.
+# Unlike the columns there is no limit on how many names a profession has, and no "N/A" padding.
+def movie_credits(people_texts):
+    return [[name, person] for name, pattern, _ in PROFESSIONS if pattern in people_texts for person in split_all_names(people_texts[pattern])]
+
+# Single-pass replacement for the BeautifulSoup extraction in `parse_movie_page_soup`
+# Returns the same 31 fields, or 0 if the page could not be parsed
+def parse_movie_html(html):
+    try:
+        bold_texts, people_texts, box_office = extract_page_parts(parse_html_tree(html))
+    except Exception:
+        return 0
+
+    return movie_fields(bold_texts, people_texts, box_office)
+
+# Same as `parse_movie_html`, with the list of every credit (see `movie_credits`) as a 32nd field
+def parse_movie_html_with_credits(html):
+    try:
+        bold_texts, people_texts, box_office = extract_page_parts(parse_html_tree(html))
+    except Exception:
+        return 0
+
+    return movie_fields(bold_texts, people_texts, box_office) + [movie_credits(people_texts)]
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# Micro-benchmark: time the BeautifulSoup parser against the single-pass parser on cached movie pages
+# Usage: python mojo_parser.py [page_cache directory] [number of pages]
+if __name__ == "__main__":
+    from box_office_mojo import parse_movie_page_soup
+    from page_cache import PageCache
+
+    cache = PageCache(sys.argv[1] if len(sys.argv) > 1 else "page_cache")
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    pages = [cache.get_text(digest) for _, digest in cache.latest_pages("%/movies/?id=%")[:limit]]
+    print("Parsing {} cached movie pages".format(len(pages)))
+
+    timings = {}
+    outputs = {}
+    for name, parse_page in [("BeautifulSoup (html.parser)", parse_movie_page_soup), ("single pass (lxml)", parse_movie_html)]:
+        t0 = time.perf_counter()
+        outputs[name] = [parse_page(page) for page in pages]
+        timings[name] = time.perf_counter() - t0
+
+    for name, seconds in timings.items():
+        print("{}: {:.2f} ms per page".format(name, 1000 * seconds / max(len(pages), 1)))
+
+    differences = sum(old != new for old, new in zip(*outputs.values()))
+    print("Pages with different output: {}".format(differences))
@@ -0,0 +1,148 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import os
+import pandas as pd
+
+# Import pyarrow for the typed, columnar file format
+import pyarrow as pa
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# The datasets are stored as uncompressed Arrow IPC files (the Feather v2 format).
+# The files carry their schema, so dates and nullable integers come back typed without `parse_dates` or `astype("Int64")`,
+# and they can be memory-mapped: only the columns that are asked for are ever read from disk.
+
+# Columns scraped from a Box Office Mojo movie page, in the order `parse_movie_page` returns them
+MOJO_COLUMNS = ["title", "distributor", "runtime", "rating", "release_date", "genres", "domestic_gross", "foreign_gross", "worldwide_gross", "adjusted_domestic_gross_2019", "production_budget", "director1", "director2", "writer1", "writer2", "writer3", "actor1", "actor2", "actor3", "actor4", "actor5", "actor6", "producer1", "producer2", "producer3", "producer4", "producer5", "producer6", "cinematographer", "composer1", "composer2"]
+
+# movie_data.arrow: every scraped column is text, the `_formatted` columns are numbers and dates
+MOJO_SCHEMA = pa.schema(
+    [(column, pa.string()) for column in MOJO_COLUMNS]
+    + [
+        ("domestic_gross_formatted", pa.int64()),
+        ("foreign_gross_formatted", pa.int64()),
+        ("worldwide_gross_formatted", pa.int64()),
+        ("adjusted_domestic_gross_2019_formatted", pa.int64()),
+        ("release_date_formatted", pa.timestamp("ns")),
+        ("runtime_formatted", pa.int64()),
+    ]
+)
+
+# the_numbers_movie_data.arrow
+NUMBERS_SCHEMA = pa.schema([
+    ("rank", pa.int64()),
+    ("release_date", pa.timestamp("ns")),
+    ("title", pa.string()),
+    ("production_budget", pa.int64()),
+    ("domestic_gross", pa.int64()),
+    ("worldwide_gross", pa.int64()),
+])
+
+# cleaned_movie_data.arrow: the merged output of the data cleaning stage
+CLEANED_SCHEMA = pa.schema(
+    [
+        ("title", pa.string()),
+        ("release_year", pa.int64()),
+        ("release_date_mojo", pa.timestamp("ns")),
+        ("distributor_mojo", pa.string()),
+        ("runtime_mojo", pa.int64()),
+        ("rating_mojo", pa.string()),
+        ("genres_mojo", pa.string()),
+        ("production_budget_mojo", pa.int64()),
+        ("domestic_gross_mojo", pa.int64()),
+        ("foreign_gross_mojo", pa.int64()),
+        ("worldwide_gross_mojo", pa.int64()),
+        ("adjusted_domestic_gross_2019_mojo", pa.int64()),
+    ]
+    + [("{}_mojo".format(column), pa.string()) for column in MOJO_COLUMNS[11:]]
+    + [
+        ("release_date_numbers", pa.timestamp("ns")),
+        ("rank_numbers", pa.int64()),
+        ("production_budget_numbers", pa.int64()),
+        ("domestic_gross_numbers", pa.int64()),
+        ("worldwide_gross_numbers", pa.int64()),
+        ("release_date", pa.timestamp("ns")),
+        ("budget", pa.int64()),
+        ("domestic", pa.int64()),
+        ("worldwide", pa.int64()),
+        ("price_conversion", pa.float64()),
+        ("production_budget_ticket_conversion_2018", pa.int64()),
+        ("domestic_gross_ticket_conversion_2018", pa.int64()),
+        ("worldwide_gross_ticket_conversion_2018", pa.int64()),
+        ("domestic_adj", pa.int64()),
+        ("worldwide_adj", pa.int64()),
+        ("budget_adj", pa.int64()),
+        ("domestic_conversion_difference", pa.int64()),
+        ("worldwide_conversion_difference", pa.int64()),
+        ("production_budget_conversion_difference", pa.int64()),
+        ("release_week", pa.int64()),
+    ]
+)
+
+# Arrow integer columns are read back as pandas' nullable "Int64" so missing values don't turn them into floats
+PANDAS_TYPES = {pa.int64(): pd.Int64Dtype()}
+
+
+# Convert a DataFrame to a table with exactly the columns and types of `schema`
+def to_table(frame, schema):
+    return pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+
+# Write a DataFrame to an Arrow file with a fixed schema
+# The file is written next to its final name and moved into place, so readers never see half a file
+def write_table(frame, path, schema):
+    table = to_table(frame, schema)
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+
+    with pa.OSFile(temporary_path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+
+    os.replace(temporary_path, path)
+
+# Read an Arrow file into a DataFrame. Only the columns in `columns` are read (all of them by default).
+# With `memory_map` the file is mapped instead of copied into memory, which makes loading a few columns almost free.
+def read_table(path, columns=None, memory_map=True):
+    source = pa.memory_map(path) if memory_map else pa.OSFile(path, "rb")
+
+    with source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+
+        return table.to_pandas(types_mapper=PANDAS_TYPES.get)
+
+# Schema stored in an Arrow file, without reading any of its data
+def read_schema(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# Convert the CSV outputs of earlier runs into Arrow files
+# Usage: python movie_store.py [directory]
+if __name__ == "__main__":
+    import sys
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "."
+
+    conversions = [
+        ("movie_data", MOJO_SCHEMA, ["release_date_formatted"]),
+        ("the_numbers_movie_data", NUMBERS_SCHEMA, ["release_date"]),
+        ("cleaned_movie_data", CLEANED_SCHEMA, ["release_date_mojo", "release_date_numbers", "release_date"]),
+    ]
+
+    for name, schema, date_columns in conversions:
+        csv_path = os.path.join(directory, "{}.csv".format(name))
+        if not os.path.exists(csv_path):
+            continue
+
+        frame = pd.read_csv(csv_path, parse_dates=date_columns, dtype={field.name: "str" for field in schema if field.type == pa.string()})
+        write_table(frame, os.path.join(directory, "{}.arrow".format(name)), schema)
+        print("Converted {} ({} rows)".format(csv_path, len(frame)))
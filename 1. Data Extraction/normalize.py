@@ -0,0 +1,178 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+# Import pyarrow's vectorized string and number kernels
+import pyarrow as pa
+import pyarrow.compute as pc
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Every function here works on a whole column at once (a Series, list or array of strings) and returns a Series.
+# Values that can't be read, such as "N/A", become missing values instead of raising.
+# The string work is done with pyarrow's compute kernels, which run over the whole column in C++,
+# and columns with few distinct values (dates, runtimes) are only parsed once per distinct value.
+
+# Dollar amounts: "$1,234,567", "$30 million", "$3.9 million", "$1.2 billion"
+# Only what is left of a valid number once "$", "," and the unit are removed gets converted
+NUMBER_REGEX = r"^[0-9]+(\.[0-9]+)?$"
+
+# "2 hrs. 4 min."
+RUNTIME_REGEX = r"^\s*(?P<hours>\d+) hrs\. (?P<minutes>\d+)"
+
+# Release date formats of the two websites: "November 6, 1998" on Box Office Mojo, "Nov 6, 1998" on The Numbers
+MOJO_DATE_FORMAT = "%B %d, %Y"
+NUMBERS_DATE_FORMAT = "%b %d, %Y"
+
+# Arrow integers become pandas' nullable "Int64"
+PANDAS_TYPES = {pa.int64(): pd.Int64Dtype()}
+
+
+def as_series(values):
+    if isinstance(values, pd.Series):
+        return values
+    return pd.Series(values, dtype="object")
+
+# Column of strings as an Arrow array, with missing values as nulls
+def to_arrow_strings(values):
+    return pc.cast(pa.array(values, from_pandas=True), pa.string())
+
+# Arrow array back to a Series on the index of the original values
+def to_series(array, values):
+    return array.to_pandas(types_mapper=PANDAS_TYPES.get).set_axis(values.index)
+
+# Run `parse` over the distinct values of a column only, then spread the results back over every row
+def parse_distinct(values, parse):
+    values = as_series(values)
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques, dtype="object"))
+
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=values.index)
+
+# Dollar amounts as whole dollars ("Int64"). "$X million" and "$X billion" are multiplied out.
+def parse_money(values):
+    values = as_series(values)
+
+    text = pc.utf8_trim(pc.utf8_lower(to_arrow_strings(values)), "$ ")
+
+    multipliers = pc.if_else(pc.ends_with(text, "million"), 1000000.0, pc.if_else(pc.ends_with(text, "billion"), 1000000000.0, 1.0))
+
+    # Trimming the letters of " million"/" billion" off the end is much cheaper than a regex replace and leaves the digits alone
+    text = pc.utf8_rtrim(pc.replace_substring(text, ",", ""), " milonb")
+
+    numbers = pc.if_else(pc.match_substring_regex(text, NUMBER_REGEX), text, pa.scalar(None, pa.string()))
+    amounts = pc.round(pc.multiply(pc.cast(numbers, pa.float64()), multipliers))
+
+    return to_series(pc.cast(amounts, pa.int64()), values)
+
+# Runtimes like "1 hrs. 30 min." as a whole number of minutes ("Int64")
+def parse_runtime(values):
+    def parse(distinct_values):
+        parts = pc.extract_regex(to_arrow_strings(distinct_values), RUNTIME_REGEX)
+        hours = pc.cast(pc.struct_field(parts, "hours"), pa.int64())
+        minutes = pc.cast(pc.struct_field(parts, "minutes"), pa.int64())
+
+        return to_series(pc.add(pc.multiply(hours, 60), minutes), distinct_values)
+
+    return parse_distinct(values, parse)
+
+# Release dates as datetime64. Dates in `date_format` are parsed in one pass,
+# anything else (e.g. a date written another way) falls back to pandas' format inference.
+def parse_date(values, date_format=None):
+    def parse(distinct_values):
+        dates = pd.to_datetime(distinct_values, format=date_format, errors="coerce")
+
+        unparsed = dates.isna() & distinct_values.notna() & (distinct_values != "N/A")
+        if date_format is not None and unparsed.any():
+            dates[unparsed] = pd.to_datetime(distinct_values[unparsed], format="mixed", errors="coerce")
+
+        return dates
+
+    return parse_distinct(values, parse)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# The row-by-row conversions these functions replace, kept here for the benchmark below
+def convert_money_with_replace(values):
+    return pd.to_numeric(values.str.replace(",", "").str.replace("$", ""), errors="coerce")
+
+def convert_budget_with_loop(values):
+    results = []
+
+    for entry in values.str.replace("$", "").str.replace(",", "").str.strip().str.split(" "):
+        if type(entry) is list:
+            if len(entry) > 1:
+                results.append(int(float(entry[0]) * 1000000))
+            elif entry[0].isdigit():
+                results.append(int(entry[0]))
+            else:
+                results.append(np.nan)
+        else:
+            results.append(entry)
+
+    return pd.Series(results, index=values.index).astype("Int64")
+
+def convert_runtime_with_apply(values):
+    def convert_runtime_to_integer(runtime):
+        if pd.isna(runtime) or "hrs." not in runtime:
+            return np.nan
+        runtime_split = runtime.split(" ")
+        return int(runtime_split[0]) * 60 + int(runtime_split[2])
+
+    return values.apply(convert_runtime_to_integer)
+
+# Columns like the scraped ones, with one value in ten "N/A": dollar strings, budgets (half of them "$X million"), runtimes and dates
+def make_columns(rows, seed=0):
+    random_state = np.random.RandomState(seed)
+
+    amounts = random_state.randint(1, 10 ** 9, size=rows)
+    dollars = pd.Series(["${:,}".format(amount) for amount in amounts])
+    dollars[random_state.rand(rows) < 0.1] = "N/A"
+
+    budgets = pd.Series(["${} million".format(amount % 300) if amount % 2 else "${:,}".format(amount) for amount in amounts])
+    budgets[random_state.rand(rows) < 0.1] = "N/A"
+
+    runtimes = pd.Series(["{} hrs. {} min.".format(amount % 4, amount % 60) for amount in amounts])
+    runtimes[random_state.rand(rows) < 0.1] = "N/A"
+
+    dates = pd.Series(pd.to_datetime(amounts % 30000, unit="D").strftime(MOJO_DATE_FORMAT))
+    dates[random_state.rand(rows) < 0.1] = "N/A"
+
+    return dollars, budgets, runtimes, dates
+
+# (name, values, old conversion, new conversion) of each column type
+def make_benchmarks(rows, seed=0):
+    dollars, budgets, runtimes, dates = make_columns(rows, seed)
+
+    return [
+        ("dollar strings", dollars, convert_money_with_replace, parse_money),
+        ("$X million budgets", budgets, convert_budget_with_loop, parse_money),
+        ("runtimes", runtimes, convert_runtime_with_apply, parse_runtime),
+        ("release dates", dates, lambda values: pd.to_datetime(values, errors="coerce"), lambda values: parse_date(values, MOJO_DATE_FORMAT)),
+    ]
+
+# Benchmark the old and new conversions (tests/test_normalize.py checks they agree)
+# Usage: python normalize.py [number of rows]
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    print("Converting {:,} rows".format(rows))
+
+    for name, values, old_function, new_function in make_benchmarks(rows):
+        t0 = time.perf_counter()
+        old_function(values)
+        t1 = time.perf_counter()
+        new_function(values)
+        t2 = time.perf_counter()
+
+        print("{}: {:.2f} s -> {:.2f} s ({:.1f}x)".format(name, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)))
@@ -0,0 +1,176 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing import cpu_count
+
+# Imports for the parse time metrics of a reparse
+from crawl_metrics import init_metrics, measure_parse
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (url, fetched_at)
+)
+"""
+
+
+# Returned instead of a parsed row when a conditional fetch finds the page has not changed since it was cached
+NOT_MODIFIED = "not modified"
+
+# Headers for a conditional GET based on a previous fetch (a dict from `PageCache.latest`)
+def conditional_headers(previous):
+    headers = {}
+
+    if previous is None or previous["status"] != 200:
+        return headers
+
+    if previous["etag"]:
+        headers["If-None-Match"] = previous["etag"]
+
+    if previous["last_modified"]:
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    return headers
+
+# Whether a freshly fetched page has the same content hash as the previous fetch
+def is_unchanged(previous, digest):
+    return previous is not None and previous["status"] == 200 and previous["sha256"] == digest
+
+
+# Local store of raw page html so the parsers can be rerun without hitting the websites again.
+# Page bodies are gzipped and stored once per distinct content under `objects/<first 2 hex chars>/<sha256>.html.gz`.
+# A SQLite index records every fetch: url, fetch time, content hash, status and the ETag/Last-Modified headers.
+# Safe to share between processes: every process opens its own connection to the index.
+class PageCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects_directory = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "index.sqlite")
+        self.connection = None
+        self.connection_pid = None
+
+        os.makedirs(self.objects_directory, exist_ok=True)
+
+        with self.connect() as connection:
+            connection.execute(INDEX_SCHEMA)
+
+    # Don't send an open connection to other processes, they make their own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["connection"] = None
+        state["connection_pid"] = None
+        return state
+
+    def connect(self):
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.index_path, timeout=60)
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_directory, digest[:2], "{}.html.gz".format(digest))
+
+    # Store a fetched page and return its content hash
+    def put(self, url, text, status=200, headers=None, fetched_at=None):
+        headers = headers or {}
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = self.object_path(digest)
+
+        # Identical content is only written once. Write to a temporary file first so readers never see half a page.
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = "{}.{}.tmp".format(path, os.getpid())
+            with gzip.open(temporary_path, "wt", encoding="utf-8") as object_file:
+                object_file.write(text)
+            os.replace(temporary_path, path)
+
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (url, fetched_at or time.time(), digest, status, headers.get("ETag"), headers.get("Last-Modified")),
+            )
+
+        return digest
+
+    # Raw html for a content hash
+    def get_text(self, digest):
+        with gzip.open(self.object_path(digest), "rt", encoding="utf-8") as object_file:
+            return object_file.read()
+
+    # Most recent fetch of a url as a dict, or None if it was never fetched
+    def latest(self, url):
+        row = self.connect().execute(
+            "SELECT url, fetched_at, sha256, status, etag, last_modified FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1",
+            (url,),
+        ).fetchone()
+
+        if row is None:
+            return None
+        return dict(zip(["url", "fetched_at", "sha256", "status", "etag", "last_modified"], row))
+
+    # Content hash of the most recent successful fetch of exactly this url, or None if it was never fetched successfully
+    def latest_page(self, url):
+        row = self.connect().execute(
+            "SELECT sha256 FROM pages WHERE status = 200 AND url = ? ORDER BY fetched_at DESC LIMIT 1",
+            (url,),
+        ).fetchone()
+
+        return None if row is None else row[0]
+
+    # (url, content hash) of the most recent successful fetch of every url in the cache
+    # `url_like` is an SQL LIKE pattern to restrict the urls (e.g. only movie pages)
+    def latest_pages(self, url_like="%"):
+        return self.connect().execute(
+            """
+            SELECT pages.url, pages.sha256
+            FROM pages
+            JOIN (SELECT url, MAX(fetched_at) AS fetched_at FROM pages WHERE status = 200 AND url LIKE ? GROUP BY url) latest
+            ON pages.url = latest.url AND pages.fetched_at = latest.fetched_at
+            ORDER BY pages.url
+            """,
+            (url_like,),
+        ).fetchall()
+
+# Load a cached page and run a parser on it (module-level so it can be sent to worker processes)
+def parse_cached_page(cache, parse_page, digest):
+    try:
+        return parse_page(cache.get_text(digest))
+    except Exception:
+        return 0
+
+# Rerun `parse_page` over the latest cached copy of every page, in parallel and without any network access
+# Yields (url, result) pairs in url order as the workers finish them
+# If `metrics` are given, the workers record the parse time of every page in them
+def reparse_from_cache(cache, parse_page, url_like="%", processes=None, metrics=None):
+    pages = cache.latest_pages(url_like)
+    urls = [url for url, _ in pages]
+    digests = [digest for _, digest in pages]
+
+    if metrics is not None:
+        parse_page = partial(measure_parse, parse_page)
+
+    pool = Pool(processes or cpu_count(), initializer=init_metrics, initargs=(metrics,))
+    try:
+        for url, result in zip(urls, pool.imap(partial(parse_cached_page, cache, parse_page), digests, chunksize=64)):
+            yield url, result
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,209 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import warnings
+
+import numpy as np
+
+# `resource` only exists on Unix; peak memory is reported as None elsewhere
+try:
+    import resource
+except ImportError:
+    resource = None
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Fixed corpus of pages, one folder per scraper. The pages are hand-written in the layout of the old Box Office Mojo movie pages
+# and The Numbers' budget table, not saved from the live sites, so they only cover the parsing cases written into them.
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_pages")
+EXPECTED_FILE = os.path.join(CORPUS_DIRECTORY, "expected.json")
+
+# Parser backends measured for each scraper. The first backend of each is the reference the others are checked against.
+BACKENDS = {
+    "mojo": ["html.parser", "lxml", "lxml single pass"],
+    "the_numbers": ["lxml", "html.parser"],
+}
+
+
+# Parsing function for a scraper and backend. Resolved inside the benchmark process so imports count toward its memory.
+def get_parse_function(scraper, backend):
+    if scraper == "mojo":
+        if backend == "lxml single pass":
+            from mojo_parser import parse_movie_html
+            return parse_movie_html
+
+        from box_office_mojo import parse_movie_page_soup
+        return lambda html: parse_movie_page_soup(html, backend)
+
+    from the_numbers import parse_numbers_page
+    return lambda html: parse_numbers_page(html, backend)
+
+# Fixture pages of a scraper as {file name: html}
+def load_corpus(scraper):
+    pages = {}
+
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIRECTORY, scraper, "*.html"))):
+        with open(path, encoding="utf-8") as page_file:
+            pages[os.path.basename(path)] = page_file.read()
+
+    return pages
+
+# Hash of every fixture, so results from runs over different corpora are not compared by mistake
+def corpus_hash():
+    digest = hashlib.sha256()
+
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIRECTORY, "*", "*.html"))):
+        digest.update(os.path.relpath(path, CORPUS_DIRECTORY).encode("utf-8"))
+        with open(path, "rb") as page_file:
+            digest.update(page_file.read())
+
+    return digest.hexdigest()
+
+# Peak resident memory of the current process in megabytes
+def peak_rss_mb():
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        return round(peak / 1024 / 1024, 1)
+    return round(peak / 1024, 1)
+
+# Parse the corpus `repeat` times with one backend and time every page
+# Runs in its own process (see `run_backend`), so the peak memory belongs to this backend alone
+def benchmark_backend(scraper, backend, repeat, expected):
+    warnings.filterwarnings("ignore")
+
+    parse_page = get_parse_function(scraper, backend)
+    pages = load_corpus(scraper)
+    rss_after_imports = peak_rss_mb()
+
+    latencies = []
+    mismatches = set()
+
+    for _ in range(repeat):
+        for name, html in pages.items():
+            t0 = time.perf_counter()
+            result = parse_page(html)
+            latencies.append(time.perf_counter() - t0)
+
+            if expected is not None and name in expected and result != expected[name]:
+                mismatches.add(name)
+
+    latencies = np.array(latencies)
+
+    return {
+        "scraper": scraper,
+        "backend": backend,
+        "pages": len(latencies),
+        "pages_per_second": round(len(latencies) / latencies.sum(), 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_after_imports_mb": rss_after_imports,
+        "mismatched_pages": sorted(mismatches),
+    }
+
+# Run one backend in a fresh process
+def run_backend(scraper, backend, repeat, expected):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(benchmark_backend, (scraper, backend, repeat, expected))
+
+# Parse every fixture with the reference backend of each scraper and save the output as the expected results
+def write_expected():
+    warnings.filterwarnings("ignore")
+    expected = {}
+
+    for scraper, backends in BACKENDS.items():
+        parse_page = get_parse_function(scraper, backends[0])
+        expected[scraper] = {name: parse_page(html) for name, html in load_corpus(scraper).items()}
+
+    with open(EXPECTED_FILE, "w", encoding="utf-8") as expected_file:
+        json.dump(expected, expected_file, indent=1, ensure_ascii=False)
+
+# Print how each backend moved compared to a previous results file
+def compare_with_baseline(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+
+    if baseline["corpus_sha256"] != results["corpus_sha256"]:
+        print("Warning: the baseline was measured on a different corpus")
+
+    previous = {(run["scraper"], run["backend"]): run for run in baseline["runs"]}
+
+    for run in results["runs"]:
+        before = previous.get((run["scraper"], run["backend"]))
+        if before is None:
+            continue
+
+        print("{} / {}: pages/sec {:+.1%}, p50 {:+.1%}, p99 {:+.1%}".format(
+            run["scraper"],
+            run["backend"],
+            run["pages_per_second"] / before["pages_per_second"] - 1,
+            run["p50_ms"] / before["p50_ms"] - 1,
+            run["p99_ms"] / before["p99_ms"] - 1,
+        ))
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers' page parsing over the saved page corpus")
+    parser.add_argument("--repeat", type=int, default=50, help="Number of times to parse the whole corpus per backend")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmark_results/parser_benchmark_<time>.json)")
+    parser.add_argument("--baseline", default=None, help="Previous results file to compare against")
+    parser.add_argument("--write-expected", action="store_true", help="Regenerate benchmark_pages/expected.json with the reference backends")
+    args = parser.parse_args()
+
+    if args.write_expected:
+        write_expected()
+        print("Expected results written to", EXPECTED_FILE)
+
+    with open(EXPECTED_FILE, encoding="utf-8") as expected_file:
+        expected = json.load(expected_file)
+
+    results = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_sha256": corpus_hash(),
+        "repeat": args.repeat,
+        "runs": [],
+    }
+
+    for scraper, backends in BACKENDS.items():
+        for backend in backends:
+            run = run_backend(scraper, backend, args.repeat, expected.get(scraper))
+            results["runs"].append(run)
+
+            print("{} / {}: {} pages/sec, p50 {} ms, p99 {} ms, peak RSS {} MB, {} mismatched pages".format(
+                scraper, backend, run["pages_per_second"], run["p50_ms"], run["p99_ms"], run["peak_rss_mb"], len(run["mismatched_pages"])
+            ))
+
+    output = args.output or os.path.join("benchmark_results", "parser_benchmark_{}.json".format(time.strftime("%Y%m%d_%H%M%S")))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=1)
+
+    print("Results written to", output)
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
@@ -0,0 +1,318 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import os
+import sys
+import time
+from array import array
+import pandas as pd
+import numpy as np
+
+# Import pyarrow for the schemas of the saved tables
+import pyarrow as pa
+
+# Import the people sections of a movie page and the Arrow file helpers
+from mojo_parser import PROFESSIONS
+from movie_store import MOJO_COLUMNS, write_table, read_table
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Roles of a credit, stored in the credit table as their position in this list
+ROLES = [name for name, _, _ in PROFESSIONS]
+
+# The wide people columns of a movie row (`director1` to `composer2`) and the role of each
+PEOPLE_COLUMNS = MOJO_COLUMNS[11:]
+PEOPLE_COLUMN_ROLES = [name for name, _, how_many in PROFESSIONS for _ in range(how_many)]
+
+# people.arrow: one row per distinct name, `person_id` is the row's position
+PERSONS_SCHEMA = pa.schema([
+    ("person_id", pa.int32()),
+    ("name", pa.string()),
+])
+
+# credits.arrow: one row per (movie, person, role), in movie order. `movie_id` is the movie's row in movie_data.arrow
+# and `billing` the person's position among the movie's credits of that role (0 is top billed).
+CREDITS_SCHEMA = pa.schema([
+    ("movie_id", pa.int32()),
+    ("person_id", pa.int32()),
+    ("role", pa.dictionary(pa.int8(), pa.string())),
+    ("billing", pa.int16()),
+])
+
+
+# [role, name] credits of a scraped row. Rows parsed with `parse_movie_html_with_credits` carry every credit as their last field;
+# older rows (e.g. from the journal of an earlier crawl) only have the wide columns, so their credits are read back from those.
+def row_credits(row):
+    if len(row) > len(MOJO_COLUMNS):
+        return row[len(MOJO_COLUMNS)]
+
+    people = row[len(MOJO_COLUMNS) - len(PEOPLE_COLUMNS):len(MOJO_COLUMNS)]
+    return [[role, name] for role, name in zip(PEOPLE_COLUMN_ROLES, people) if isinstance(name, str) and name != "N/A"]
+
+
+# Every distinct name, stored once, with the integer ID it was given (the order it was first seen in)
+class PersonDictionary:
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    # ID of a name, giving it the next one if it is new
+    def intern(self, name):
+        person_id = self.ids.get(name)
+
+        if person_id is None:
+            person_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+
+        return person_id
+
+    # ID of a name, or None if nobody has it
+    def get(self, name):
+        return self.ids.get(name)
+
+
+# Movie–person–role edges in four compact columns (int32 movie and person IDs, int8 role, int16 billing), with the names
+# interned in a `PersonDictionary`. Replaces the 20 wide name columns: there is no cap on how many people a role has,
+# no "N/A" padding, and every name is stored once however many movies it is in.
+# Movies are added in order of their `movie_id`. Lookups go through two offset arrays (compressed sparse rows):
+# the credits of movie m are edges `movie_offsets[m]` to `movie_offsets[m + 1]`, and the edges of person p are
+# `person_edges[person_offsets[p]:person_offsets[p + 1]]`, so "all films with X" is a slice instead of a scan over every row.
+class CreditTable:
+    def __init__(self, persons=None, movie_ids=None, person_ids=None, roles=None, billing=None):
+        self.persons = persons or PersonDictionary()
+
+        # Edges are collected in typed arrays while movies are added, and turned into numpy arrays by `build`
+        self.new_movie_ids = array("i")
+        self.new_person_ids = array("i")
+        self.new_roles = array("b")
+        self.new_billing = array("h")
+
+        self.movie_ids = np.zeros(0, dtype=np.int32) if movie_ids is None else movie_ids
+        self.person_ids = np.zeros(0, dtype=np.int32) if person_ids is None else person_ids
+        self.roles = np.zeros(0, dtype=np.int8) if roles is None else roles
+        self.billing = np.zeros(0, dtype=np.int16) if billing is None else billing
+
+        self.movie_offsets = None
+        self.person_offsets = None
+        self.person_edges = None
+
+    def __len__(self):
+        return len(self.movie_ids) + len(self.new_movie_ids)
+
+    # Add the [role, name] credits of one movie. A person credited twice in the same role is only kept once.
+    def add_movie(self, movie_id, credits):
+        billing = dict.fromkeys(ROLES, 0)
+        seen = set()
+
+        for role, name in credits:
+            person_id = self.persons.intern(name)
+            if (person_id, role) in seen:
+                continue
+            seen.add((person_id, role))
+
+            self.new_movie_ids.append(movie_id)
+            self.new_person_ids.append(person_id)
+            self.new_roles.append(ROLES.index(role))
+            self.new_billing.append(billing[role])
+            billing[role] += 1
+
+        self.movie_offsets = None
+
+    # Move the added edges into the numpy columns and (re)build both offset arrays
+    def build(self):
+        if self.new_movie_ids:
+            self.movie_ids = np.concatenate([self.movie_ids, np.frombuffer(self.new_movie_ids, dtype=np.int32)])
+            self.person_ids = np.concatenate([self.person_ids, np.frombuffer(self.new_person_ids, dtype=np.int32)])
+            self.roles = np.concatenate([self.roles, np.frombuffer(self.new_roles, dtype=np.int8)])
+            self.billing = np.concatenate([self.billing, np.frombuffer(self.new_billing, dtype=np.int16)])
+
+            self.new_movie_ids = array("i")
+            self.new_person_ids = array("i")
+            self.new_roles = array("b")
+            self.new_billing = array("h")
+            self.movie_offsets = None
+
+        if self.movie_offsets is not None:
+            return self
+
+        movies = int(self.movie_ids[-1]) + 1 if len(self.movie_ids) else 0
+        self.movie_offsets = np.zeros(movies + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.movie_ids, minlength=movies), out=self.movie_offsets[1:])
+
+        # A stable sort keeps each person's edges in movie order
+        self.person_offsets = np.zeros(len(self.persons) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.person_ids, minlength=len(self.persons)), out=self.person_offsets[1:])
+        self.person_edges = np.argsort(self.person_ids, kind="stable").astype(np.int32)
+
+        return self
+
+    # Positions of the edges of a person (optionally only in one role). Empty for a name that isn't in the table.
+    def edges_of(self, name, role=None):
+        self.build()
+        person_id = self.persons.get(name)
+
+        if person_id is None:
+            return np.zeros(0, dtype=np.int32)
+
+        edges = self.person_edges[self.person_offsets[person_id]:self.person_offsets[person_id + 1]]
+        if role is not None:
+            edges = edges[self.roles[edges] == ROLES.index(role)]
+
+        return edges
+
+    # Sorted IDs of every movie a person is credited on (optionally only in one role)
+    def films_with(self, name, role=None):
+        edges = self.edges_of(name, role)
+        return np.unique(self.movie_ids[edges])
+
+    # (role, name, billing) of every credit of a movie
+    def credits_of(self, movie_id):
+        self.build()
+
+        if movie_id + 1 >= len(self.movie_offsets):
+            return []
+
+        edges = range(self.movie_offsets[movie_id], self.movie_offsets[movie_id + 1])
+        return [(ROLES[self.roles[edge]], self.persons.names[self.person_ids[edge]], int(self.billing[edge])) for edge in edges]
+
+    # The credits as a DataFrame with the names filled in
+    def to_frame(self):
+        self.build()
+        return pd.DataFrame({
+            "movie_id": self.movie_ids,
+            "name": np.array(self.persons.names, dtype="object")[self.person_ids],
+            "role": pd.Categorical.from_codes(self.roles, ROLES),
+            "billing": self.billing,
+        })
+
+    # Bytes held by the edge columns and the names
+    def memory_usage(self):
+        self.build()
+        columns = [self.movie_ids, self.person_ids, self.roles, self.billing, self.movie_offsets, self.person_offsets, self.person_edges]
+        return sum(column.nbytes for column in columns) + sum(sys.getsizeof(name) for name in self.persons.names)
+
+    # Save people.arrow and credits.arrow to `directory`
+    def write(self, directory):
+        self.build()
+        os.makedirs(directory, exist_ok=True)
+
+        persons = pd.DataFrame({"person_id": np.arange(len(self.persons), dtype=np.int32), "name": self.persons.names})
+        credits = pd.DataFrame({
+            "movie_id": self.movie_ids,
+            "person_id": self.person_ids,
+            "role": pd.Categorical.from_codes(self.roles, ROLES),
+            "billing": self.billing,
+        })
+
+        write_table(persons, os.path.join(directory, "people.arrow"), PERSONS_SCHEMA)
+        write_table(credits, os.path.join(directory, "credits.arrow"), CREDITS_SCHEMA)
+
+    @classmethod
+    def read(cls, directory):
+        persons = read_table(os.path.join(directory, "people.arrow"))
+        credits = read_table(os.path.join(directory, "credits.arrow"))
+
+        return cls(
+            PersonDictionary(persons.sort_values("person_id")["name"]),
+            credits["movie_id"].to_numpy(np.int32),
+            credits["person_id"].to_numpy(np.int32),
+            pd.Categorical(credits["role"], categories=ROLES).codes.astype(np.int8),
+            credits["billing"].to_numpy(np.int16),
+        ).build()
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin"]
+
+# (fewest, most) people of each role on a random movie
+CREDIT_SIZES = {"director": (1, 2), "writer": (1, 4), "actor": (2, 12), "producer": (1, 10), "cinematographer": (0, 1), "composer": (0, 2)}
+
+# Name of a random person
+def person_name(number):
+    return "{} {} {}".format(FIRST_NAMES[number % 20], LAST_NAMES[number // 20 % 20], number)
+
+# Random movies with a heavy-tailed cast: a few people are in many films, most in one or two.
+# Every name is a new string, the way the scraped rows come back from the journal.
+def make_credits(movies, random_state):
+    people = movies * 3
+    popularity = 1 / np.arange(1, people + 1) ** 0.8
+    popularity /= popularity.sum()
+
+    counts = {role: random_state.randint(low, high + 1, size=movies) for role, (low, high) in CREDIT_SIZES.items()}
+    draws = {role: random_state.choice(people, size=counts[role].sum(), p=popularity) for role in ROLES}
+    starts = {role: np.concatenate([[0], np.cumsum(counts[role])]) for role in ROLES}
+
+    all_credits = []
+    for movie in range(movies):
+        credits = []
+        for role in ROLES:
+            numbers = dict.fromkeys(draws[role][starts[role][movie]:starts[role][movie + 1]])
+            credits += [[role, person_name(int(number))] for number in numbers]
+        all_credits.append(credits)
+
+    return all_credits
+
+# The wide columns the scraper used to return: the first few names of each role, padded with "N/A"
+def wide_columns(all_credits):
+    rows = []
+    for credits in all_credits:
+        row = []
+        for role, _, how_many in PROFESSIONS:
+            names = [name for credit_role, name in credits if credit_role == role][:how_many]
+            row += names + ["N/A"] * (how_many - len(names))
+        rows.append(row)
+
+    return pd.DataFrame(rows, columns=PEOPLE_COLUMNS, dtype="object")
+
+# Build the credit table for random movies, save it, and time "all films with X" against scanning the wide columns
+# (tests/test_people_store.py checks the lookups find every film)
+# Usage: python people_store.py [number of movies] [directory to save the tables in]
+if __name__ == "__main__":
+    import tempfile
+
+    movies = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    directory = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.mkdtemp(), "people")
+    all_credits = make_credits(movies, np.random.RandomState(0))
+    wide = wide_columns(all_credits)
+
+    t0 = time.perf_counter()
+    table = CreditTable()
+    for movie_id, credits in enumerate(all_credits):
+        table.add_movie(movie_id, credits)
+    table.build()
+    t1 = time.perf_counter()
+
+    table.write(directory)
+    saved = CreditTable.read(directory)
+
+    print("{:,} movies: {:,} credits of {:,} people built in {:.2f} s (the wide columns keep {:,} of them)".format(
+        movies, len(table), len(table.persons), t1 - t0, int((wide != "N/A").to_numpy().sum())))
+    print("memory: wide columns {:.1f} MB as Python strings, {:.1f} MB as Arrow strings, credit table {:.1f} MB".format(
+        wide.memory_usage(deep=True).sum() / 1e6, wide.astype("str").memory_usage(deep=True).sum() / 1e6, saved.memory_usage() / 1e6))
+    print("saved to {}".format(directory))
+
+    # Names that are in many films, a few films and one film
+    for person_id in [0, 10, 1000, len(saved.persons) - 1]:
+        name = saved.persons.names[person_id]
+
+        t0 = time.perf_counter()
+        scanned = np.flatnonzero((wide == name).any(axis=1).to_numpy())
+        t1 = time.perf_counter()
+        found = saved.films_with(name)
+        t2 = time.perf_counter()
+
+        print("{}: {} films ({} in the wide columns), scan {:.1f} ms, lookup {:.3f} ms".format(
+            name, len(found), len(scanned), 1000 * (t1 - t0), 1000 * (t2 - t1)))
@@ -0,0 +1,272 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import json
+import os
+import sqlite3
+import time
+import multiprocessing
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Positions of each value in a host's slice of the shared state array
+TOKENS = 0
+LAST_REFILL = 1
+CURRENT_RATE = 2
+BLOCKED_UNTIL = 3
+TOKENS_CONSUMED = 4
+TOTAL_WAIT = 5
+THROTTLED = 6
+FIELDS_PER_HOST = 7
+
+# Any host without its own limits shares this bucket
+DEFAULT_HOST = "*"
+
+# Retries of a request that failed or came back with a server error. Every attempt waits for its own token
+# and reports its own response, so the retries of one worker slow down all the others as well.
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.3
+DEFAULT_STATUS_FORCELIST = (500, 502, 504)
+
+# Throttling statuses that are retried once the host's `Retry-After` block (see `RateLimiter.report`) has passed
+RETRY_AFTER_STATUSES = (429, 503)
+
+# Buckets of a `SharedRateLimiter`: the limits each was created with and its slice of the state, as a JSON list
+RATE_LIMITS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    host TEXT PRIMARY KEY,
+    requests_per_second REAL NOT NULL,
+    burst INTEGER NOT NULL,
+    state TEXT NOT NULL
+)
+"""
+
+
+# Normalize a url to the host its bucket is stored under (`www.boxofficemojo.com` and `boxofficemojo.com` share one)
+def host_for_url(url):
+    host = (urlsplit(url).hostname or "").lower()
+
+    if host.startswith("www."):
+        host = host[4:]
+
+    return host
+
+# Same schedule urllib3's `Retry` uses: no wait before the first retry, then backoff_factor * 2^(n - 1)
+def backoff_time(attempt, backoff_factor):
+    if attempt <= 1:
+        return 0
+    return backoff_factor * (2 ** (attempt - 1))
+
+# Convert a `Retry-After` header (either seconds or an HTTP date) into seconds to wait
+def parse_retry_after(value):
+    if value is None:
+        return 0
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+# Token bucket per host, shared by every process the limiter is handed to (e.g. through a Pool initializer).
+# Waiting callers reserve a token up front, so concurrent workers queue up behind each other instead of bursting.
+# 429 and 5xx responses halve the host's rate and `Retry-After` blocks the host; successes slowly restore the rate.
+class RateLimiter:
+    def __init__(
+        self,
+        host_limits=None,
+        requests_per_second=1.0,
+        burst=1,
+        min_requests_per_second=0.1,
+        backoff_multiplier=0.5,
+        recovery_fraction=0.05,
+    ):
+        host_limits = dict(host_limits or {})
+        host_limits.setdefault(DEFAULT_HOST, (requests_per_second, burst))
+
+        self.hosts = list(host_limits)
+        self.limits = [host_limits[host] for host in self.hosts]
+        self.min_requests_per_second = min_requests_per_second
+        self.backoff_multiplier = backoff_multiplier
+        self.recovery_fraction = recovery_fraction
+
+        self.lock = multiprocessing.Lock()
+        self.state = multiprocessing.Array("d", len(self.hosts) * FIELDS_PER_HOST, lock=False)
+
+        now = time.time()
+        for slot, (rate, burst_size) in enumerate(self.limits):
+            offset = slot * FIELDS_PER_HOST
+            self.state[offset + TOKENS] = burst_size
+            self.state[offset + LAST_REFILL] = now
+            self.state[offset + CURRENT_RATE] = rate
+
+    def _slot(self, url):
+        host = host_for_url(url)
+
+        if host in self.hosts:
+            return self.hosts.index(host)
+        return self.hosts.index(DEFAULT_HOST)
+
+    # Take a token for `url` and return how many seconds the caller must wait before sending the request
+    def reserve(self, url):
+        slot = self._slot(url)
+        offset = slot * FIELDS_PER_HOST
+
+        with self.lock:
+            burst_size = self.limits[slot][1]
+            now = time.time()
+            rate = self.state[offset + CURRENT_RATE]
+
+            # Refill the bucket for the time that passed since the last request, up to the burst size
+            elapsed = now - self.state[offset + LAST_REFILL]
+            tokens = min(burst_size, self.state[offset + TOKENS] + elapsed * rate)
+
+            # A negative balance means earlier callers have already reserved future tokens
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            wait = max(wait, self.state[offset + BLOCKED_UNTIL] - now)
+
+            self.state[offset + TOKENS] = tokens - 1
+            self.state[offset + LAST_REFILL] = now
+            self.state[offset + TOKENS_CONSUMED] += 1
+            self.state[offset + TOTAL_WAIT] += wait
+
+        return wait
+
+    # Blocking version of `reserve` for the requests-based scrapers
+    def wait(self, url):
+        delay = self.reserve(url)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+    # Feed a response back into the limiter so it can adapt the host's rate.
+    # `status_code` is None for a request that got no response (a connection error or a timeout), which backs off like a 5xx.
+    def report(self, url, status_code, headers=None):
+        slot = self._slot(url)
+        offset = slot * FIELDS_PER_HOST
+
+        with self.lock:
+            configured_rate = self.limits[slot][0]
+            rate = self.state[offset + CURRENT_RATE]
+
+            if status_code is None or status_code == 429 or status_code >= 500:
+                self.state[offset + CURRENT_RATE] = max(self.min_requests_per_second, rate * self.backoff_multiplier)
+                self.state[offset + THROTTLED] += 1
+
+                retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+                if retry_after > 0:
+                    self.state[offset + BLOCKED_UNTIL] = max(self.state[offset + BLOCKED_UNTIL], time.time() + retry_after)
+            else:
+                self.state[offset + CURRENT_RATE] = min(configured_rate, rate + configured_rate * self.recovery_fraction)
+
+    # Tokens consumed, total seconds spent waiting and throttling responses seen, per host
+    def stats(self):
+        results = {}
+
+        with self.lock:
+            for slot, host in enumerate(self.hosts):
+                offset = slot * FIELDS_PER_HOST
+                results[host] = {
+                    "tokens_consumed": int(self.state[offset + TOKENS_CONSUMED]),
+                    "total_wait_seconds": round(self.state[offset + TOTAL_WAIT], 3),
+                    "throttled_responses": int(self.state[offset + THROTTLED]),
+                    "current_requests_per_second": round(self.state[offset + CURRENT_RATE], 3),
+                }
+
+        return results
+
+    # Print a short summary of the stats for the end of a crawl
+    def print_stats(self):
+        for host, host_stats in self.stats().items():
+            if host_stats["tokens_consumed"] == 0:
+                continue
+
+            print("{}: {} requests, waited {} seconds in total, {} throttled responses, ending rate {} requests/second".format(
+                host,
+                host_stats["tokens_consumed"],
+                host_stats["total_wait_seconds"],
+                host_stats["throttled_responses"],
+                host_stats["current_requests_per_second"],
+            ))
+
+
+# Lock of a `SharedRateLimiter`: one write transaction on its file, which loads the buckets when it starts and saves them when it ends
+class SharedStateLock:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.connection = None
+        self.connection_pid = None
+
+    # Don't send an open connection to other processes, they make their own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["connection"] = None
+        state["connection_pid"] = None
+        return state
+
+    def connect(self):
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.limiter.path, timeout=60, isolation_level=None)
+            self.connection.execute(RATE_LIMITS_SCHEMA)
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    # Buckets already in the file replace this process's, along with the limits they were created with
+    def __enter__(self):
+        connection = self.connect()
+        connection.execute("BEGIN IMMEDIATE")
+
+        limiter = self.limiter
+        stored = {host: (rate, burst, state) for host, rate, burst, state in connection.execute("SELECT host, requests_per_second, burst, state FROM rate_limits")}
+
+        for slot, host in enumerate(limiter.hosts):
+            if host in stored:
+                rate, burst, state = stored[host]
+                limiter.limits[slot] = (rate, burst)
+                limiter.state[slot * FIELDS_PER_HOST:(slot + 1) * FIELDS_PER_HOST] = json.loads(state)
+
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        connection = self.connection
+
+        if exception_type is not None:
+            connection.execute("ROLLBACK")
+            return False
+
+        limiter = self.limiter
+        connection.executemany(
+            "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?)",
+            [
+                (host, rate, burst, json.dumps(limiter.state[slot * FIELDS_PER_HOST:(slot + 1) * FIELDS_PER_HOST]))
+                for slot, (host, (rate, burst)) in enumerate(zip(limiter.hosts, limiter.limits))
+            ],
+        )
+        connection.execute("COMMIT")
+        return False
+
+
+# The same token buckets, kept in a SQLite file instead of shared memory, so processes that weren't started by the same
+# parent (e.g. the workers `--join-queue` adds to a queue crawl) still draw from one budget per host.
+# The first process to use a host's bucket stores its limits in the file, and every later process goes by those.
+# Every `reserve` and `report` is one short transaction on the file, which is cheap next to a request.
+class SharedRateLimiter(RateLimiter):
+    def __init__(self, path, host_limits=None, **options):
+        super().__init__(host_limits, **options)
+
+        self.path = path
+        self.state = list(self.state)
+        self.lock = SharedStateLock(self)
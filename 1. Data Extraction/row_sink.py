@@ -0,0 +1,77 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import pandas as pd
+
+# Import pyarrow for columnar record batch files
+import pyarrow as pa
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Streams scraped rows into a columnar Arrow file (and optionally a CSV) in fixed-size batches.
+# Each batch is turned into a DataFrame, passed through `transform` (e.g. the `_formatted` conversions)
+# and written out as one record batch, so memory use depends on the batch size and not on the number of rows.
+class RowSink:
+    def __init__(self, path, columns, schema, transform=None, csv_path=None, batch_size=1000):
+        self.path = path
+        self.columns = columns
+        self.schema = schema
+        self.transform = transform
+        self.csv_path = csv_path
+        self.batch_size = batch_size
+
+        self.batch = []
+        self.writer = None
+        self.rows_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, row):
+        self.batch.append(row)
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    # Format the buffered rows and write them as one record batch
+    def flush(self):
+        if not self.batch:
+            return
+
+        frame = pd.DataFrame.from_records(self.batch, columns=self.columns)
+        if self.transform is not None:
+            frame = self.transform(frame)
+
+        record_batch = pa.RecordBatch.from_pandas(frame, schema=self.schema, preserve_index=False)
+
+        if self.writer is None:
+            self.writer = pa.ipc.new_file(self.path, self.schema)
+        self.writer.write_batch(record_batch)
+
+        if self.csv_path is not None:
+            frame.to_csv(self.csv_path, mode="w" if self.rows_written == 0 else "a", header=self.rows_written == 0, index=False)
+
+        self.rows_written += len(frame)
+        self.batch = []
+
+    def close(self):
+        self.flush()
+
+        # Always leave a valid (possibly empty) file behind
+        if self.writer is None:
+            self.writer = pa.ipc.new_file(self.path, self.schema)
+            if self.csv_path is not None:
+                pd.DataFrame(columns=self.schema.names).to_csv(self.csv_path, index=False)
+
+        self.writer.close()
@@ -4,6 +4,8 @@
 
 # Import general libraries
 import pandas as pd
+import argparse
+import re
 import time
 from multiprocessing import Pool  
 from multiprocessing import cpu_count
@@ -16,16 +18,62 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# Import the shared per-host rate limiter
+from rate_limiter import RateLimiter, DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR, DEFAULT_STATUS_FORCELIST, RETRY_AFTER_STATUSES, backoff_time
+
+# Import the crawl metrics (request latencies, retries, bytes, parse times and worker utilization)
+from crawl_metrics import CrawlMetrics
+
+# Import the url frontier, which discovers the budget pages from the pagination links instead of a fixed page count
+from url_frontier import UrlFrontier, crawl_with_pool, INDEX
+
+# Import the raw html cache, used for conditional (incremental) refreshes
+from page_cache import PageCache, NOT_MODIFIED, conditional_headers, is_unchanged
+
+# Import the typed Arrow storage used for the saved dataset
+from movie_store import NUMBERS_SCHEMA, write_table
+
+# Import the vectorized money and date conversions
+from normalize import parse_money, parse_date, NUMBERS_DATE_FORMAT
+
 ############################################################
 # STEP 2: DEFINE ALL FUNCTIONS NEEDED
 ############################################################
 
+# Rate limiter, page cache and metrics shared by every worker process. Set through `init_worker` when the pool starts.
+rate_limiter = None
+page_cache = None
+metrics = None
+
+# Pool initializer so every worker process draws from the same token buckets, stores pages in the same cache
+# and records into the same metrics
+def init_worker(shared_rate_limiter, shared_page_cache=None, shared_metrics=None):
+    global rate_limiter, page_cache, metrics
+    rate_limiter = shared_rate_limiter
+    page_cache = shared_page_cache
+    metrics = shared_metrics
+
+# Fall back to a one request per second limiter (the old `time.sleep(1)` pace) when none was shared
+def get_rate_limiter():
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(requests_per_second=1.0, burst=1)
+    return rate_limiter
+
+# Metrics that are only kept by this process when none were shared
+def get_metrics():
+    global metrics
+    if metrics is None:
+        metrics = CrawlMetrics()
+    return metrics
+
 # Use a custom wrapper to allow fetching with retries if failures happen
 # https://www.peterbe.com/plog/best-practice-with-retries-with-requests
+# Responses are never retried here, not even with a `Retry-After` header: `polite_get` retries them through the rate limiter,
+# so urllib3 never sends a request or sleeps without the shared limiter knowing.
 def requests_retry_session(
     retries=3,
     backoff_factor=0.3,
-    status_forcelist=(500, 502, 504),
     session=None,
 ):
     session = session or requests.Session()
@@ -33,26 +81,118 @@ def requests_retry_session(
         total=retries,
         read=retries,
         connect=retries,
+        status=0,
         backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
+        respect_retry_after_header=False,
     )
     adapter = HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
-# Scraping function
-def scrapeWebsiteTheNumbers(url):
-    try:
-        response = requests_retry_session().get(url)
-    except Exception:
+# Wait for a token, fetch a url, report the response back to the rate limiter and store the raw page in the cache.
+# Connection errors, `status_forcelist` and `RETRY_AFTER_STATUSES` responses are retried here with the schedule of
+# `fetch_engine.fetch_text`, and every attempt waits for its own token and reports its own response (or its failure).
+# After the last attempt the error is raised, like the urllib3 retries used to.
+# The time of the request (all attempts, without the waits for a token), its size and its retries are recorded in the metrics
+def polite_get(url, headers=None, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, status_forcelist=DEFAULT_STATUS_FORCELIST):
+    limiter = get_rate_limiter()
+    session = requests_retry_session(retries=0)
+    elapsed = 0
+
+    for attempt in range(retries + 1):
+        time.sleep(backoff_time(attempt, backoff_factor))
+        limiter.wait(url)
+
+        t0 = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers)
+        except requests.RequestException:
+            elapsed += time.perf_counter() - t0
+            limiter.report(url, None)
+
+            if attempt < retries:
+                continue
+            get_metrics().observe_request(url, elapsed, retries=attempt, failed=True)
+            raise
+
+        elapsed += time.perf_counter() - t0
+        limiter.report(url, response.status_code, response.headers)
+
+        if response.status_code not in status_forcelist and response.status_code not in RETRY_AFTER_STATUSES:
+            break
+
+        if attempt == retries:
+            get_metrics().observe_request(url, elapsed, len(response.content), attempt, failed=True)
+            raise requests.exceptions.RetryError("{} answered {} after {} attempts".format(url, response.status_code, attempt + 1), response=response)
+
+    get_metrics().observe_request(url, elapsed, len(response.content), attempt, response.status_code >= 400)
+
+    # A 304 response has no body, the cache keeps the copy it already has
+    if page_cache is not None and response.status_code != 304:
+        response.digest = page_cache.put(url, response.text, response.status_code, response.headers)
+
+    return response
+
+# The url addresses describe the entries by ranking: /1 covers numbers 1 - 100, /101 covers entries 101-200, etc.
+# Every page links to the pages around it, so the last page is found by following the links from the first one.
+BUDGETS_URL = "https://www.the-numbers.com/movie/budgets/all/{}"
+
+# Budget pages a budget page links to, as (url, kind) pairs for the url frontier
+def budget_page_links(html):
+    starts = re.findall(r'href="(?:https?://www\.the-numbers\.com)?/movie/budgets/all/(\d+)"', html)
+    return [(BUDGETS_URL.format(start), INDEX) for start in starts]
+
+# Ranking of the first movie of a budget page, to put the pages back in order
+def budget_page_start(url):
+    return int(url.rstrip("/").rsplit("/", 1)[1])
+
+# Parse a budget page for the frontier crawl: its movies and the budget pages it links to
+def parse_budget_page(html):
+    return parse_numbers_page(html), budget_page_links(html)
+
+# Scraping function for the frontier crawl: returns (movies, links), or (0, []) if the page couldn't be fetched
+def scrapeWebsiteTheNumbers(url, kind=INDEX):
+    with get_metrics().task():
+        # The rate limiter spaces out requests across all workers
+        try:
+            response = polite_get(url)
+        except Exception:
+            return 0, []
+
+        return get_metrics().parse(parse_budget_page, response.text)
+
+# Refresh a budget page that was scraped before
+# Sends a conditional GET with the cached ETag/Last-Modified and returns NOT_MODIFIED instead of parsing
+# when the server answers 304 or the page's content hash has not changed (the pages it links to are already in the frontier)
+def refreshWebsiteTheNumbers(url, kind=INDEX):
+    previous = page_cache.latest(url)
+
+    with get_metrics().task():
+        try:
+            response = polite_get(url, headers=conditional_headers(previous))
+        except Exception:
+            return 0, []
+
+        if response.status_code == 304 or is_unchanged(previous, response.digest):
+            return NOT_MODIFIED, []
+
+        return get_metrics().parse(parse_budget_page, response.text)
+
+# Movies of the latest successfully cached copy of a budget page, or 0 if there is none.
+# Used for the pages a refresh found unchanged, so the whole dataset is rebuilt page by page without fetching them again.
+def parse_cached_budget_page(url):
+    digest = page_cache.latest_page(url)
+    if digest is None:
         return 0
 
-    # Through previous analysis, I learned the website is encoded with "ISO-8859-1".
-    soup = BeautifulSoup(response.text, "lxml", from_encoding="iso-8859-1")
+    return parse_numbers_page(page_cache.get_text(digest))
 
-    # Sleep to prevent fetching too many pages at once
-    time.sleep(1)
+# Extract every movie in the table of a budget page
+# `parser` is the BeautifulSoup tree builder ("lxml" or "html.parser")
+def parse_numbers_page(html, parser="lxml"):
+    # Through previous analysis, I learned the website is encoded with "ISO-8859-1".
+    soup = BeautifulSoup(html, parser, from_encoding="iso-8859-1")
 
     # Create list to store all movies on a page
     page_data = []
@@ -98,70 +238,122 @@ def scrapeWebsiteTheNumbers(url):
 
     return page_data
 
+# DataFrame of the movies of a list of parsed budget pages, skipping the pages that failed
+def pages_to_frame(results):
+    rows = [row for page in results if page != 0 for row in page]
+    return pd.DataFrame.from_records(rows, columns=["rank", "release_date", "title", "production_budget", "domestic_gross", "worldwide_gross"])
+
+# Convert the scraped strings to numeric and datetime types
+def format_numbers_data(movie_data):
+    movie_data["rank"] = pd.to_numeric(movie_data["rank"], errors="coerce")
+
+    movie_data["release_date"] = parse_date(movie_data["release_date"], NUMBERS_DATE_FORMAT)
+
+    movie_data["production_budget"] = parse_money(movie_data["production_budget"])
+    movie_data["domestic_gross"] = parse_money(movie_data["domestic_gross"])
+    movie_data["worldwide_gross"] = parse_money(movie_data["worldwide_gross"])
+
+    return movie_data
+
 #############################################################
 # STEP 3: MAIN PROGRAM
 #############################################################
 
 if __name__ =="__main__":
-    '''
-    The URL addresses describe the entries by ranking.
-    For example, /1 covers numbers 1 - 100. 
-    /101 covers entries 101-200, etc.
-    The last page in the list is /5701.
-    ''' 
-    pages = [str(i * 100 + 1) for i in range(58)]
+    parser = argparse.ArgumentParser(description="Scrape production budgets from The Numbers")
+    parser.add_argument("--requests-per-second", type=float, default=2.0,
+                        help="Sustained request rate allowed against the-numbers.com, shared by all workers")
+    parser.add_argument("--burst", type=int, default=4,
+                        help="Number of requests that may be sent back to back before the rate applies")
+    parser.add_argument("--cache-dir", default="page_cache",
+                        help="Directory of the raw html page cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Refresh the budget pages with conditional GETs, parse only the changed ones and take the rest from the page cache")
+    parser.add_argument("--frontier", default="the_numbers_frontier.jsonl",
+                        help="Every budget page found so far; known pages are all queued at once and only new ones are discovered")
+    parser.add_argument("--metrics", default="the_numbers_crawl_metrics.json",
+                        help="File the crawl metrics are written to at the end of the run (.json, or .prom for the Prometheus text format)")
+    args = parser.parse_args()
+
+    # Raw html of every fetched page is kept so unchanged pages can be skipped next time
+    page_cache = PageCache(args.cache_dir)
+
+    # One rate limiter for the whole crawl, shared with every worker process
+    rate_limiter = RateLimiter(
+        {"the-numbers.com": (args.requests_per_second, args.burst)},
+        requests_per_second=args.requests_per_second,
+        burst=args.burst,
+    )
+
+    # Request, parse and worker metrics for the whole run, shared with every worker process like the rate limiter
+    metrics = CrawlMetrics(["the-numbers.com"])
 
-    urls = ["https://www.the-numbers.com/movie/budgets/all/{}".format(page) for page in pages]
+    # Budget pages found by earlier runs, starting from the first one
+    frontier = UrlFrontier(args.frontier)
+    frontier.add([(BUDGETS_URL.format(1), INDEX)])
+
+    # The rankings shift as movies are added, so every known page is fetched again and new ones are found from their links
+    frontier.refresh(INDEX)
 
     ############################################################
     # STEP 4: USE THREADS TO SPEED UP WEBSCRAPING
     ############################################################
 
-    print("Starting scrape")
+    print("Starting scrape of {} known budget pages".format(len(frontier.pending())))
+
+    results_by_url = {}
 
     # Set up threads to speed up web-scraping
-    pool = Pool(cpu_count() * 2)  
-    results = pool.map(scrapeWebsiteTheNumbers, urls)
-    pool.close()
-    pool.join()
+    with frontier, metrics.stage("scrape"):
+        pool = Pool(cpu_count() * 2, initializer=init_worker, initargs=(rate_limiter, page_cache, metrics))
+        crawl_with_pool(pool, frontier, refreshWebsiteTheNumbers if args.incremental else scrapeWebsiteTheNumbers,
+                        on_result=lambda url, kind, result: results_by_url.__setitem__(url, result), window=cpu_count() * 4)
+        pool.close()
+        pool.join()
 
-    print("Scrape finished")
+    # Pages finish in any order, put them back in ranking order
+    urls = sorted(results_by_url, key=budget_page_start)
 
-    ############################################################
-    # STEP 5: PRELIMINARY CLEANUP
-    ############################################################
+    rate_limiter.print_stats()
+    metrics.print_summary()
+    metrics.write(args.metrics)
 
-    # Flatten results to be a list of lists (not a list of list of lists)
-    flattened_results = [item for sublist in results for item in sublist]
+    # The dataset is keyed on the budget page: a changed page's fresh rows replace all of its old rows (including a corrected release date),
+    # and a page that is unchanged, or couldn't be fetched this time, keeps the rows of its latest cached copy.
+    # So the full dataset is rebuilt from every page, whether or not the_numbers_movie_data.arrow exists.
+    if args.incremental:
+        changed_urls = [url for url in urls if results_by_url[url] not in (NOT_MODIFIED, 0)]
+        print("{} of {} budget pages changed".format(len(changed_urls), len(urls)))
 
-    # Eliminate bad records
-    flattened_results = [result for result in flattened_results if result is not 0]
+        delta = format_numbers_data(pages_to_frame([results_by_url[url] for url in changed_urls]))
+        delta.to_csv("the_numbers_movie_data_delta.csv", index=False)
 
-    # Store the results in a DataFrame
-    movie_data = pd.DataFrame.from_records(flattened_results, columns=["rank", "release_date", "title", "production_budget", "domestic_gross", "worldwide_gross"])
+        for url in urls:
+            if results_by_url[url] in (NOT_MODIFIED, 0):
+                results_by_url[url] = parse_cached_budget_page(url)
 
-    # Preliminary data cleanup -- converting appropriate data to numeric or datetime type
-    movie_data["rank"] = pd.to_numeric(movie_data["rank"], errors="coerce")
+    results = [results_by_url[url] for url in urls]
 
-    movie_data["release_date"] = pd.to_datetime(movie_data["release_date"], errors="coerce")
+    print("Scrape finished")
 
-    movie_data["production_budget"] = movie_data["production_budget"].str.replace(",", "").str.replace("$", "")
-    movie_data["production_budget"] = pd.to_numeric(movie_data["production_budget"], errors="coerce")
+    ############################################################
+    # STEP 5: PRELIMINARY CLEANUP
+    ############################################################
 
-    movie_data["domestic_gross"] = movie_data["domestic_gross"].str.replace(",", "").str.replace("$", "")
-    movie_data["domestic_gross"] = pd.to_numeric(movie_data["domestic_gross"], errors="coerce")
+    # Store the movies of every page in a DataFrame, leaving out the pages that failed
+    movie_data = pages_to_frame(results)
 
-    movie_data["worldwide_gross"] = movie_data["worldwide_gross"].str.replace(",", "").str.replace("$", "")
-    movie_data["worldwide_gross"] = pd.to_numeric(movie_data["worldwide_gross"], errors="coerce")
+    # Preliminary data cleanup -- converting appropriate data to numeric or datetime type
+    movie_data = format_numbers_data(movie_data)
 
     ############################################################
     # STEP 6: SAVE SCRAPED DATA FOR FURTHER ANALYSIS
     ############################################################
 
-    # Save movie_data as a pickle
-    movie_data.to_pickle("the_numbers_movie_data.pkl")
+    # Save movie_data as a typed Arrow file
+    write_table(movie_data, "the_numbers_movie_data.arrow", NUMBERS_SCHEMA)
 
     # Save movie_data as a CSV
     movie_data.to_csv("the_numbers_movie_data.csv", index=False)
 
-    print("Files written!")
\ No newline at end of file
+    print("Files written!")
@@ -0,0 +1,188 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import json
+import os
+import queue
+import time
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Kinds of urls in the frontier. Index pages (letter pages, budget pages) list other pages and are crawled first,
+# so discovering the site keeps ahead of scraping it. Pages are the movie pages the rows come from.
+INDEX = "index"
+PAGE = "page"
+KINDS = [INDEX, PAGE]
+
+# Statuses written to the seen file. A url is "seen" once it is in the frontier and "done" once it was fetched and parsed.
+SEEN = "seen"
+DONE = "done"
+
+
+# Key a url is deduplicated on: `www.boxofficemojo.com` and `boxofficemojo.com` are the same page, and so are two links
+# that only differ by a fragment
+def canonical_url(url):
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+
+    if host.startswith("www."):
+        host = host[4:]
+
+    return urlunsplit((parts.scheme.lower(), host, parts.path, parts.query, ""))
+
+
+# Every url a crawl has discovered, deduplicated, with the ones that still have to be fetched.
+# The seen set is appended to a file (one JSON object per line: {"url": ..., "kind": ..., "status": ..., "time": ...})
+# in batches like the crawl journal, so the next run starts with every page it already knows about
+# instead of discovering them again one index page at a time.
+# Only the process that runs the crawl loop touches the frontier; the fetching happens concurrently around it.
+class UrlFrontier:
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.file = None
+
+        # canonical url -> (url, kind), in the order the urls were first seen
+        self.seen = {}
+        self.done = set()
+
+        self.load()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    # Read the seen file back, skipping a half-written last line left by a crash
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding="utf-8") as seen_file:
+            for line in seen_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                key = canonical_url(entry["url"])
+                self.seen.setdefault(key, (entry["url"], entry["kind"]))
+
+                if entry["status"] == DONE:
+                    self.done.add(key)
+
+    def write(self, url, kind, status):
+        self.buffer.append(json.dumps({"url": url, "kind": kind, "status": status, "time": time.time()}))
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    # Write buffered entries and make sure they reach the disk
+    def flush(self):
+        if not self.buffer:
+            return
+
+        self.open()
+        self.file.write("\n".join(self.buffer) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.buffer = []
+
+    # Add (url, kind) pairs and return the ones that had never been seen, in order
+    def add(self, links):
+        added = []
+
+        for url, kind in links:
+            key = canonical_url(url)
+            if key in self.seen:
+                continue
+
+            self.seen[key] = (url, kind)
+            self.write(url, kind, SEEN)
+            added.append((url, kind))
+
+        return added
+
+    # Record that a url was fetched and parsed, so the next run does not fetch it again
+    def mark_done(self, url):
+        key = canonical_url(url)
+        if key in self.done:
+            return
+
+        self.done.add(key)
+        self.write(url, self.seen.get(key, (url, PAGE))[1], DONE)
+
+    # Fetch every url of `kind` again in this run (e.g. the index pages, to discover the pages added since the last crawl)
+    # Nothing is written: a url that isn't fetched again this time is still done in the seen file.
+    def refresh(self, kind):
+        self.done -= {key for key, (_, url_kind) in self.seen.items() if url_kind == kind}
+
+    # Every url of `kind` that was seen, in the order they were first seen
+    def urls(self, kind):
+        return [url for url, url_kind in self.seen.values() if url_kind == kind]
+
+    # (url, kind) pairs that still have to be fetched, index pages first
+    def pending(self):
+        pending = [(url, kind) for key, (url, kind) in self.seen.items() if key not in self.done]
+        return sorted(pending, key=lambda link: KINDS.index(link[1]))
+
+# Crawl the pending urls of a frontier with a multiprocessing pool.
+# `scrape_page(url, kind)` runs in the workers (so it must be module-level) and returns (result, links): its result for the page
+# (0 for a failure) and the (url, kind) links found on it. New links are added to the frontier and submitted as soon as they come back,
+# with index pages ahead of the others, so the pool discovers and scrapes at the same time.
+# At most `window` pages are in flight, which keeps newly found index pages from queueing behind every known page.
+# `on_result(url, kind, result)` is called for every page in the order they finish.
+def crawl_with_pool(pool, frontier, scrape_page, pending=None, on_result=None, window=16):
+    waiting = {kind: deque() for kind in KINDS}
+    for url, kind in frontier.pending() if pending is None else pending:
+        waiting[kind].append((url, kind))
+
+    finished = queue.Queue()
+    in_flight = 0
+
+    def submit(url, kind):
+        pool.apply_async(
+            scrape_page, (url, kind),
+            callback=lambda value: finished.put((url, kind, value)),
+            error_callback=lambda error: finished.put((url, kind, (0, []))),
+        )
+
+    while True:
+        for kind in KINDS:
+            while waiting[kind] and in_flight < window:
+                submit(*waiting[kind].popleft())
+                in_flight += 1
+
+        if in_flight == 0:
+            break
+
+        url, kind, (result, links) = finished.get()
+        in_flight -= 1
+
+        for link in frontier.add(links):
+            waiting[link[1]].append(link)
+
+        if result != 0:
+            frontier.mark_done(url)
+
+        if on_result is not None:
+            on_result(url, kind, result)
@@ -0,0 +1,239 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Import the url key the frontier deduplicates on, so both agree on what a duplicate link is
+from url_frontier import canonical_url, INDEX
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    updated_at REAL NOT NULL
+)
+"""
+
+OPTIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS options (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)
+"""
+
+# Statuses of a task. A leased task whose lease has expired is handed out again as if it were pending.
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+# Name a worker leases tasks under: its host and process
+def worker_name():
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+# Durable queue of (url, kind) crawl tasks in one SQLite file, which any number of worker processes can join or leave mid-crawl.
+# A worker leases a few tasks at a time for `lease_seconds`. If it finishes them, their results are stored with the tasks;
+# if it dies or hangs, the leases expire and the tasks go to the next worker that asks. A task that failed `max_attempts` times is left as failed.
+# All the workers must run on the same machine: in WAL mode SQLite shares memory between the connections, which a network filesystem can't do.
+# Safe to share between processes: every process opens its own connection, like the page cache.
+class WorkQueue:
+    def __init__(self, path, lease_seconds=300, max_attempts=5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = None
+        self.connection_pid = None
+
+        connection = self.connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(QUEUE_SCHEMA)
+        connection.execute(OPTIONS_SCHEMA)
+
+    # Don't send an open connection to other processes, they make their own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["connection"] = None
+        state["connection_pid"] = None
+        return state
+
+    # Statements run in autocommit mode unless they are in a `transaction`
+    def connect(self):
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    # Take the write lock up front, so two workers can't lease the same task
+    @contextmanager
+    def transaction(self):
+        connection = self.connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    # Settings every worker reads from the queue, e.g. which scrape function the tasks are for
+    def set_option(self, key, value):
+        self.connect().execute("INSERT OR REPLACE INTO options VALUES (?, ?)", (key, value))
+
+    def option(self, key, default=None):
+        row = self.connect().execute("SELECT value FROM options WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    # Queue (url, kind) pairs. Urls already in the queue, in whatever status, are skipped. Returns the number added.
+    def add(self, links):
+        now = time.time()
+
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO tasks (key, url, kind, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((canonical_url(url), url, kind, PENDING, now) for url, kind in links),
+            )
+            return connection.total_changes - before
+
+    # Lease up to `count` tasks for `owner`, index pages first and otherwise in the order they were queued.
+    # Returns (url, kind) pairs; an empty list means there is nothing to hand out right now.
+    def lease(self, owner, count=1):
+        now = time.time()
+
+        with self.transaction() as connection:
+            # Tasks whose last lease ran out after their last attempt are given up on
+            connection.execute(
+                "UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL, updated_at = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, now, LEASED, now, self.max_attempts),
+            )
+
+            rows = connection.execute(
+                "SELECT position, url, kind FROM tasks WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY CASE kind WHEN ? THEN 0 ELSE 1 END, position LIMIT ?",
+                (PENDING, LEASED, now, INDEX, count),
+            ).fetchall()
+
+            connection.executemany(
+                "UPDATE tasks SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE position = ?",
+                [(LEASED, owner, now + self.lease_seconds, now, position) for position, _, _ in rows],
+            )
+
+        return [(url, kind) for _, url, kind in rows]
+
+    # Push back the expiry of every task `owner` holds, to show it is still working on them
+    def extend(self, owner):
+        now = time.time()
+        self.connect().execute(
+            "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE status = ? AND owner = ?",
+            (now + self.lease_seconds, now, LEASED, owner),
+        )
+
+    # Store the result of a leased task. Returns False if the lease was lost to another worker meanwhile (its result wins).
+    def complete(self, owner, url, result):
+        cursor = self.connect().execute(
+            "UPDATE tasks SET status = ?, result = ?, owner = NULL, lease_expires = NULL, updated_at = ? WHERE key = ? AND status = ? AND owner = ?",
+            (DONE, json.dumps(result), time.time(), canonical_url(url), LEASED, owner),
+        )
+        return cursor.rowcount == 1
+
+    # Give a task that failed back to the queue, or give up on it after `max_attempts`
+    def fail(self, owner, url):
+        cursor = self.connect().execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE key = ? AND status = ? AND owner = ?",
+            (self.max_attempts, FAILED, PENDING, time.time(), canonical_url(url), LEASED, owner),
+        )
+        return cursor.rowcount == 1
+
+    # Hand back every task `owner` still holds (a worker leaving cleanly). The attempt isn't counted against them.
+    def release(self, owner):
+        self.connect().execute(
+            "UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL, attempts = attempts - 1, updated_at = ? WHERE status = ? AND owner = ?",
+            (PENDING, time.time(), LEASED, owner),
+        )
+
+    # Number of tasks in each status
+    def counts(self):
+        counts = dict.fromkeys([PENDING, LEASED, DONE, FAILED], 0)
+        counts.update(self.connect().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        return counts
+
+    # Whether every task is done or failed
+    def finished(self):
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    # (url, kind, status, result) of every task in the order they were queued, with the result of the done ones
+    def tasks(self):
+        for url, kind, status, result in self.connect().execute("SELECT url, kind, status, result FROM tasks ORDER BY position"):
+            yield url, kind, status, None if result is None else json.loads(result)
+
+    # Remove the queue file once its results have been copied out, so the next crawl starts from an empty queue
+    def delete(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+# Lease and run tasks until the queue is finished, then leave.
+# `scrape_page(url, kind)` returns (result, links) like the frontier crawls: its result for the page (0 for a failure)
+# and the (url, kind) links found on it, which are queued for any worker to pick up.
+# While other workers still hold leases, this one waits in case they expire. Returns the number of tasks it ran.
+def run_worker(queue, scrape_page, owner=None, batch_size=4, poll_seconds=1.0):
+    owner = owner or worker_name()
+    processed = 0
+
+    try:
+        while True:
+            tasks = queue.lease(owner, batch_size)
+
+            if not tasks:
+                if queue.finished():
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            for url, kind in tasks:
+                queue.extend(owner)
+
+                try:
+                    result, links = scrape_page(url, kind)
+                except Exception:
+                    result, links = 0, []
+
+                if links:
+                    queue.add(links)
+
+                if result == 0:
+                    queue.fail(owner, url)
+                else:
+                    queue.complete(owner, url, result)
+
+                processed += 1
+    finally:
+        queue.release(owner)
+
+    return processed
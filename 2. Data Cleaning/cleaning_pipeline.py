@@ -0,0 +1,435 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import argparse
+import hashlib
+import inspect
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+# Import pyarrow to cache the output of every stage with its column types
+import pyarrow as pa
+
+# The scraper helpers (typed storage, money parsing) live in the extraction folder
+PIPELINE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PIPELINE_DIRECTORY, os.pardir, "1. Data Extraction"))
+
+from movie_store import MOJO_COLUMNS, CLEANED_SCHEMA, read_table, write_table
+from normalize import parse_money
+from crawl_metrics import CrawlMetrics
+
+from duplicates import resolve_consecutive_year_duplicates
+from reconciliation import RECONCILIATION_RULES, reconcile_sources
+from title_matching import link_titles
+from inflation_factors import FACTORS_PATH, read_factor_table, factor_series, conversion_factors, convert_to_year
+
+# The helper modules themselves, whose code is part of the cache key of the stages that call them
+import movie_store
+import normalize
+import duplicates
+import reconciliation
+import title_matching
+import inflation_factors
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# The steps of `Data_Cleaning.ipynb` as a command line pipeline.
+# Every stage is a function of the outputs of the stages (or input files) it depends on.
+# Its output is cached under a key made from its code and the keys of its inputs,
+# so a rerun only recomputes the stages downstream of an input file or a stage that changed.
+
+# Dollar amounts are converted to 2018 dollars
+TARGET_YEAR = 2018
+
+# Box Office Mojo columns renamed with a `_mojo` suffix. `title` is kept as is because the datasets are joined on it.
+MOJO_RENAMES = dict(
+    {
+        "distributor": "distributor_mojo",
+        "rating": "rating_mojo",
+        "genres": "genres_mojo",
+        "production_budget": "production_budget_mojo",
+        "runtime_formatted": "runtime_mojo",
+        "release_date_formatted": "release_date_mojo",
+        "domestic_gross_formatted": "domestic_gross_mojo",
+        "foreign_gross_formatted": "foreign_gross_mojo",
+        "worldwide_gross_formatted": "worldwide_gross_mojo",
+        "adjusted_domestic_gross_2019_formatted": "adjusted_domestic_gross_2019_mojo",
+    },
+    **{column: "{}_mojo".format(column) for column in MOJO_COLUMNS[11:]}
+)
+
+MOJO_CLEAN_COLUMNS = ["title", "release_year", "release_date_mojo", "distributor_mojo", "runtime_mojo",
+                      "rating_mojo", "genres_mojo", "production_budget_mojo", "domestic_gross_mojo",
+                      "foreign_gross_mojo", "worldwide_gross_mojo", "adjusted_domestic_gross_2019_mojo"] + ["{}_mojo".format(column) for column in MOJO_COLUMNS[11:]]
+
+NUMBERS_RENAMES = {
+    "release_date": "release_date_numbers",
+    "rank": "rank_numbers",
+    "production_budget": "production_budget_numbers",
+    "domestic_gross": "domestic_gross_numbers",
+    "worldwide_gross": "worldwide_gross_numbers",
+}
+
+NUMBERS_CLEAN_COLUMNS = ["title", "release_year", "release_date_numbers", "rank_numbers", "production_budget_numbers", "domestic_gross_numbers", "worldwide_gross_numbers"]
+
+# Rows the scraper got wrong (every field shifted by one), corrected by hand from the movies' pages:
+# https://www.boxofficemojo.com/movies/?id=picnicathangingrock98.htm and https://www.boxofficemojo.com/movies/?id=zyzzyxroad.htm
+# Keyed on the title and the rating that ended up in `production_budget_mojo`, so other movies with the same title are left alone
+MANUAL_FIXES = {
+    ("Picnic at Hanging Rock (Re-issue)", "PG"): {
+        "release_year": 1998,
+        "release_date_mojo": pd.Timestamp("1998-06-26"),
+        "distributor_mojo": "Kit Parker Films",
+        "runtime_mojo": 107,
+        "rating_mojo": "PG",
+        "genres_mojo": "Unknown",
+        "production_budget_mojo": np.nan,
+        "domestic_gross_mojo": 232201,
+    },
+    ("Zyzzyx Road", "Unrated"): {
+        "release_year": 2006,
+        "release_date_mojo": pd.Timestamp("2006-02-25"),
+        "distributor_mojo": "Regent Releasing",
+        "runtime_mojo": 90,
+        "rating_mojo": "Unrated",
+        "genres_mojo": "Thriller",
+        "production_budget_mojo": "2000000",
+        "domestic_gross_mojo": 30,
+    },
+}
+
+# Consolidated money columns converted to 2018 dollars
+MONEY_COLUMNS = ["production_budget", "domestic_gross", "worldwide_gross"]
+
+# Columns stored as nullable integers in the cleaned data
+INTEGER_COLUMNS = ["release_week", "release_year", "runtime_mojo", "production_budget_mojo", "domestic_gross_mojo", "foreign_gross_mojo",
+                   "worldwide_gross_mojo", "adjusted_domestic_gross_2019_mojo", "rank_numbers", "production_budget_numbers",
+                   "domestic_gross_numbers", "worldwide_gross_numbers", "budget", "budget_adj", "domestic", "domestic_adj", "worldwide", "worldwide_adj"]
+
+
+# Stage: read the Box Office Mojo dataset, keep and rename the columns used later and fix the badly scraped rows
+def load_mojo(path):
+    mojo = read_table(path)
+
+    mojo = mojo.drop(labels=["runtime", "release_date", "domestic_gross", "foreign_gross", "worldwide_gross", "adjusted_domestic_gross_2019"], axis=1)
+    mojo = mojo.rename(mapper=MOJO_RENAMES, axis=1)
+
+    # Cast `release_year` as Nullable Integer Data Type to allow comparisons as integers and still have missing values
+    mojo["release_year"] = mojo["release_date_mojo"].dt.year.astype("Int64")
+    mojo["runtime_mojo"] = mojo["runtime_mojo"].astype("Int64")
+
+    mojo = mojo[MOJO_CLEAN_COLUMNS]
+
+    # Only analyze movies that were released up to 2018 to prevent incomplete box office numbers (movies without a year are kept)
+    mojo = mojo[~(mojo["release_year"] > TARGET_YEAR).fillna(False)]
+
+    # We only want entries that have a title, and no duplicate rows
+    mojo = mojo[~mojo["title"].isna()]
+    mojo = mojo.drop_duplicates()
+
+    # The fixes are matched on the row's content instead of its position, so they keep working when the rows move around between scrapes
+    mojo["production_budget_mojo"] = mojo["production_budget_mojo"].astype("object")
+    for (title, scraped_budget), fixes in MANUAL_FIXES.items():
+        rows = (mojo["title"] == title) & (mojo["production_budget_mojo"] == scraped_budget)
+        for column, value in fixes.items():
+            mojo.loc[rows, column] = value
+
+    # "$30 million" and "$30,000,000" both become 30000000
+    mojo["production_budget_mojo"] = parse_money(mojo["production_budget_mojo"])
+
+    return mojo.reset_index(drop=True)
+
+# Stage: read The Numbers dataset and rename its columns with a `_numbers` suffix
+def load_numbers(path):
+    numbers = read_table(path)
+
+    numbers["release_year"] = numbers["release_date"].dt.year.astype("Int64")
+    numbers = numbers.rename(mapper=NUMBERS_RENAMES, axis=1)
+    numbers = numbers[NUMBERS_CLEAN_COLUMNS]
+
+    # Only analyze movies that were released up to 2018 to prevent incomplete box office numbers (movies without a year are kept)
+    numbers = numbers[~(numbers["release_year"] > TARGET_YEAR).fillna(False)]
+
+    return numbers.reset_index(drop=True)
+
+# Stage: join the two datasets on `title` and `release_year`
+def outer_merge(mojo, numbers):
+    return pd.merge(mojo, numbers, how="outer", on=["title", "release_year"], suffixes=["_mojo", "_numbers"])
+
+# Stage (with --fuzzy-titles, instead of `outer_merge`): also join the movies whose titles are written differently on the two websites.
+# The Numbers rows linked by `title_matching.py` take the title and release year of their Box Office Mojo movie before the merge,
+# and keep the confidence of the link in `title_match_confidence`.
+def fuzzy_outer_merge(mojo, numbers):
+    links = link_titles(mojo, numbers)
+    print("Linked {} of {} The Numbers movies ({} with a different title or year)".format(
+        len(links), len(numbers), ((links["confidence"] < 1) | (links["left_title"] != links["right_title"])).sum()
+    ))
+
+    numbers = numbers.copy()
+    numbers["title_match_confidence"] = np.nan
+    numbers.loc[links["right_index"], "title"] = links["left_title"].to_numpy()
+    numbers.loc[links["right_index"], "release_year"] = mojo.loc[links["left_index"], "release_year"].to_numpy()
+    numbers.loc[links["right_index"], "title_match_confidence"] = links["confidence"].to_numpy()
+
+    return outer_merge(mojo, numbers)
+
+# Stage: the same movie is often listed with a release year one apart on the two websites.
+# Titles found in consecutive years where neither row already has data from both websites are combined into one row.
+# If any title has both `release_date_mojo` and `release_date_numbers`, then it has already been merged on,
+# and we assume another matching title in this instance is a separate movie. See `duplicates.py` for how the rows are matched.
+def dedupe(outer_merged):
+    return resolve_consecutive_year_duplicates(outer_merged, MOJO_CLEAN_COLUMNS, NUMBERS_CLEAN_COLUMNS)
+
+# Stage: consolidate the columns both websites have into `release_date`, `production_budget`, `domestic_gross` and `worldwide_gross`.
+# The release date from Box Office Mojo is used if it exists, the numbers are averaged where both websites have one (see `reconciliation.py`).
+def reconcile(outer_merged):
+    return reconcile_sources(outer_merged, RECONCILIATION_RULES)
+
+# Round money columns and store them as nullable integers
+def to_whole_dollars(values):
+    return values.astype("float64").round().astype("Int64")
+
+# Stage: convert the dollar amounts to 2018 dollars with both the ticket price and the CPI methods.
+# Both use the yearly table saved by `inflation_factors.py`, looked up by `release_year`.
+def inflation(outer_merged, factors_path):
+    factors = read_factor_table(factors_path)
+    ticket_prices = factor_series(factors, "ticket_price")
+
+    outer_merged = outer_merged.copy()
+
+    # Conversion using ticket prices
+    outer_merged["price_conversion"] = conversion_factors(ticket_prices, outer_merged["release_year"], TARGET_YEAR)
+
+    converted = to_whole_dollars(convert_to_year(outer_merged, MONEY_COLUMNS, outer_merged["release_year"], TARGET_YEAR, ticket_prices))
+    for column in MONEY_COLUMNS:
+        outer_merged["{}_ticket_conversion_{}".format(column, TARGET_YEAR)] = converted[column]
+
+    # Conversion using CPI, which won't work with missing release years
+    outer_merged = outer_merged[outer_merged["release_date"].notna()].reset_index(drop=True)
+
+    converted = to_whole_dollars(convert_to_year(outer_merged, MONEY_COLUMNS, outer_merged["release_year"], TARGET_YEAR, factor_series(factors, "cpi")))
+    for column, adjusted_column in [("domestic_gross", "domestic_cpi_adjusted"), ("worldwide_gross", "worldwide_cpi_adjusted"), ("production_budget", "production_budget_cpi_adjusted")]:
+        outer_merged[adjusted_column] = converted[column]
+
+    # Compare the two methods
+    outer_merged["domestic_conversion_difference"] = outer_merged["domestic_gross_ticket_conversion_2018"] - outer_merged["domestic_cpi_adjusted"]
+    outer_merged["worldwide_conversion_difference"] = outer_merged["worldwide_gross_ticket_conversion_2018"] - outer_merged["worldwide_cpi_adjusted"]
+    outer_merged["production_budget_conversion_difference"] = outer_merged["production_budget_ticket_conversion_2018"] - outer_merged["production_budget_cpi_adjusted"]
+
+    # Release week of the year (1 - 53), used in the analysis
+    outer_merged["release_week"] = outer_merged["release_date"].dt.isocalendar().week.astype("Int64")
+
+    # Shorter names for the columns used in the analysis
+    outer_merged = outer_merged.rename(mapper={
+        "production_budget": "budget",
+        "production_budget_cpi_adjusted": "budget_adj",
+        "domestic_gross": "domestic",
+        "domestic_cpi_adjusted": "domestic_adj",
+        "worldwide_gross": "worldwide",
+        "worldwide_cpi_adjusted": "worldwide_adj",
+    }, axis=1)
+
+    for column in INTEGER_COLUMNS:
+        outer_merged[column] = outer_merged[column].astype("Int64")
+
+    return outer_merged
+
+# Stage: save the cleaned data for the analysis
+def write(outer_merged, output_path):
+    write_table(outer_merged, output_path, CLEANED_SCHEMA)
+    outer_merged[CLEANED_SCHEMA.names].to_csv("{}.csv".format(os.path.splitext(output_path)[0]), index=False)
+
+
+# The pipeline: (stage name, function, inputs). An input is either an earlier stage or one of the named input files.
+STAGES = [
+    ("load_mojo", load_mojo, ["mojo_file"]),
+    ("load_numbers", load_numbers, ["numbers_file"]),
+    ("outer_merge", outer_merge, ["load_mojo", "load_numbers"]),
+    ("dedupe", dedupe, ["outer_merge"]),
+    ("reconcile", reconcile, ["dedupe"]),
+    ("inflation", inflation, ["reconcile", "factors_file"]),
+    ("write", write, ["inflation", "output_file"]),
+]
+
+# Code and settings each stage depends on besides its own function: the modules of the helpers it calls and the module constants it reads.
+# Their source (or value, for constants) is part of the stage's key, so editing any of them reruns the stage and everything downstream.
+# Bump PIPELINE_VERSION for a change they don't cover (e.g. a new pandas version that changes results).
+PIPELINE_VERSION = 1
+
+STAGE_DEPENDENCIES = {
+    "load_mojo": [movie_store, normalize, MOJO_RENAMES, MOJO_CLEAN_COLUMNS, TARGET_YEAR, MANUAL_FIXES],
+    "load_numbers": [movie_store, NUMBERS_RENAMES, NUMBERS_CLEAN_COLUMNS, TARGET_YEAR],
+    "outer_merge": [outer_merge, title_matching],
+    "dedupe": [duplicates, MOJO_CLEAN_COLUMNS, NUMBERS_CLEAN_COLUMNS],
+    "reconcile": [reconciliation],
+    "inflation": [inflation_factors, to_whole_dollars, TARGET_YEAR, MONEY_COLUMNS, INTEGER_COLUMNS],
+    "write": [movie_store],
+}
+
+# Text a dependency is hashed by: the source of a module or function, the value of a constant
+def dependency_source(dependency):
+    if inspect.ismodule(dependency) or inspect.isfunction(dependency):
+        return inspect.getsource(dependency)
+    return repr(dependency)
+
+# Stages that write files instead of returning an output. They are never cached and run every time the pipeline reaches them,
+# so deleting the cleaned files and running the pipeline again recreates them.
+UNCACHED_STAGES = ["write"]
+
+
+# Hash of a file's content
+def file_digest(path):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+# Output of every stage, stored as an Arrow file named after the stage and its key
+class StageCache:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name, key):
+        return os.path.join(self.directory, "{}-{}.arrow".format(name, key[:16]))
+
+    def has(self, name, key):
+        return os.path.exists(self.path(name, key))
+
+    def load(self, name, key):
+        with pa.memory_map(self.path(name, key)) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+
+    def save(self, name, key, frame):
+        path = self.path(name, key)
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        table = pa.Table.from_pandas(frame)
+
+        with pa.OSFile(temporary_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        os.replace(temporary_path, path)
+
+        # Only the latest output of each stage is kept
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith("{}-".format(name)) and file_name.endswith(".arrow") and os.path.join(self.directory, file_name) != path:
+                os.remove(os.path.join(self.directory, file_name))
+
+# Runs the stages in order, reusing cached outputs where the key has not changed
+# The time each stage took (to run, or to load from the cache) is recorded in `metrics`
+class Pipeline:
+    def __init__(self, stages, files, cache, force=(), metrics=None, uncached=UNCACHED_STAGES, dependencies=STAGE_DEPENDENCIES):
+        self.stages = {name: (function, inputs) for name, function, inputs in stages}
+        self.order = [name for name, _, _ in stages]
+        self.files = files
+        self.cache = cache
+        self.force = set(force)
+        self.uncached = set(uncached)
+        self.dependencies = dependencies
+        self.keys = {}
+        self.outputs = {}
+        self.metrics = metrics or CrawlMetrics()
+
+    # Key of a stage: its name, code, dependencies and the pipeline version plus the keys of its inputs. Key of an input file: its content (or path for outputs).
+    def key(self, name):
+        if name in self.keys:
+            return self.keys[name]
+
+        digest = hashlib.sha256(name.encode("utf-8"))
+
+        if name in self.files:
+            path = self.files[name]
+            digest.update(path.encode("utf-8"))
+            if name != "output_file":
+                digest.update(file_digest(path).encode("utf-8"))
+        else:
+            function, inputs = self.stages[name]
+            digest.update(inspect.getsource(function).encode("utf-8"))
+            digest.update(str(PIPELINE_VERSION).encode("utf-8"))
+            for dependency in self.dependencies.get(name, []):
+                digest.update(dependency_source(dependency).encode("utf-8"))
+            for input_name in inputs:
+                digest.update(self.key(input_name).encode("utf-8"))
+
+        self.keys[name] = digest.hexdigest()
+        return self.keys[name]
+
+    # Output of a stage (or the path of an input file). Upstream stages are only loaded or run when they are needed.
+    def output(self, name):
+        if name in self.files:
+            return self.files[name]
+
+        if name in self.outputs:
+            return self.outputs[name]
+
+        key = self.key(name)
+        function, inputs = self.stages[name]
+
+        if name not in self.force and name not in self.uncached and self.cache.has(name, key):
+            print("{}: cached".format(name))
+            with self.metrics.stage("{} (cached)".format(name)):
+                self.outputs[name] = self.cache.load(name, key)
+        else:
+            arguments = [self.output(input_name) for input_name in inputs]
+
+            t0 = time.perf_counter()
+            with self.metrics.stage(name):
+                self.outputs[name] = function(*arguments)
+            print("{}: ran in {:.2f} s".format(name, time.perf_counter() - t0))
+
+            if name not in self.uncached:
+                self.cache.save(name, key, self.outputs[name])
+
+        return self.outputs[name]
+
+    def run(self, until=None):
+        return self.output(until or self.order[-1])
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+if __name__ == "__main__":
+    stage_names = [name for name, _, _ in STAGES]
+
+    parser = argparse.ArgumentParser(description="Merge, deduplicate and inflation-adjust the scraped movie data")
+    parser.add_argument("--mojo", default="movie_data.arrow", help="Box Office Mojo dataset written by box_office_mojo.py")
+    parser.add_argument("--numbers", default="the_numbers_movie_data.arrow", help="The Numbers dataset written by the_numbers.py")
+    parser.add_argument("--factors", default=FACTORS_PATH, help="Yearly CPI and ticket price table written by inflation_factors.py")
+    parser.add_argument("--output", default="cleaned_movie_data.arrow", help="Cleaned dataset (a .csv copy is written next to it)")
+    parser.add_argument("--cache-dir", default="pipeline_cache", help="Directory of the cached stage outputs")
+    parser.add_argument("--fuzzy-titles", action="store_true", help="Also merge movies whose titles are written differently on the two websites (see title_matching.py)")
+    parser.add_argument("--until", choices=stage_names, default=None, help="Stop after this stage")
+    parser.add_argument("--force", choices=stage_names, action="append", default=[], help="Rerun this stage even if its output is cached (can be repeated)")
+    parser.add_argument("--metrics", default="pipeline_metrics.json", help="File the stage timings are written to (.json, or .prom for the Prometheus text format)")
+    args = parser.parse_args()
+
+    stages = STAGES
+    if args.fuzzy_titles:
+        stages = [(name, fuzzy_outer_merge if name == "outer_merge" else function, inputs) for name, function, inputs in STAGES]
+
+    pipeline = Pipeline(
+        stages,
+        {"mojo_file": args.mojo, "numbers_file": args.numbers, "factors_file": args.factors, "output_file": args.output},
+        StageCache(args.cache_dir),
+        force=args.force,
+        metrics=CrawlMetrics(),
+    )
+
+    t0 = time.perf_counter()
+    with pipeline.metrics.stage("pipeline"):
+        pipeline.run(args.until)
+    print("Pipeline finished in {:.2f} s".format(time.perf_counter() - t0))
+
+    pipeline.metrics.write(args.metrics)
@@ -0,0 +1,181 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# The same movie is often listed with release years one apart on Box Office Mojo and The Numbers,
+# so the outer merge on `title` and `release_year` leaves it as two rows. These functions find and combine those rows
+# with whole-column operations (a sort and a shift) instead of walking the rows one by one.
+
+
+# `year == previous_year - 1` for whole arrays, False where either year is missing
+def is_previous_year(years, previous_years):
+    return (years.notna() & previous_years.notna() & (years == previous_years - 1)).fillna(False).to_numpy(dtype=bool)
+
+# Positions of the candidate pairs, as one flat array: [later row, earlier row, later row, earlier row, ...]
+# Among the rows whose title appears more than once, sorted by descending `title` and `release_year`,
+# a pair is two neighbouring rows with the same title and consecutive years where neither row already has data from both websites.
+def find_consecutive_year_pairs(frame):
+    duplicated = frame[frame["title"].duplicated(keep=False)].sort_values(["title", "release_year"], ascending=[False, False])
+    positions = frame.index.get_indexer(duplicated.index)
+
+    titles = duplicated["title"]
+    years = duplicated["release_year"]
+    merged = (duplicated["release_date_mojo"].notna() & duplicated["release_date_numbers"].notna()).to_numpy()
+
+    previous_titles = titles.shift(1)
+    previous_merged = np.roll(merged, 1)
+
+    is_pair = (titles == previous_titles).fillna(False).to_numpy(dtype=bool) & is_previous_year(years, years.shift(1)) & ~(merged | previous_merged)
+    is_pair[:1] = False
+
+    pair_ends = np.flatnonzero(is_pair)
+    return np.column_stack([positions[pair_ends - 1], positions[pair_ends]]).ravel()
+
+# Combine the consecutive-year duplicates of an outer merged frame into single rows.
+# Every candidate row is compared with the one before it in the flat list from `find_consecutive_year_pairs`.
+# On a match, the earlier-year row takes the other website's columns from the later-year row:
+# `numbers_columns` if the later row has a production budget from The Numbers, `mojo_columns` otherwise.
+# Both original rows are dropped and the combined row is added. Gives the same rows as the original loops in the cleaning notebook.
+def resolve_consecutive_year_duplicates(frame, mojo_columns, numbers_columns):
+    frame = frame.reset_index(drop=True)
+    candidates = find_consecutive_year_pairs(frame)
+
+    previous = candidates[:-1]
+    current = candidates[1:]
+
+    titles = frame["title"]
+    years = frame["release_year"]
+
+    matches = (titles.iloc[current].to_numpy() == titles.iloc[previous].to_numpy()) & is_previous_year(
+        years.iloc[current].reset_index(drop=True), years.iloc[previous].reset_index(drop=True)
+    )
+    previous = previous[matches]
+    current = current[matches]
+
+    # Copy the other website's columns in bulk, choosing the set of columns row by row
+    combined = frame.iloc[current].copy()
+    use_numbers = frame["production_budget_numbers"].iloc[previous].notna().to_numpy()
+
+    for columns, mask in [(numbers_columns, use_numbers), (mojo_columns, ~use_numbers)]:
+        for column in columns:
+            values = combined[column].to_numpy(copy=True)
+            values[mask] = frame[column].iloc[previous].to_numpy()[mask]
+            combined[column] = pd.array(values, dtype=frame[column].dtype)
+
+    frame = frame.drop(labels=np.unique(np.concatenate([previous, current])), axis=0)
+    frame = pd.concat([frame, combined])
+    frame = frame.sort_values(["title", "release_year"], ascending=[True, True])
+
+    return frame.reset_index(drop=True)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# The original loops from the cleaning notebook, kept here for the tests and the benchmark below
+def resolve_with_loops(outer_merged, mojo_columns, numbers_columns):
+    def is_previous(year, previous_year):
+        return pd.notna(year) and pd.notna(previous_year) and year == previous_year - 1
+
+    duplicated_rows = []
+    previous_row = None
+
+    for index, row in outer_merged[outer_merged["title"].duplicated(keep=False)].sort_values(["title", "release_year"], ascending=[False, False]).iterrows():
+        if previous_row is None or row["title"] != previous_row["title"]:
+            previous_row = outer_merged.iloc[index].copy()
+            continue
+
+        if is_previous(row["release_year"], previous_row["release_year"]):
+            if (pd.notnull(row["release_date_mojo"]) & pd.notnull(row["release_date_numbers"])) | (pd.notnull(previous_row["release_date_mojo"]) & pd.notnull(previous_row["release_date_numbers"])):
+                previous_row = outer_merged.iloc[index].copy()
+                continue
+
+            duplicated_rows.extend([previous_row, row.copy()])
+
+        previous_row = outer_merged.iloc[index].copy()
+
+    combined_rows = []
+    indexes_to_delete = []
+    previous_row = None
+    previous_index = None
+
+    for row in duplicated_rows:
+        index = row.name
+
+        if previous_row is not None and row["title"] == previous_row["title"] and is_previous(row["release_year"], previous_row["release_year"]):
+            row = row.copy()
+            columns = numbers_columns if pd.notnull(previous_row["production_budget_numbers"]) else mojo_columns
+
+            for column in columns:
+                row.loc[column] = previous_row.loc[column]
+
+            indexes_to_delete.extend([previous_index, index])
+            combined_rows.append(row)
+
+        previous_row = outer_merged.iloc[index].copy()
+        previous_index = index
+
+    outer_merged = outer_merged.drop(labels=indexes_to_delete, axis=0)
+    if combined_rows:
+        outer_merged = pd.concat([outer_merged, pd.DataFrame(combined_rows).astype(outer_merged.dtypes.to_dict())])
+    outer_merged = outer_merged.sort_values(["title", "release_year"], ascending=[True, True])
+
+    return outer_merged.reset_index(drop=True)
+
+# A random outer merged frame with many repeated titles, missing years and rows that have data from one or both websites
+def make_outer_merged(rows, random_state):
+    titles = pd.Series(["movie {}".format(number) for number in random_state.randint(0, rows // 3 + 1, size=rows)])
+    years = pd.array(random_state.randint(1950, 1960, size=rows), dtype="Int64")
+    years[random_state.rand(rows) < 0.02] = pd.NA
+
+    dates = pd.to_datetime(pd.Series(years, dtype="float64").fillna(2000).astype(int).astype(str) + "-06-01")
+    has_mojo = random_state.rand(rows) < 0.7
+    has_numbers = ~has_mojo | (random_state.rand(rows) < 0.3)
+    budgets = pd.array(np.where(random_state.rand(rows) < 0.8, random_state.randint(1, 300, size=rows) * 1000000, 0), dtype="Int64")
+    budgets[~has_numbers | (budgets == 0)] = pd.NA
+
+    return pd.DataFrame({
+        "title": titles,
+        "release_year": years,
+        "release_date_mojo": dates.where(has_mojo),
+        "domestic_gross_mojo": pd.array(np.where(has_mojo, random_state.randint(1, 10 ** 8, size=rows), 0), dtype="Int64"),
+        "release_date_numbers": dates.where(has_numbers),
+        "production_budget_numbers": budgets,
+    })
+
+# Time the vectorized version against the loops (tests/test_duplicates.py checks they agree)
+# Usage: python duplicates.py [number of rows for the loops] [number of rows for the vectorized version only]
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    large_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2000000
+
+    mojo_columns = ["title", "release_year", "release_date_mojo", "domestic_gross_mojo"]
+    numbers_columns = ["title", "release_year", "release_date_numbers", "production_budget_numbers"]
+
+    for seed in range(5):
+        frame = make_outer_merged(rows, np.random.RandomState(seed))
+
+        t0 = time.perf_counter()
+        resolve_with_loops(frame, mojo_columns, numbers_columns)
+        t1 = time.perf_counter()
+        result = resolve_consecutive_year_duplicates(frame, mojo_columns, numbers_columns)
+        t2 = time.perf_counter()
+
+        print("{:,} rows: loops {:.2f} s, vectorized {:.3f} s ({:.0f}x), {:,} rows left".format(
+            rows, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1), len(result)
+        ))
+
+    frame = make_outer_merged(large_rows, np.random.RandomState(0))
+    t0 = time.perf_counter()
+    result = resolve_consecutive_year_duplicates(frame, mojo_columns, numbers_columns)
+    print("{:,} rows: vectorized {:.2f} s".format(large_rows, time.perf_counter() - t0))
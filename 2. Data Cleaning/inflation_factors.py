@@ -0,0 +1,161 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import argparse
+import os
+import sys
+import pandas as pd
+import numpy as np
+
+# The ticket prices live in the miscellaneous folder
+FACTORS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(FACTORS_DIRECTORY, os.pardir, "4. Miscellaneous"))
+
+from ticket_prices import ticket_prices
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# A table of the yearly Consumer Price Index and average ticket price, one row per year.
+# It is built once from the `cpi` package's bundled data (no `cpi.update()`, so no network) and the Box Office Mojo ticket prices,
+# and saved next to this file. Dollar amounts are then converted to another year with a lookup by release year and a multiply,
+# instead of a `cpi.inflate` call for every value.
+
+FACTORS_PATH = os.path.join(FACTORS_DIRECTORY, "inflation_factors.csv")
+
+# Bump when the columns or the way the table is built change. The version is written in the file's first line.
+FACTORS_VERSION = 3
+FACTORS_HEADER = "# inflation factors v{} - cpi: {}, ticket_price: https://www.boxofficemojo.com/about/adjuster.htm{}\n"
+
+# CPI-U, all items, U.S. city average, yearly: the `cpi` package's default series, which `cpi.inflate` uses
+CPI_SERIES = "CUUR0000SA0"
+
+
+# Average ticket price for every year from the first to the last year in `prices` ({"1998": 4.69, ...}), as a Series indexed by year.
+# The missing years are filled in by linear interpolation between the closest known years, rounded to the cent.
+def ticket_price_series(prices=ticket_prices):
+    known_years = np.array(sorted(int(year) for year in prices))
+    known_prices = np.array([prices[str(year)] for year in known_years], dtype="float64")
+
+    years = np.arange(known_years[0], known_years[-1] + 1)
+    return pd.Series(np.round(np.interp(years, known_years, known_prices), 2), index=years, name="ticket_price")
+
+# Yearly CPI from the `cpi` package's bundled database, for every year it has, as a Series indexed by year
+def cpi_series():
+    import cpi
+    from cpi.errors import CPIObjectDoesNotExist
+
+    values = {}
+    for year in range(1900, cpi.LATEST_YEAR + 1):
+        try:
+            values[year] = cpi.get(year)
+        except CPIObjectDoesNotExist:
+            continue
+
+    return pd.Series(values, name="cpi", dtype="float64")
+
+# The ticket prices carried past their last known year: every later year's price is the last known price moved by the CPI
+# from that year, rounded to the cent. Years after the last CPI year are not filled in.
+def extend_with_cpi(prices, cpi_values):
+    last_year = prices.index[-1]
+    if cpi_values.index[-1] <= last_year:
+        return prices
+
+    later_years = np.arange(last_year + 1, cpi_values.index[-1] + 1)
+    later_prices = np.round(prices[last_year] * cpi_values.reindex(later_years).to_numpy() / cpi_values[last_year], 2)
+
+    return pd.concat([prices, pd.Series(later_prices, index=later_years, name=prices.name)])
+
+# One row per year from the first to the last year either source has. The ticket prices after the last Box Office Mojo year
+# follow the CPI (see `extend_with_cpi`), so every year up to the CPI's latest can be a target year. Years before a source starts are left empty.
+def build_factor_table():
+    cpi_values = cpi_series()
+    prices = extend_with_cpi(ticket_price_series(), cpi_values)
+
+    years = np.arange(min(prices.index[0], cpi_values.index[0]), max(prices.index[-1], cpi_values.index[-1]) + 1)
+    table = pd.DataFrame({"year": years})
+    table["cpi"] = cpi_values.reindex(years).to_numpy()
+    table["ticket_price"] = prices.reindex(years).to_numpy()
+
+    return table
+
+# The header line records the table version and where the numbers came from
+def write_factor_table(table, path=FACTORS_PATH):
+    import cpi
+    from importlib.metadata import version
+
+    with open(path, "w", newline="") as output_file:
+        output_file.write(FACTORS_HEADER.format(FACTORS_VERSION, "series {} from the cpi {} package, data up to {}".format(
+            CPI_SERIES, version("cpi"), cpi.LATEST_YEAR
+        ), " up to {}, later years follow the cpi".format(max(int(year) for year in ticket_prices))))
+        table.to_csv(output_file, index=False)
+
+def read_factor_table(path=FACTORS_PATH):
+    with open(path) as input_file:
+        header = input_file.readline()
+
+    if not header.startswith(FACTORS_HEADER.split("{")[0] + "{} ".format(FACTORS_VERSION)):
+        raise ValueError("{} is not a version {} inflation factor table, rebuild it with `python inflation_factors.py`".format(path, FACTORS_VERSION))
+
+    return pd.read_csv(path, comment="#")
+
+# One column of the table ("cpi" or "ticket_price") as a Series indexed by year
+def factor_series(table, column):
+    return pd.Series(table[column].to_numpy(), index=table["year"].to_numpy(), name=column)
+
+# The values of a year-indexed series (one entry per year, no gaps) for every year in `years`, as an array.
+# Years outside the series (or missing) give NaN.
+def lookup(factors, years):
+    years = pd.Series(years).astype("float64").to_numpy()
+    positions = years - factors.index[0]
+    found = (positions >= 0) & (positions < len(factors))
+
+    values = np.full(len(years), np.nan)
+    values[found] = factors.to_numpy()[positions[found].astype(int)]
+
+    return values
+
+# The value of a year-indexed series for the year everything is converted to.
+# A target year the series doesn't cover would turn every converted value into NaN, so it is an error instead.
+def target_factor(factors, target_year):
+    value = lookup(factors, [target_year])[0]
+    if np.isnan(value):
+        covered = factors.dropna().index
+        raise ValueError("no {} for the target year {}: the series covers {} - {}".format(factors.name or "factor", target_year, covered.min(), covered.max()))
+
+    return value
+
+# How many `target_year` dollars one dollar from each year is worth
+def conversion_factors(factors, years, target_year):
+    return target_factor(factors, target_year) / lookup(factors, years)
+
+# The money `columns` of a frame converted from the dollars of each row's year to `target_year` dollars, as a new frame.
+# `factors` is a year-indexed price series such as `ticket_price_series()` or `factor_series(table, "cpi")`.
+# All the columns are converted together: value * factor of the target year / factor of the row's year
+# (the same arithmetic as `cpi.inflate`). Rows from the target year are left as they are.
+def convert_to_year(frame, columns, years, target_year, factors):
+    values = frame[columns].astype("float64").to_numpy()
+    years = pd.Series(years).astype("float64").to_numpy()
+
+    converted = (values * target_factor(factors, target_year)) / lookup(factors, years)[:, np.newaxis]
+    converted = np.where((years == target_year)[:, np.newaxis], values, converted)
+
+    return pd.DataFrame(converted, index=frame.index, columns=columns)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# Build the table from the bundled CPI data and the ticket prices and save it
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the yearly CPI and ticket price table used to adjust for inflation")
+    parser.add_argument("--output", default=FACTORS_PATH, help="Where to save the table")
+    args = parser.parse_args()
+
+    table = build_factor_table()
+    write_factor_table(table, args.output)
+
+    print("Wrote {} years ({} - {}) to {}".format(len(table), table["year"].iloc[0], table["year"].iloc[-1], args.output))
@@ -0,0 +1,135 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# After the merge, every field both websites have is in two columns, e.g. `domestic_gross_mojo` and `domestic_gross_numbers`.
+# Each consolidated column is declared below with the rule that picks its value,
+# and the rules work on whole columns at once instead of calling a function for every row.
+
+# The websites the data comes from, in order of preference. A field's column from a source is named `<field>_<source>`.
+SOURCES = ["mojo", "numbers"]
+
+# (consolidated column, rule, column type)
+#   prefer_<source> - the value from that source if it has one, otherwise the first value from the other sources in `SOURCES` order
+#   average - the rounded average of the values the sources have
+RECONCILIATION_RULES = [
+    ("release_date", "prefer_mojo", None),
+    ("production_budget", "average", "Int64"),
+    ("domestic_gross", "average", "Int64"),
+    ("worldwide_gross", "average", "Int64"),
+]
+
+
+def source_columns(frame, field, sources):
+    return [frame["{}_{}".format(field, source)] for source in sources]
+
+# First value that isn't missing, in the order of `columns`
+def coalesce(columns):
+    result = columns[0]
+    for column in columns[1:]:
+        result = result.where(result.notna(), column)
+    return result
+
+# Rounded average of the values that aren't missing (half-way values round to even, like Python's `round`)
+def average(columns):
+    values = pd.concat([column.astype("float64") for column in columns], axis=1)
+    return values.mean(axis=1, skipna=True).round()
+
+# The consolidated values of one field
+def apply_rule(frame, field, rule, sources=SOURCES):
+    if rule == "average":
+        return average(source_columns(frame, field, sources))
+
+    if rule.startswith("prefer_"):
+        preferred = rule[len("prefer_"):]
+        if preferred not in sources:
+            raise ValueError("Unknown source in rule {}".format(rule))
+        return coalesce(source_columns(frame, field, [preferred] + [source for source in sources if source != preferred]))
+
+    raise ValueError("Unknown reconciliation rule {}".format(rule))
+
+# Add every consolidated column in `rules` to a copy of the frame
+def reconcile_sources(frame, rules=RECONCILIATION_RULES, sources=SOURCES):
+    columns = {}
+
+    for field, rule, dtype in rules:
+        values = apply_rule(frame, field, rule, sources)
+        columns[field] = values if dtype is None else values.astype(dtype)
+
+    return frame.assign(**columns)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# The row functions from the cleaning notebook, kept here for the tests and the benchmark below
+def select_release_date(row):
+    if pd.notnull(row["release_date_mojo"]):
+        return row["release_date_mojo"]
+    elif pd.notnull(row["release_date_numbers"]):
+        return row["release_date_numbers"]
+    else:
+        return np.nan
+
+def select_average(row, mojo_column, numbers_column):
+    if pd.notnull(row[mojo_column]) & pd.notnull(row[numbers_column]):
+        return round((row[mojo_column] + row[numbers_column]) / 2)
+
+    if pd.notnull(row[mojo_column]):
+        return row[mojo_column]
+
+    if pd.notnull(row[numbers_column]):
+        return row[numbers_column]
+
+    return np.nan
+
+def reconcile_with_apply(frame):
+    frame = frame.copy()
+
+    frame["release_date"] = pd.to_datetime(frame.apply(select_release_date, axis=1))
+
+    for column in ["production_budget", "domestic_gross", "worldwide_gross"]:
+        frame[column] = frame.apply(select_average, axis=1, args=("{}_mojo".format(column), "{}_numbers".format(column)))
+        frame[column] = frame[column].astype("Int64")
+
+    return frame
+
+# A random merged frame where each field is missing from one source, the other or both
+def make_merged(rows, random_state):
+    frame = pd.DataFrame({"title": ["movie {}".format(number) for number in range(rows)]})
+
+    dates = pd.Series(pd.to_datetime(random_state.randint(0, 30000, size=rows), unit="D"))
+    frame["release_date_mojo"] = dates.where(random_state.rand(rows) < 0.7)
+    frame["release_date_numbers"] = (dates + pd.to_timedelta(random_state.randint(0, 60, size=rows), unit="D")).where(random_state.rand(rows) < 0.6)
+
+    for field in ["production_budget", "domestic_gross", "worldwide_gross"]:
+        for source in SOURCES:
+            values = pd.array(random_state.randint(1, 10 ** 9, size=rows), dtype="Int64")
+            values[random_state.rand(rows) < 0.4] = pd.NA
+            frame["{}_{}".format(field, source)] = values
+
+    return frame
+
+# Time the rules against the notebook's row functions (tests/test_reconciliation.py checks they agree)
+# Usage: python reconciliation.py [number of rows]
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frame = make_merged(rows, np.random.RandomState(0))
+
+    t0 = time.perf_counter()
+    reconcile_with_apply(frame)
+    t1 = time.perf_counter()
+    reconcile_sources(frame)
+    t2 = time.perf_counter()
+
+    print("{:,} rows: apply {:.2f} s, rules {:.3f} s ({:.0f}x)".format(rows, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)))
@@ -0,0 +1,235 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Links the movies of Box Office Mojo and The Numbers when their titles are written differently
+# ("Star Wars: Episode IV - A New Hope" / "Star Wars Ep. IV: A New Hope", "Amélie" / "AmÃ©lie", "Matrix, The" / "The Matrix").
+#   1. Titles are normalized: mojibake fixed, accents, case, punctuation and articles removed.
+#   2. Only movies that share a word of their title and are released at most a year apart are compared (blocking),
+#      so the work grows with the size of the blocks and not with the product of the two datasets.
+#      Each title is only blocked on its rarest words, and common words like "love" only while their block stays small.
+#   3. The candidates are scored with the similarity of their sets of character trigrams, for all pairs at once.
+#   4. Each movie is linked to its best candidate above the threshold, at most once on each side.
+
+# Links below this confidence are ignored
+MATCH_THRESHOLD = 0.8
+
+# The confidence of a link between movies released a year apart is the title similarity times this
+YEAR_APART_WEIGHT = 0.95
+
+# Number of (rarest) words of each title used for blocking
+BLOCKING_WORDS = 2
+
+# Words other than a title's rarest one are not used for blocking if that many titles from the same year share them
+MAX_BLOCK_SIZE = 50
+
+# Text left behind when UTF-8 is read as ISO-8859-1 / Windows-1252 ("Ã©" for "é", "â€™" for "’")
+MOJIBAKE_MARKERS = ["Ã", "Â", "â€"]
+
+ARTICLES = r"^(the|a|an) |, (the|a|an)$| (the|a|an)$"
+
+
+# Undo the UTF-8 read as ISO-8859-1 mixup `scrapeWebsiteTheNumbers` tries to decode, where it is still there
+def fix_mojibake(title):
+    if not isinstance(title, str) or not any(marker in title for marker in MOJIBAKE_MARKERS):
+        return title
+
+    for encoding in ["cp1252", "ISO-8859-1"]:
+        try:
+            return title.encode(encoding).decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            continue
+
+    return title
+
+# Titles reduced to lowercase words without accents, punctuation or articles: "Matrix, The" -> "matrix", "Amélie" -> "amelie".
+# Each distinct title is only normalized once.
+def normalize_titles(titles):
+    titles = pd.Series(titles, dtype="object")
+    codes, uniques = pd.factorize(titles)
+
+    normalized = pd.Series(uniques, dtype="object").map(fix_mojibake).astype("str")
+    normalized = normalized.str.normalize("NFKD").str.replace(r"[̀-ͯ]", "", regex=True).str.lower()
+    normalized = normalized.str.replace(ARTICLES, "", regex=True)
+    normalized = normalized.str.replace(r"['’`]", "", regex=True).str.replace("&", " and ", regex=False)
+    normalized = normalized.str.replace(r"[^\w]+", " ", regex=True).str.strip()
+    normalized = normalized.str.replace(ARTICLES, "", regex=True)
+
+    # Titles made only of punctuation keep their lowercase text
+    empty = normalized == ""
+    normalized[empty] = pd.Series(uniques, dtype="object")[empty].astype("str").str.lower()
+
+    return pd.Series(normalized.to_numpy()[codes], index=titles.index).where(codes >= 0)
+
+# Character trigrams of every distinct normalized title as flat arrays: trigram ids, title of each trigram, and where each title's trigrams start
+def trigram_index(normalized):
+    padded = pd.Series("  " + normalized + " ", dtype="object")
+    grams = padded.map(lambda title: sorted({title[i:i + 3] for i in range(len(title) - 2)}))
+
+    counts = grams.map(len).to_numpy()
+    flat = pd.Series(np.concatenate([np.array(title_grams, dtype="object") for title_grams in grams]) if len(grams) else [], dtype="object")
+    gram_ids, _ = pd.factorize(flat)
+
+    owners = np.repeat(np.arange(len(grams)), counts)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]) if len(counts) else counts
+
+    return gram_ids.astype("int64"), owners, starts, counts
+
+# Dice similarity of the trigram sets of the pairs (left[i], right[i]) of distinct titles, 2 * shared / (total of both), for all pairs at once
+def trigram_similarity(normalized, left, right):
+    gram_ids, owners, starts, counts = trigram_index(normalized)
+    gram_count = gram_ids.max() + 1 if len(gram_ids) else 1
+
+    # Every trigram of the left title of every pair, tagged with the pair it belongs to
+    pair_sizes = counts[left]
+    pairs = np.repeat(np.arange(len(left)), pair_sizes)
+    offsets = np.arange(pair_sizes.sum()) - np.repeat(np.cumsum(pair_sizes) - pair_sizes, pair_sizes)
+    left_grams = gram_ids[starts[left][pairs] + offsets]
+
+    # A trigram is shared if (right title, trigram) is in the index
+    title_grams = np.sort(owners * gram_count + gram_ids)
+    keys = right[pairs] * gram_count + left_grams
+    positions = np.minimum(np.searchsorted(title_grams, keys), len(title_grams) - 1)
+    shared = np.bincount(pairs, weights=title_grams[positions] == keys, minlength=len(left))
+
+    return 2 * shared / (counts[left] + counts[right])
+
+# Candidate pairs (row of `left_keys`, row of `right_keys`) that share one of their rarest title words and are released at most a year apart.
+# Both arguments are frames with `normalized_title` and `release_year` columns.
+def candidate_pairs(left_keys, right_keys, blocking_words=BLOCKING_WORDS, max_block_size=MAX_BLOCK_SIZE):
+    def words(keys, side):
+        frame = pd.DataFrame({"row": np.arange(len(keys)), "word": keys["normalized_title"].str.split(" "), "release_year": keys["release_year"].to_numpy()})
+        frame = frame[frame["release_year"].notna()].explode("word")
+        frame["side"] = side
+        return frame
+
+    blocks = pd.concat([words(left_keys, "left"), words(right_keys, "right")], ignore_index=True)
+    blocks = blocks.drop_duplicates(["side", "row", "word"])
+
+    # Keep the rarest words of each title (ties broken by the word itself so both sides agree)
+    blocks["frequency"] = blocks.groupby("word")["row"].transform("size")
+    blocks["block_size"] = blocks.groupby(["word", "release_year"])["row"].transform("size")
+    blocks = blocks.sort_values(["side", "row", "frequency", "word"])
+
+    rank = blocks.groupby(["side", "row"]).cumcount()
+    blocks = blocks[(rank == 0) | ((rank < blocking_words) & (blocks["block_size"] <= max_block_size))]
+
+    left_blocks = blocks[blocks["side"] == "left"][["row", "word", "release_year"]]
+    right_blocks = blocks[blocks["side"] == "right"][["row", "word", "release_year"]]
+
+    # A movie on the right can match one on the left released the year before, the same year or the year after
+    right_blocks = pd.concat([right_blocks.assign(release_year=right_blocks["release_year"] + shift) for shift in [-1, 0, 1]])
+
+    pairs = pd.merge(left_blocks, right_blocks, on=["word", "release_year"], suffixes=["_left", "_right"])
+    pairs = pairs[["row_left", "row_right"]].drop_duplicates()
+
+    return pairs["row_left"].to_numpy(), pairs["row_right"].to_numpy()
+
+# Links between the rows of two frames with `title` and `release_year` columns.
+# Returns one row per link: the index labels on both sides, both titles, the title similarity, the year difference and the confidence.
+def link_titles(left, right, threshold=MATCH_THRESHOLD, blocking_words=BLOCKING_WORDS):
+    left_keys = pd.DataFrame({"normalized_title": normalize_titles(left["title"]).to_numpy(), "release_year": left["release_year"].astype("float64").to_numpy()})
+    right_keys = pd.DataFrame({"normalized_title": normalize_titles(right["title"]).to_numpy(), "release_year": right["release_year"].astype("float64").to_numpy()})
+    left_keys["normalized_title"] = left_keys["normalized_title"].fillna("")
+    right_keys["normalized_title"] = right_keys["normalized_title"].fillna("")
+
+    left_rows, right_rows = candidate_pairs(left_keys, right_keys, blocking_words)
+
+    # Score each distinct pair of normalized titles once
+    codes, distinct_titles = pd.factorize(pd.concat([left_keys["normalized_title"], right_keys["normalized_title"]], ignore_index=True))
+    left_codes = codes[:len(left_keys)][left_rows]
+    right_codes = codes[len(left_keys):][right_rows]
+    similarity = trigram_similarity(pd.Series(distinct_titles, dtype="object"), left_codes, right_codes)
+
+    year_difference = right_keys["release_year"].to_numpy()[right_rows] - left_keys["release_year"].to_numpy()[left_rows]
+    confidence = similarity * np.where(year_difference == 0, 1.0, YEAR_APART_WEIGHT)
+
+    links = pd.DataFrame({
+        "left_index": left.index.to_numpy()[left_rows],
+        "right_index": right.index.to_numpy()[right_rows],
+        "left_title": left["title"].to_numpy()[left_rows],
+        "right_title": right["title"].to_numpy()[right_rows],
+        "similarity": similarity,
+        "year_difference": year_difference.astype("int64"),
+        "confidence": confidence,
+    })
+    links = links[links["confidence"] >= threshold]
+
+    # Best link first, then each row is used at most once on each side
+    links = links.sort_values(["confidence", "year_difference"], ascending=[False, True], key=lambda values: values.abs() if values.name == "year_difference" else values)
+    links = links.drop_duplicates("left_index").drop_duplicates("right_index")
+
+    return links.reset_index(drop=True)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# Random titles written a little differently on each side (punctuation, case, articles, mojibake, a missing word, a year apart)
+def make_titles(rows, random_state):
+    # A vocabulary of made-up words where a few words are very common, like in real titles
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyzéü'"))
+    words = np.array(["".join(random_state.choice(letters, size=random_state.randint(2, 9))) for _ in range(20000)])
+    word_frequency = 1 / np.arange(1, len(words) + 1)
+
+    choices = random_state.choice(len(words), size=(rows, 5), p=word_frequency / word_frequency.sum())
+    lengths = random_state.randint(2, 6, size=rows)
+    titles = [" ".join(words[choices[row, :lengths[row]]]).title() for row in range(rows)]
+    years = random_state.randint(1930, 2019, size=rows)
+
+    def vary(title):
+        choice = random_state.randint(0, 6)
+        if choice == 0:
+            return title.upper()
+        if choice == 1:
+            return "The " + title
+        if choice == 2:
+            return title.replace(" ", ": ", 1)
+        if choice == 3:
+            return title.encode("utf-8").decode("cp1252", "replace")
+        if choice == 4 and " " in title:
+            return title.rsplit(" ", 1)[0] + " " + title.rsplit(" ", 1)[1] + " - Part 2"
+        return title
+
+    left = pd.DataFrame({"title": titles, "release_year": years})
+    right = pd.DataFrame({
+        "title": [vary(title) for title in titles],
+        "release_year": years + np.where(random_state.rand(rows) < 0.15, random_state.choice([-1, 1], size=rows), 0),
+    })
+
+    return left, right.sample(frac=1, random_state=random_state)
+
+# Link random titles and report the work done, the time and how many of the true links were found (tests/test_title_matching.py checks them on fewer titles)
+# Usage: python title_matching.py [number of titles]
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    left, right = make_titles(rows, np.random.RandomState(0))
+
+    t0 = time.perf_counter()
+    left_keys = pd.DataFrame({"normalized_title": normalize_titles(left["title"]), "release_year": left["release_year"].astype("float64")})
+    right_keys = pd.DataFrame({"normalized_title": normalize_titles(right["title"]).to_numpy(), "release_year": right["release_year"].astype("float64").to_numpy()})
+    candidates, _ = candidate_pairs(left_keys, right_keys)
+    t1 = time.perf_counter()
+    links = link_titles(left, right)
+    t2 = time.perf_counter()
+
+    # Titles that appear more than once in the same year can't be told apart, any of them counts as correct
+    true_keys = left["title"].str.lower() + left["release_year"].astype("str")
+    correct = (true_keys.loc[links["left_index"]].to_numpy() == true_keys.loc[links["right_index"]].to_numpy()).sum()
+
+    print("{:,} x {:,} titles: {:,} candidate pairs ({:.4%} of all pairs), blocking {:.2f} s, linking {:.2f} s".format(
+        len(left), len(right), len(candidates), len(candidates) / (len(left) * len(right)), t1 - t0, t2 - t1
+    ))
+    print("{:,} links, {:,} correct: precision {:.2%}, recall {:.2%}, median confidence {:.2f}".format(
+        len(links), correct, correct / max(len(links), 1), correct / rows, links["confidence"].median()
+    ))
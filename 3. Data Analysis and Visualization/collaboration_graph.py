@@ -0,0 +1,297 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+# The credit table and the Arrow file helpers live in the extraction folder
+GRAPH_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(GRAPH_DIRECTORY, os.pardir, "1. Data Extraction"))
+
+from movie_store import read_table
+from people_store import CreditTable, ROLES
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# The cast and crew of every movie as a graph, built once from the credit table (`people_store.py`) with numpy.
+# Every adjacency is stored in compressed sparse rows: an `indptr` array with one offset per row and the columns of row r
+# in `indices[indptr[r]:indptr[r + 1]]`. There are three of them:
+#   person -> movie:  the movies each person is credited on (whatever the role)
+#   movie -> person:  the people credited on each movie
+#   person -> person: everyone each person shares a movie with, with the number of shared movies and their summed gross
+# Neighbors and top-k collaborators are a slice of the person -> person rows. Per-pairing statistics (e.g. the average
+# worldwide_adj of the movies a director made with an actor) gather the movie values of a few rows instead of
+# self-joining the wide `actor*_mojo`/`director*_mojo` columns.
+
+# Movie values joined from the cleaned dataset, and the one the collaborator edges are weighted by
+VALUE_COLUMNS = ["worldwide_adj", "domestic_adj", "budget_adj"]
+WEIGHT_COLUMN = "worldwide_adj"
+
+# (gross, budget) columns of the return on investment
+ROI_COLUMNS = ("worldwide_adj", "budget_adj")
+
+
+# Positions start[i] to end[i] - 1 of every range, concatenated into one array
+def concatenated_ranges(starts, ends):
+    lengths = ends - starts
+    total = int(lengths.sum())
+
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Each position is its place in the output, shifted by how far its range's start is from where the range lands in the output
+    shifts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return np.arange(total, dtype=np.int64) + shifts
+
+# Offsets of a CSR adjacency whose (sorted) rows are `rows`
+def row_offsets(rows, row_count):
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+    return indptr
+
+# Values of every movie in the movie_data.arrow row order, for the movies of the credit table.
+# movie_data.arrow and cleaned_movie_data.arrow are matched on title and release year, the keys the datasets were merged on.
+# Movies the cleaning stage dropped (e.g. released after 2018) get missing values.
+def movie_values(movie_data_path, cleaned_path, columns=VALUE_COLUMNS):
+    movies = read_table(movie_data_path, columns=["title", "release_date_formatted"])
+    movies["release_year"] = movies["release_date_formatted"].dt.year.astype("Int64")
+
+    cleaned = read_table(cleaned_path, columns=["title", "release_year"] + columns)
+    cleaned = cleaned.drop_duplicates(["title", "release_year"])
+
+    values = movies[["title", "release_year"]].merge(cleaned, how="left", on=["title", "release_year"])
+    return values[columns].astype("float64")
+
+
+class CollaborationGraph:
+    # `credits` is a CreditTable, `values` a frame of numeric movie values indexed by movie_id (e.g. from `movie_values`)
+    def __init__(self, credits, values, weight_column=WEIGHT_COLUMN):
+        self.credits = credits.build()
+        self.persons = credits.persons
+        self.names = np.array(credits.persons.names, dtype="object")
+        self.values = values
+        self.weight_column = weight_column
+
+        person_count = len(self.persons)
+        movie_count = max(len(values), int(credits.movie_ids.max()) + 1 if len(credits) else 0)
+
+        # One (person, movie) pair per person and movie, however many roles the person had on it, sorted by person then movie
+        pairs = np.unique(credits.person_ids.astype(np.int64) * movie_count + credits.movie_ids)
+        pair_people = pairs // movie_count
+        pair_movies = pairs % movie_count
+
+        self.person_indptr = row_offsets(pair_people, person_count)
+        self.person_movies = pair_movies.astype(np.int32)
+
+        order = np.argsort(pair_movies, kind="stable")
+        self.movie_indptr = row_offsets(pair_movies[order], movie_count)
+        self.movie_people = pair_people[order].astype(np.int32)
+
+        # Every movie value as a numpy column (NaN when missing), and the weight of each movie (0 when its gross is missing)
+        self.value_arrays = {column: np.full(movie_count, np.nan) for column in values.columns}
+        for column in values.columns:
+            self.value_arrays[column][values.index.to_numpy()] = values[column].to_numpy("float64", na_value=np.nan)
+        self.movie_weights = np.nan_to_num(self.value_arrays[weight_column])
+
+        # Person -> person: each (person, movie) pair is joined with everyone else on the movie, and the pairs are summed up per two people
+        neighbors = concatenated_ranges(self.movie_indptr[pair_movies], self.movie_indptr[pair_movies + 1])
+        sizes = self.movie_indptr[pair_movies + 1] - self.movie_indptr[pair_movies]
+        sources = np.repeat(pair_people, sizes)
+        targets = self.movie_people[neighbors].astype(np.int64)
+        weights = np.repeat(self.movie_weights[pair_movies], sizes)
+
+        others = sources != targets
+        keys, inverse = np.unique(sources[others] * person_count + targets[others], return_inverse=True)
+
+        self.collaborator_indptr = row_offsets(keys // person_count, person_count)
+        self.collaborators = (keys % person_count).astype(np.int32)
+        self.collaborator_films = np.bincount(inverse, minlength=len(keys)).astype(np.int32)
+        self.collaborator_weights = np.bincount(inverse, weights=weights[others], minlength=len(keys))
+
+    # Graph of the files the pipeline writes: the `people` folder of box_office_mojo.py, movie_data.arrow and cleaned_movie_data.arrow
+    @classmethod
+    def from_files(cls, people_directory, movie_data_path, cleaned_path, weight_column=WEIGHT_COLUMN):
+        return cls(CreditTable.read(people_directory), movie_values(movie_data_path, cleaned_path), weight_column)
+
+    # ID of a name, raising KeyError for a name that isn't in the graph
+    def person_id(self, name):
+        person_id = self.persons.get(name)
+
+        if person_id is None:
+            raise KeyError(name)
+        return person_id
+
+    # Movie IDs of a person, in any role or only in `role`
+    def movies_of(self, name, role=None):
+        if role is None:
+            person_id = self.person_id(name)
+            return self.person_movies[self.person_indptr[person_id]:self.person_indptr[person_id + 1]]
+
+        return self.credits.films_with(name, role).astype(np.int32)
+
+    # Everyone who shares a movie with a person: collaborator name, number of shared movies and their summed gross
+    def neighbors(self, name):
+        person_id = self.person_id(name)
+        rows = slice(self.collaborator_indptr[person_id], self.collaborator_indptr[person_id + 1])
+
+        return pd.DataFrame({
+            "name": self.names[self.collaborators[rows]],
+            "films": self.collaborator_films[rows],
+            self.weight_column: self.collaborator_weights[rows],
+        })
+
+    # The `k` people who share the most movies with a person (`by="films"`), or the most gross (`by` the weight column)
+    # Ties on the number of movies are broken by gross
+    def top_collaborators(self, name, k=10, by="films"):
+        neighbors = self.neighbors(name)
+        order = ["films", self.weight_column] if by == "films" else [self.weight_column, "films"]
+
+        if len(neighbors) > k:
+            # Only sort the rows that can make the top k
+            threshold = np.partition(neighbors[by].to_numpy(), len(neighbors) - k)[len(neighbors) - k]
+            neighbors = neighbors[neighbors[by] >= threshold]
+
+        return neighbors.sort_values(order, ascending=False, kind="stable").head(k).reset_index(drop=True)
+
+    # Count, mean of every value and return on investment of a set of movies
+    def movie_stats(self, movies):
+        stats = {"films": len(movies)}
+
+        for column, values in self.value_arrays.items():
+            known = values[movies][~np.isnan(values[movies])]
+            stats["{}_mean".format(column)] = known.mean() if len(known) else np.nan
+
+        gross_column, budget_column = ROI_COLUMNS
+        if gross_column in self.value_arrays and budget_column in self.value_arrays:
+            gross = self.value_arrays[gross_column][movies]
+            budget = self.value_arrays[budget_column][movies]
+            both = ~np.isnan(gross) & ~np.isnan(budget) & (budget > 0)
+            stats["roi"] = gross[both].sum() / budget[both].sum() if both.any() else np.nan
+
+        return pd.Series(stats)
+
+    # Statistics of the movies two people made together, e.g. `pairing_stats("Steven Spielberg", "Tom Hanks", "director", "actor")`
+    def pairing_stats(self, name, other, role=None, other_role=None):
+        return self.movie_stats(np.intersect1d(self.movies_of(name, role), self.movies_of(other, other_role), assume_unique=True))
+
+    # Statistics of a person's movies with each of their collaborators in `partner_role` (e.g. every actor a director worked with),
+    # keeping the partners with at least `min_films` movies together, best first by `by`
+    def partner_stats(self, name, partner_role, role=None, by="worldwide_adj_mean", min_films=1, k=10):
+        movies = self.movies_of(name, role)
+        person_id = self.person_id(name)
+
+        # Credits of those movies (the credit table is in movie order), kept if they are in the partner role
+        edges = concatenated_ranges(self.credits.movie_offsets[movies].astype(np.int64), self.credits.movie_offsets[movies + 1].astype(np.int64))
+        edges = edges[(self.credits.roles[edges] == ROLES.index(partner_role)) & (self.credits.person_ids[edges] != person_id)]
+
+        partners, inverse = np.unique(self.credits.person_ids[edges], return_inverse=True)
+        partner_movies = self.credits.movie_ids[edges]
+
+        stats = {"name": self.names[partners], "films": np.bincount(inverse, minlength=len(partners))}
+        for column, values in self.value_arrays.items():
+            selected = values[partner_movies]
+            known = ~np.isnan(selected)
+            sums = np.bincount(inverse[known], weights=selected[known], minlength=len(partners))
+            counts = np.bincount(inverse[known], minlength=len(partners))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                stats["{}_mean".format(column)] = sums / counts
+
+        stats = pd.DataFrame(stats)
+        stats = stats[stats["films"] >= min_films]
+        return stats.sort_values([by, "films"], ascending=False, kind="stable").head(k).reset_index(drop=True)
+
+    # Bytes held by the adjacency arrays
+    def memory_usage(self):
+        arrays = [self.person_indptr, self.person_movies, self.movie_indptr, self.movie_people, self.collaborator_indptr,
+                  self.collaborators, self.collaborator_films, self.collaborator_weights]
+        return sum(array.nbytes for array in arrays)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# Random movie values for the credits of `people_store.make_credits`
+def make_values(movies, random_state):
+    budget = np.round(random_state.lognormal(17, 1.2, size=movies))
+    worldwide = np.round(budget * random_state.lognormal(0.7, 1.0, size=movies))
+    values = pd.DataFrame({"worldwide_adj": worldwide, "domestic_adj": np.round(worldwide * 0.45), "budget_adj": budget})
+
+    # Some movies have no gross or budget, like the movies The Numbers doesn't list
+    values.loc[random_state.rand(movies) < 0.1, "budget_adj"] = np.nan
+    values.loc[random_state.rand(movies) < 0.05, "worldwide_adj"] = np.nan
+    return values
+
+# (movie_id, name) rows of the wide people columns, the way the notebooks would stack them
+def stack_wide_columns(wide):
+    long = wide.rename_axis("movie_id").reset_index().melt(id_vars="movie_id", value_name="name")[["movie_id", "name"]]
+    return long[long["name"] != "N/A"]
+
+# Today's way of asking who works with someone: self-join the (movie_id, name) rows on the movie
+def collaborators_with_self_join(long, values, name):
+    long = long.drop_duplicates()
+
+    joined = long[long["name"] == name].merge(long, on="movie_id", suffixes=["", "_other"])
+    joined = joined[joined["name_other"] != name]
+    joined["worldwide_adj"] = values["worldwide_adj"].fillna(0).to_numpy()[joined["movie_id"]]
+
+    return joined.groupby("name_other").agg(films=("movie_id", "size"), worldwide_adj=("worldwide_adj", "sum"))
+
+# Build the graph for random movies and time its answers against self-joins of the credits
+# (tests/test_collaboration_graph.py checks they agree)
+# Usage: python collaboration_graph.py [number of movies]
+if __name__ == "__main__":
+    from people_store import make_credits, wide_columns
+
+    movies = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random_state = np.random.RandomState(0)
+    all_credits = make_credits(movies, random_state)
+    values = make_values(movies, random_state)
+
+    credits = CreditTable()
+    for movie_id, movie_credits in enumerate(all_credits):
+        credits.add_movie(movie_id, movie_credits)
+    credits.build()
+
+    t0 = time.perf_counter()
+    graph = CollaborationGraph(credits, values)
+    t1 = time.perf_counter()
+    print("{:,} movies, {:,} people: graph built in {:.2f} s, {:,} collaborator pairs, {:.1f} MB".format(
+        movies, len(graph.persons), t1 - t0, len(graph.collaborators), graph.memory_usage() / 1e6))
+
+    # The same question answered from every credit (what the graph holds) and from the wide columns (what the notebooks have)
+    frame = credits.to_frame()
+    wide = wide_columns(all_credits)
+    names = [credits.persons.names[person_id] for person_id in [0, 10, 1000]]
+    for name in names:
+        t0 = time.perf_counter()
+        top = graph.top_collaborators(name, k=5)
+        t1 = time.perf_counter()
+        collaborators_with_self_join(frame[["movie_id", "name"]], values, name)
+        t2 = time.perf_counter()
+        collaborators_with_self_join(stack_wide_columns(wide), values, name)
+        t3 = time.perf_counter()
+
+        print("{}: {} collaborators, top 5 in {:.2f} ms (self-join of every credit {:.0f} ms, of the wide columns {:.0f} ms)".format(
+            name, len(graph.neighbors(name)), 1000 * (t1 - t0), 1000 * (t2 - t1), 1000 * (t3 - t2)))
+        print(top.to_string(index=False))
+
+    # Average gross and ROI of the films a director made with an actor
+    director = frame.loc[frame["role"] == "director", "name"].value_counts().index[0]
+    t0 = time.perf_counter()
+    partners = graph.partner_stats(director, "actor", role="director", min_films=2, k=5)
+    t1 = time.perf_counter()
+    actor = partners["name"].iloc[0]
+    pairing = graph.pairing_stats(director, actor, "director", "actor")
+    t2 = time.perf_counter()
+
+    print("{} as director, best actors with at least 2 films together in {:.2f} ms:".format(director, 1000 * (t1 - t0)))
+    print(partners.to_string(index=False))
+    print("with {}: {:.0f} films, worldwide_adj mean {:,.0f}, roi {:.2f} in {:.2f} ms".format(
+        actor, pairing["films"], pairing["worldwide_adj_mean"], pairing["roi"], 1000 * (t2 - t1)))
@@ -0,0 +1,190 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import re
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Box Office Mojo lists a movie's genres as one string (e.g. "Action Comedy", "Sci-Fi Adventure").
+# The string is parsed once into a bitmask with one bit per genre below, and every per-genre statistic is then
+# a single group reduction over a (movie, genre) long table built from the positions of each genre's movies,
+# instead of scanning `genres_mojo` and filtering the frame once per genre.
+
+# (genre, regular expression searched in `genres_mojo`). The genre's bit is its position in the list.
+# A movie can have several genres. If so, it counts for all the genres it's classified with.
+GENRES = [
+    ("action", "Action"),
+    ("adventure", "Adventure"),
+    ("comedy", "Comedy"),
+    ("drama", "Drama"),
+    ("horror", "Horror"),
+    ("thriller_suspense", "Thriller|Suspense"),
+]
+
+
+def genre_names(genres=GENRES):
+    return [genre for genre, _ in genres]
+
+# Bitmask of every movie's genres (bit i set when the movie has genre i), as the smallest unsigned integer column that fits.
+# The patterns only run once per distinct `genres_mojo` string, not once per movie. Missing genres give 0.
+def genre_masks(genres_mojo, genres=GENRES):
+    genres_mojo = pd.Series(genres_mojo)
+    codes, uniques = pd.factorize(genres_mojo)
+
+    patterns = [re.compile(pattern) for _, pattern in genres]
+    # The extra 0 at the end is picked up by the missing strings, whose code is -1
+    unique_masks = [sum(1 << bit for bit, pattern in enumerate(patterns) if pattern.search(value)) for value in uniques] + [0]
+
+    dtype = np.min_scalar_type((1 << len(genres)) - 1)
+    return pd.Series(np.array(unique_masks, dtype=dtype)[codes], index=genres_mojo.index, name="genre_mask")
+
+# Movie x genre matrix of booleans, one column per genre in `genres` order
+def genre_matrix(masks, genres=GENRES):
+    masks = np.asarray(masks)
+    return ((masks[:, np.newaxis] >> np.arange(len(genres), dtype=masks.dtype)) & 1).astype(bool)
+
+# One boolean column per genre, for code that still wants `data[genre]`
+def genre_columns(masks, genres=GENRES):
+    return pd.DataFrame(genre_matrix(masks, genres), index=pd.Series(masks).index, columns=genre_names(genres))
+
+# Row positions of each genre's movies: {"action": array([0, 4, 9, ...]), ...}
+def genre_index(masks, genres=GENRES):
+    genre_ids, positions = np.nonzero(genre_matrix(masks, genres).T)
+    counts = np.bincount(genre_ids, minlength=len(genres))
+
+    return dict(zip(genre_names(genres), np.split(positions, np.cumsum(counts)[:-1])))
+
+# The `columns` of the frame with one row per (movie, genre), and a categorical `genre` column first
+def genre_rows(frame, masks, columns, genres=GENRES, index=None):
+    if index is None:
+        index = genre_index(masks, genres)
+
+    names = genre_names(genres)
+    positions = np.concatenate([index[genre] for genre in names])
+    codes = np.repeat(np.arange(len(names)), [len(index[genre]) for genre in names])
+
+    rows = frame[columns].iloc[positions].reset_index(drop=True)
+    rows.insert(0, "genre", pd.Categorical.from_codes(codes, categories=names))
+
+    return rows
+
+# `statistics` of the value `columns` per genre, or per genre and each of the `by` columns (e.g. ["release_decade"])
+def genre_stats(frame, masks, columns, by=None, statistics=("count", "sum", "mean", "median"), genres=GENRES, index=None):
+    by = [] if by is None else list(by)
+    rows = genre_rows(frame, masks, list(columns) + by, genres, index)
+
+    return rows.groupby(["genre"] + by, observed=True)[list(columns)].agg(list(statistics))
+
+# Number of movies of each genre, or a table of the number per value of `by` (one row per value, one column per genre)
+def genre_counts(masks, by=None, genres=GENRES):
+    matrix = genre_matrix(masks, genres)
+
+    if by is None:
+        return pd.Series(matrix.sum(axis=0), index=genre_names(genres))
+
+    return pd.DataFrame(matrix, columns=genre_names(genres)).groupby(np.asarray(by)).sum()
+
+# One column per genre holding `values` for that genre's movies and NaN for the others, named `name.format(genre)`
+def genre_values(values, masks, name="{}", genres=GENRES):
+    values = pd.Series(values)
+    spread = np.where(genre_matrix(masks, genres), values.astype("float64").to_numpy()[:, np.newaxis], np.nan)
+
+    return pd.DataFrame(spread, index=values.index, columns=[name.format(genre) for genre in genre_names(genres)])
+
+# The per-genre summary table of the analysis notebooks, in millions of dollars rounded to one decimal, from the number of movies
+# and the sum, mean and median of the gross and budget of each genre (`gross` and `budget` have "sum", "mean" and "median" columns).
+# `studio_share` is the part of the gross that goes back to the studio (half of the worldwide gross, the notebooks assume),
+# and the budget is multiplied by 1.5 for marketing.
+def summary_table(movies, gross, budget, studio_share=0.5):
+    gross = gross.astype("float64")
+    budget = budget.astype("float64")
+
+    summary = pd.DataFrame({
+        "num_movies": movies.fillna(0).astype(int),
+        "avg_gross": gross["mean"] / 1000000,
+        "median_gross": gross["median"] / 1000000,
+        "all_time_gross": gross["sum"] / 1000000,
+        "avg_budget": budget["mean"] / 1000000,
+        "median_budget": budget["median"] / 1000000,
+        "all_time_budget": budget["sum"] / 1000000,
+        "dollars_earned_for_dollars_spent": (studio_share * gross["sum"] / 1000000) / (1.5 * budget["sum"] / 1000000),
+        "median_dollars_earned_for_dollars_spent": (studio_share * gross["median"] / 1000000) / (1.5 * budget["median"] / 1000000),
+        "mean_dollars_earned_for_dollars_spent": (studio_share * gross["mean"] / 1000000) / (1.5 * budget["mean"] / 1000000),
+    })
+    summary.index.name = None
+
+    return summary.round(1)
+
+# The summary table straight from the movies
+def genre_summary(frame, masks, gross_column, budget_column="budget_adj", studio_share=0.5, genres=GENRES, index=None):
+    stats = genre_stats(frame, masks, [gross_column, budget_column], statistics=("size", "sum", "mean", "median"), genres=genres, index=index)
+    stats = stats.reindex(genre_names(genres))
+
+    return summary_table(stats[(gross_column, "size")], stats[gross_column], stats[budget_column], studio_share)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# The notebooks' approach: a `str.contains` column per genre, then the frame filtered once per genre and statistic
+def summary_with_filtering(data, gross_column, genres):
+    for genre, pattern in genres:
+        data[genre] = data["genres_mojo"].str.contains(pattern, na=False, regex=True)
+
+    names = genre_names(genres)
+    aggregation_stats_per_genre = {
+        'num_movies': [data[genre].sum() for genre in names],
+        'avg_gross': [round(data[data[genre]][gross_column].mean() / 1000000, 1) for genre in names],
+        'median_gross': [round(data[data[genre]][gross_column].median() / 1000000, 1) for genre in names],
+        'all_time_gross': [round(data[data[genre]][gross_column].sum() / 1000000, 1) for genre in names],
+        'avg_budget': [round(data[data[genre]]['budget_adj'].mean() / 1000000, 1) for genre in names],
+        'median_budget': [round(data[data[genre]]['budget_adj'].median() / 1000000, 1) for genre in names],
+        'all_time_budget': [round(data[data[genre]]['budget_adj'].sum() / 1000000, 1) for genre in names],
+        'dollars_earned_for_dollars_spent': [round((data[data[genre]][gross_column].sum() / 2000000) / (1.5 * data[data[genre]]['budget_adj'].sum() / 1000000), 1) for genre in names],
+        'median_dollars_earned_for_dollars_spent': [round((data[data[genre]][gross_column].median() / 2000000) / (1.5 * data[data[genre]]['budget_adj'].median() / 1000000), 1) for genre in names],
+        'mean_dollars_earned_for_dollars_spent': [round((data[data[genre]][gross_column].mean() / 2000000) / (1.5 * data[data[genre]]['budget_adj'].mean() / 1000000), 1) for genre in names]
+    }
+
+    return pd.DataFrame(aggregation_stats_per_genre, index=names)
+
+# A random frame of movies with Box Office Mojo genre strings, grosses, budgets (some missing) and release years
+def make_movies(rows, random_state):
+    labels = ["Action", "Adventure", "Comedy", "Drama", "Horror", "Thriller", "Suspense", "Sci-Fi", "Family", "Romance", "Western", "Musical"]
+    combinations = [" ".join(random_state.choice(labels, size=random_state.randint(1, 4), replace=False)) for _ in range(300)]
+
+    genres_mojo = pd.Series(np.array(combinations + [None], dtype="object")[random_state.randint(0, len(combinations) + 1, size=rows)])
+    budgets = pd.array(random_state.randint(1, 300, size=rows) * 1000000, dtype="Int64")
+    budgets[random_state.rand(rows) < 0.3] = pd.NA
+
+    return pd.DataFrame({
+        "genres_mojo": genres_mojo.astype("str").where(genres_mojo.notna()),
+        "worldwide_adj": pd.array(random_state.randint(1, 2 * 10 ** 9, size=rows), dtype="Int64"),
+        "budget_adj": budgets,
+        "release_decade": random_state.randint(1910, 2020, size=rows) // 10 * 10,
+    })
+
+# Time the genre index against the notebooks' approach (tests/test_genre_index.py checks they agree)
+# Usage: python genre_index.py [number of movies]
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    data = make_movies(rows, np.random.RandomState(0))
+
+    t0 = time.perf_counter()
+    summary_with_filtering(data.copy(), "worldwide_adj", GENRES)
+    t1 = time.perf_counter()
+    masks = genre_masks(data["genres_mojo"])
+    index = genre_index(masks)
+    result = genre_summary(data, masks, "worldwide_adj", index=index)
+    t2 = time.perf_counter()
+
+    print("{:,} movies: filtering {:.2f} s, genre index {:.3f} s ({:.0f}x)".format(rows, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)))
+    print(result)
+    print(genre_stats(data, masks, ["worldwide_adj"], by=["release_decade"], statistics=("count", "mean"), index=index).head(12))
@@ -0,0 +1,106 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import os
+import re
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Groups the distributors listed on Box Office Mojo under their current Big Five studio owner.
+# The distributor names that belong to each studio are kept in `studio_mapping.csv`, one regular expression per row
+# (https://en.wikipedia.org/wiki/Major_film_studio#Past). Each distinct distributor is classified once,
+# and the result is spread back over the movies through the codes of a categorical column.
+
+MAPPING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "studio_mapping.csv")
+
+
+# The studios in the order of the mapping file, each with one compiled pattern made of all its rows.
+# When a distributor matches more than one studio, the studio listed last wins (e.g. "United International Pictures" is Paramount, not Universal).
+def read_studio_mapping(path=MAPPING_PATH):
+    mapping = pd.read_csv(path, dtype="str", keep_default_na=False)
+
+    studios = []
+    for studio, rows in mapping.groupby("studio", sort=False):
+        studios.append((studio, re.compile("|".join(rows["pattern"]))))
+
+    return studios
+
+# Studio of a single distributor name, or None if it isn't one of the studios
+def classify_distributor(distributor, studios):
+    if not isinstance(distributor, str):
+        return None
+
+    for studio, pattern in reversed(studios):
+        if pattern.search(distributor):
+            return studio
+
+    return None
+
+# Studio of every movie as a categorical column (missing for the distributors outside the studios).
+# The patterns only run once per distinct distributor, not once per movie.
+def classify_distributors(distributors, studios=None):
+    if studios is None:
+        studios = read_studio_mapping()
+
+    distributors = pd.Series(distributors)
+    codes, uniques = pd.factorize(distributors)
+
+    # Code of each distinct distributor's studio (-1 for none). The extra -1 at the end is picked up by the missing distributors, whose code is -1.
+    names = [studio for studio, _ in studios]
+    studio_codes = np.array([-1 if studio is None else names.index(studio) for studio in (classify_distributor(distributor, studios) for distributor in uniques)] + [-1])
+
+    return pd.Series(pd.Categorical.from_codes(studio_codes[codes], categories=names), index=distributors.index, name="distributor")
+
+# Number of movies of each distributor that was put under a studio, to check the mapping
+def studio_report(distributors, classified):
+    frame = pd.DataFrame({"studio": classified, "distributor_mojo": distributors})
+    report = frame[frame["studio"].notna()].groupby(["studio", "distributor_mojo"], observed=True).size()
+
+    return report.rename("movies").sort_values(ascending=False).sort_index(level="studio", sort_remaining=False)
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# The notebooks' approach: one `str.contains` pass per studio, then one `.loc` assignment per studio
+def classify_with_contains(distributors, studios):
+    result = pd.Series(np.nan, index=distributors.index, dtype="object")
+
+    for studio, pattern in studios:
+        result.loc[distributors.str.contains(pattern.pattern, na=False, regex=True)] = studio
+
+    return result
+
+# Every pattern written out as a distributor name, plus names that match nothing and combined names that match two studios,
+# picked at random for `rows` movies
+def make_distributors(rows, studios, random_state):
+    names = [pattern.replace("$", "").replace("^", "") for _, compiled in studios for pattern in compiled.pattern.split("|")]
+    names += ["Independent Pictures {}".format(number) for number in range(500)] + ["United International Pictures", "Foxtrot", None]
+
+    return pd.Series(np.array(names, dtype="object")[random_state.randint(0, len(names), size=rows)])
+
+# Time the classifier against the notebooks' approach (tests/test_studio_classifier.py checks they agree)
+# Usage: python studio_classifier.py [number of movies]
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    studios = read_studio_mapping()
+    distributors = make_distributors(rows, studios, np.random.RandomState(0))
+
+    t0 = time.perf_counter()
+    classify_with_contains(distributors, studios)
+    t1 = time.perf_counter()
+    result = classify_distributors(distributors, studios)
+    t2 = time.perf_counter()
+
+    print("{:,} movies, {:,} distributors: str.contains {:.2f} s, classifier {:.3f} s ({:.0f}x)".format(
+        rows, distributors.nunique(), t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)
+    ))
+    print(result.value_counts())
@@ -0,0 +1,216 @@
+############################################################
+# STEP 1: IMPORT ALL NEEDED LIBRARIES
+############################################################
+
+# Import general libraries
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+import pandas as pd
+import numpy as np
+
+from random_functions_for_graphing import bar_and_line_chart, reindex_decades
+
+############################################################
+# STEP 2: DEFINE ALL FUNCTIONS NEEDED
+############################################################
+
+# Writes a batch of report charts to disk as PNG files, drawing them in worker processes with matplotlib's
+# non-interactive Agg backend. A chart is (file name, drawing function, keyword arguments): the function draws one figure
+# from the arguments and returns it, and has to live in a module (not a notebook) so it can be sent to the workers.
+# Each chart's key is a hash of the function's code, the resolution and the data it is drawn from, and the keys of the last batch are kept
+# in a manifest next to the images, so a chart whose data hasn't changed is not drawn again.
+
+# Bump when the way the charts look changes outside the drawing functions' module (e.g. a new matplotlib style), to draw them all again
+RENDERER_VERSION = 1
+MANIFEST_NAME = "charts.json"
+
+
+# Feed a chart argument to a hash. Series and frames are hashed by their values, index, columns and types,
+# so two equal tables give the same key no matter how they were built.
+def update_digest(digest, value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        digest.update(type(value).__name__.encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        digest.update(repr(value.dtypes.tolist() if isinstance(value, pd.DataFrame) else value.dtype).encode())
+        digest.update(repr(list(value.index)).encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            update_digest(digest, key)
+            update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple, range)):
+        digest.update("{}:{}".format(type(value).__name__, len(value)).encode())
+        for item in value:
+            update_digest(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+# Key of a chart: what it is drawn with, at what resolution, and what it is drawn from.
+# The source of the function's whole module is hashed, so editing the function or a helper it calls next to it draws the chart again.
+def chart_key(function, arguments, dpi):
+    digest = hashlib.sha256()
+    update_digest(digest, (RENDERER_VERSION, function.__module__, function.__qualname__, dpi))
+    update_digest(digest, inspect.getsource(inspect.getmodule(function)))
+    update_digest(digest, arguments)
+
+    return digest.hexdigest()
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as input_file:
+        return json.load(input_file)
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+
+    with open(temporary_path, "w") as output_file:
+        json.dump(manifest, output_file, indent=1, sort_keys=True)
+
+    os.replace(temporary_path, path)
+
+# Every worker draws with Agg, whatever backend the notebook that started it uses
+def use_agg_backend():
+    import matplotlib
+    matplotlib.use("Agg")
+
+# Draw one chart and save it (module-level so it can be sent to worker processes)
+# The image is written next to its final name and moved into place, so a stopped batch never leaves half an image behind.
+def render_chart(directory, file_name, function, arguments, dpi):
+    import matplotlib.pyplot as plt
+
+    path = os.path.join(directory, file_name)
+    temporary_path = "{}.{}.tmp.png".format(path, os.getpid())
+
+    figure = function(**arguments)
+    try:
+        figure.savefig(temporary_path, dpi=dpi, bbox_inches="tight")
+    finally:
+        plt.close(figure)
+
+    os.replace(temporary_path, path)
+    return file_name
+
+# Draw the charts whose key changed (or whose image is missing) into `directory`, in parallel, and update the manifest.
+# Returns the file names that were drawn and the ones that were skipped.
+def render_charts(charts, directory="charts", processes=None, dpi=100, force=False):
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+
+    keys = {file_name: chart_key(function, arguments, dpi) for file_name, function, arguments in charts}
+    stale = [
+        (file_name, function, arguments) for file_name, function, arguments in charts
+        if force or manifest.get(file_name) != keys[file_name] or not os.path.exists(os.path.join(directory, file_name))
+    ]
+    skipped = [file_name for file_name, _, _ in charts if file_name not in {name for name, _, _ in stale}]
+
+    rendered = []
+    if stale:
+        with ProcessPoolExecutor(min(processes or cpu_count(), len(stale)), initializer=use_agg_backend) as executor:
+            futures = [executor.submit(render_chart, directory, file_name, function, arguments, dpi) for file_name, function, arguments in stale]
+
+            # Record the charts that were drawn even if another one failed, then report the failure
+            try:
+                for future in futures:
+                    rendered.append(future.result())
+            finally:
+                manifest.update({file_name: keys[file_name] for file_name in rendered})
+                write_manifest(directory, manifest)
+
+    return rendered, skipped
+
+# One bar and line chart per separator (genre, studio, ...) and decade, like `multiple_bar_and_line_charts`, as a batch for `render_charts`
+# `grouped_data` and `grouped_count_data` are series indexed by (separator, decade). Files are named `file_name.format(separator)`.
+def decade_charts(grouped_data, grouped_count_data, separators, colors, file_name, figtitle, axis1_ylabel, axis2_ylabel, figsize=(24, 5)):
+    grp = reindex_decades(grouped_data.unstack(0)).reindex(columns=separators, fill_value=0)
+    grp_counts = reindex_decades(grouped_count_data.unstack(0)).reindex(columns=separators, fill_value=0)
+
+    return [
+        (file_name.format(str(separator).lower().replace(" ", "_").replace(".", "")), bar_and_line_chart, {
+            "grouped_series_data": grp[separator],
+            "grouped_series_count_data": grp_counts[separator],
+            "figsize": figsize,
+            "color": color,
+            "figtitle": "{} - {}".format(figtitle, separator),
+            "axis1_ylabel": axis1_ylabel,
+            "axis1_legend_text": str(separator),
+            "axis2_ylabel": axis2_ylabel,
+            "axis2_legend_text": "counts",
+        })
+        for separator, color in zip(separators, colors)
+    ]
+
+#############################################################
+# STEP 3: MAIN PROGRAM
+#############################################################
+
+# The helpers' old way of filling in the missing decades, kept here for the tests of `reindex_decades`
+def fill_decades_with_loop(grp):
+    grp = grp.copy()
+
+    for decade in range(1910, 2020, 10):
+        if decade not in grp.index:
+            grp.loc[decade] = 0
+
+    grp.sort_index(ascending=True, inplace=True)
+    return grp
+
+# Draw the per-genre and per-studio decade charts of random movies one at a time in this process, then as a batch,
+# then as a batch again with nothing changed and at a higher resolution
+# Usage: python chart_renderer.py [directory] [number of movies]
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    use_agg_backend()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "3. Data Analysis and Visualization"))
+    from aggregate_cube import AggregateCube, make_movies
+    from genre_index import genre_names
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), "charts")
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 6000
+
+    data = make_movies(rows, np.random.RandomState(0))
+    data = data[data["release_year"] >= 1935]
+    cube = AggregateCube(["worldwide_adj"]).add(data)
+
+    by_genre = cube.rollup(["genre", "release_decade"])
+    by_studio = cube.rollup(["studio", "release_decade"])
+    colors = ["b", "g", "r", "c", "m", "y", "k"]
+
+    charts = decade_charts(by_genre["worldwide_adj_mean"] / 1000000, by_genre["worldwide_adj_count"], genre_names(), colors, "genre_{}_by_decade.png",
+                           "Mean Worldwide Gross By Decade", "Worldwide Gross In Millions", "Number of Movies")
+    charts += decade_charts(by_studio["worldwide_adj_mean"] / 1000000, by_studio["worldwide_adj_count"], sorted(data["distributor"].dropna().unique()), colors, "studio_{}_by_decade.png",
+                            "Mean Worldwide Gross By Decade", "Worldwide Gross In Millions", "Number of Movies")
+
+    one_at_a_time = os.path.join(tempfile.mkdtemp(), "charts")
+    os.makedirs(one_at_a_time)
+    t0 = time.perf_counter()
+    for file_name, function, arguments in charts:
+        render_chart(one_at_a_time, file_name, function, arguments, 100)
+    t1 = time.perf_counter()
+    rendered, skipped = render_charts(charts, directory, force=True)
+    t2 = time.perf_counter()
+    rendered_again, skipped_again = render_charts(charts, directory)
+    t3 = time.perf_counter()
+    rendered_sharper, _ = render_charts(charts, directory, dpi=200)
+    shutil.rmtree(one_at_a_time)
+
+    print("{} charts: one at a time {:.2f} s, batch of {} workers {:.2f} s, batch again {:.3f} s ({} drawn, {} skipped)".format(
+        len(charts), t1 - t0, min(cpu_count(), len(charts)), t2 - t1, t3 - t2, len(rendered_again), len(skipped_again)
+    ))
+    print("at a higher dpi: {} of {} charts drawn again".format(len(rendered_sharper), len(charts)))
+    print("charts in {}".format(directory))
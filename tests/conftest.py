@@ -0,0 +1,8 @@
+# The modules of every stage import each other by name, like the scripts do when they are run from their own folder
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+for folder in ["1. Data Extraction", "2. Data Cleaning", "3. Data Analysis and Visualization", "4. Miscellaneous"]:
+    sys.path.insert(0, os.path.join(ROOT, folder))
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import genre_index
+from aggregate_cube import AggregateCube, make_movies, stats_with_filtering, CUBE_KEYS, GENRES, SKETCH_ACCURACY
+
+VALUE_COLUMNS = ["worldwide_adj", "budget_adj"]
+BREAKEVEN = [("worldwide_adj", "budget_adj")]
+EXACT_COLUMNS = ["worldwide_adj_count", "worldwide_adj_mean", "budget_adj_mean", "worldwide_adj_breakeven_count", "worldwide_adj_breakeven"]
+
+
+@pytest.fixture(scope="module")
+def data():
+    return make_movies(20000, np.random.RandomState(0))
+
+
+@pytest.fixture(scope="module")
+def cube(data):
+    return AggregateCube(VALUE_COLUMNS, BREAKEVEN).add(data)
+
+
+@pytest.mark.parametrize("by, filters", [(["release_decade"], None), (["release_week"], None), (["release_year"], {"release_decade": [2010]})])
+def test_rollups_match_filtering_the_movies(data, cube, by, filters):
+    movies = data[data["release_decade"].isin(filters["release_decade"])] if filters else data
+    expected = stats_with_filtering(movies, by, GENRES)
+
+    result = cube.rollup(["genre"] + by, filters).reindex(expected.index)
+
+    for column in EXACT_COLUMNS:
+        np.testing.assert_allclose(result[column].astype("float64"), expected[column].astype("float64"), rtol=1e-12, equal_nan=True)
+
+    # The medians come from the sketches, which are accurate to SKETCH_ACCURACY
+    assert np.nanmax(np.abs(result["worldwide_adj_median"] / expected["worldwide_adj_median"] - 1)) <= SKETCH_ACCURACY
+
+
+def test_adding_movies_gives_the_same_cube_as_a_full_build(data, cube):
+    split = len(data) * 9 // 10
+    incremental = AggregateCube(VALUE_COLUMNS, BREAKEVEN).add(data.iloc[:split])
+    incremental.add(data.iloc[split:])
+
+    pd.testing.assert_frame_equal(incremental.rollup(CUBE_KEYS), cube.rollup(CUBE_KEYS))
+
+
+def test_saved_cube_reads_back_the_same(cube, tmp_path):
+    directory = str(tmp_path / "aggregate_cube")
+    cube.write(directory)
+
+    pd.testing.assert_frame_equal(AggregateCube.read(directory).rollup(CUBE_KEYS), cube.rollup(CUBE_KEYS))
+
+    # The materialized rollups are the same as adding up the cells (their genre labels come back from Arrow as plain objects)
+    for by, filters in [(["genre", "release_decade"], None), (["genre", "release_year"], {"release_decade": [2010]})]:
+        pd.testing.assert_frame_equal(AggregateCube.read(directory).rollup(by, filters), cube.compute_rollup(by, filters), check_index_type=False)
+
+
+def test_summary_table_matches_the_genre_index(data, cube):
+    expected = genre_index.genre_summary(data, genre_index.genre_masks(data["genres_mojo"]), "worldwide_adj")
+    result = cube.genre_summary("worldwide_adj")
+
+    exact_columns = [column for column in expected if "median" not in column]
+    pd.testing.assert_frame_equal(result[exact_columns], expected[exact_columns])
+
+
+def test_breakeven_counts_movies_without_a_budget(cube):
+    movies = pd.DataFrame({
+        "genres_mojo": ["Action", "Action", "Action"],
+        "worldwide_adj": pd.array([300, 100, 500], dtype="Int64"),
+        "budget_adj": pd.array([100, 100, None], dtype="Int64"),
+        "release_year": [2001, 2001, 2001],
+        "release_decade": [2000, 2000, 2000],
+        "release_week": pd.array([1, 1, 1], dtype="Int64"),
+        "distributor": ["Universal", "Universal", "Universal"],
+    })
+
+    ranks = AggregateCube(VALUE_COLUMNS, BREAKEVEN).add(movies).rank_genres("worldwide_adj_breakeven_percent")
+
+    assert ranks["action"] == pytest.approx(100 / 3)
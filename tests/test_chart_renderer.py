@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+from chart_renderer import chart_key, decade_charts, fill_decades_with_loop, read_manifest, render_charts
+from random_functions_for_graphing import bar_and_line_chart, reindex_decades
+
+
+@pytest.fixture
+def charts():
+    index = pd.MultiIndex.from_tuples([("drama", 1950), ("drama", 1990), ("horror", 1970), ("horror", 2010)], names=["genre", "release_decade"])
+    means = pd.Series([1.5, 2.0, 3.0, 4.5], index=index)
+    counts = pd.Series([3, 4, 5, 6], index=index)
+
+    return decade_charts(means, counts, ["drama", "horror"], ["b", "g"], "genre_{}_by_decade.png", "Mean", "Gross", "Movies", figsize=(4, 2))
+
+
+def test_reindex_decades_matches_the_loop():
+    series = pd.Series([1.0, 2.0, 3.0], index=pd.Index([1990, 1950, 2010], name="release_decade"))
+
+    pd.testing.assert_series_equal(reindex_decades(series), fill_decades_with_loop(series))
+    assert reindex_decades(series).index.tolist() == list(range(1910, 2020, 10))
+
+
+def test_decade_charts(charts):
+    assert [file_name for file_name, _, _ in charts] == ["genre_drama_by_decade.png", "genre_horror_by_decade.png"]
+    assert charts[0][2]["grouped_series_data"].loc[1950] == 1.5
+    assert charts[0][2]["grouped_series_data"].loc[1930] == 0
+
+
+def test_equal_tables_give_the_same_key():
+    built = pd.Series([1.0, 2.0], index=[1950, 1960])
+    rebuilt = pd.Series({1950: 1.0, 1960: 2.0})
+
+    assert chart_key(bar_and_line_chart, {"data": built}, 100) == chart_key(bar_and_line_chart, {"data": rebuilt}, 100)
+    assert chart_key(bar_and_line_chart, {"data": built}, 100) != chart_key(bar_and_line_chart, {"data": built * 2}, 100)
+    assert chart_key(bar_and_line_chart, {"data": built}, 100) != chart_key(bar_and_line_chart, {"data": built}, 200)
+
+
+def test_only_changed_charts_are_drawn_again(charts, tmp_path):
+    directory = str(tmp_path / "charts")
+    names = [file_name for file_name, _, _ in charts]
+
+    assert render_charts(charts, directory, processes=2) == (names, [])
+    assert sorted(read_manifest(directory)) == names
+    assert all(os.path.getsize(os.path.join(directory, file_name)) > 0 for file_name in names)
+
+    # Nothing changed
+    assert render_charts(charts, directory, processes=2) == ([], names)
+
+    # One chart's data changed, and the other chart's image was deleted
+    changed = [(file_name, function, dict(arguments)) for file_name, function, arguments in charts]
+    changed[0][2]["grouped_series_data"] = changed[0][2]["grouped_series_data"] * 2
+    os.remove(os.path.join(directory, names[1]))
+    assert sorted(render_charts(changed, directory, processes=2)[0]) == names
+
+    # A new resolution draws every chart again
+    assert render_charts(changed, directory, processes=2, dpi=50) == (names, [])
+    assert not [file_name for file_name in os.listdir(directory) if file_name.endswith(".tmp.png")]
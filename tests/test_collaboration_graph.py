@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from collaboration_graph import CollaborationGraph, collaborators_with_self_join, concatenated_ranges, make_values
+from people_store import CreditTable, make_credits
+
+
+@pytest.fixture(scope="module")
+def credits_and_values():
+    movies = 2000
+    random_state = np.random.RandomState(0)
+    all_credits = make_credits(movies, random_state)
+    values = make_values(movies, random_state)
+
+    credits = CreditTable()
+    for movie_id, movie_credits in enumerate(all_credits):
+        credits.add_movie(movie_id, movie_credits)
+
+    return credits.build(), values
+
+
+@pytest.fixture(scope="module")
+def graph(credits_and_values):
+    return CollaborationGraph(*credits_and_values)
+
+
+@pytest.fixture(scope="module")
+def frame(credits_and_values):
+    return credits_and_values[0].to_frame()
+
+
+def movies_in_role(frame, name, role):
+    return frame.loc[(frame["name"] == name) & (frame["role"] == role), "movie_id"].unique()
+
+
+def test_concatenated_ranges():
+    assert concatenated_ranges(np.array([3, 10, 0]), np.array([5, 10, 2])).tolist() == [3, 4, 0, 1]
+    assert concatenated_ranges(np.array([1]), np.array([1])).tolist() == []
+
+
+@pytest.mark.parametrize("person_id", [0, 10, 1000])
+def test_neighbors_match_a_self_join_of_the_credits(credits_and_values, graph, frame, person_id):
+    name = credits_and_values[0].persons.names[person_id]
+
+    neighbors = graph.neighbors(name).set_index("name").sort_index()
+    expected = collaborators_with_self_join(frame[["movie_id", "name"]], credits_and_values[1], name).rename_axis("name").sort_index()
+
+    assert neighbors.index.equals(expected.index)
+    assert neighbors["films"].tolist() == expected["films"].tolist()
+    np.testing.assert_allclose(neighbors["worldwide_adj"], expected["worldwide_adj"])
+
+
+def test_top_collaborators(credits_and_values, graph):
+    name = credits_and_values[0].persons.names[0]
+    neighbors = graph.neighbors(name)
+
+    top = graph.top_collaborators(name, k=5)
+
+    assert len(top) == 5
+    assert top["films"].tolist() == sorted(neighbors["films"], reverse=True)[:5]
+    assert top["films"].is_monotonic_decreasing
+
+
+def test_movies_of(credits_and_values, graph, frame):
+    name = credits_and_values[0].persons.names[10]
+
+    assert graph.movies_of(name).tolist() == sorted(frame.loc[frame["name"] == name, "movie_id"].unique())
+
+    with pytest.raises(KeyError):
+        graph.movies_of("Nobody")
+
+
+def test_pairing_and_partner_stats_match_filtering_the_credits(credits_and_values, graph, frame):
+    values = credits_and_values[1]
+    director = frame.loc[frame["role"] == "director", "name"].value_counts().index[0]
+
+    partners = graph.partner_stats(director, "actor", role="director", min_films=2, k=5)
+    assert len(partners) > 0
+    assert (partners["films"] >= 2).all()
+    assert partners["worldwide_adj_mean"].is_monotonic_decreasing
+
+    for actor, films, mean in zip(partners["name"], partners["films"], partners["worldwide_adj_mean"]):
+        together = np.intersect1d(movies_in_role(frame, director, "director"), movies_in_role(frame, actor, "actor"))
+        pairing = graph.pairing_stats(director, actor, "director", "actor")
+
+        assert films == len(together)
+        assert pairing["films"] == len(together)
+        assert pairing["worldwide_adj_mean"] == pytest.approx(values.iloc[together]["worldwide_adj"].mean())
+        assert mean == pytest.approx(pairing["worldwide_adj_mean"])
+
+        known = values.iloc[together].dropna(subset=["worldwide_adj", "budget_adj"])
+        if len(known):
+            assert pairing["roi"] == pytest.approx(known["worldwide_adj"].sum() / known["budget_adj"].sum())
+
+
+def test_movies_without_values_weigh_nothing():
+    credits = CreditTable()
+    credits.add_movie(0, [["director", "Ann Lee"], ["actor", "Bo Kim"]])
+    credits.add_movie(1, [["director", "Ann Lee"], ["actor", "Bo Kim"]])
+    values = pd.DataFrame({"worldwide_adj": [100.0, np.nan], "budget_adj": [50.0, 10.0]})
+
+    graph = CollaborationGraph(credits, values)
+
+    assert graph.neighbors("Ann Lee").to_dict("records") == [{"name": "Bo Kim", "films": 2, "worldwide_adj": 100.0}]
+    assert graph.pairing_stats("Ann Lee", "Bo Kim")["roi"] == 2.0
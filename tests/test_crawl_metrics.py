@@ -0,0 +1,111 @@
+import json
+import multiprocessing
+
+import crawl_metrics
+from crawl_metrics import CrawlMetrics, LATENCY_BUCKETS, init_metrics, measure_parse, prometheus_text
+
+
+# A pool task: a request to one of two hosts followed by a parse, recorded into the metrics the pool was started with
+def record_page(number):
+    url = "https://www.{}/page/{}".format("boxofficemojo.com" if number % 3 else "the-numbers.com", number)
+
+    with crawl_metrics.metrics.task():
+        crawl_metrics.metrics.observe_request(url, 0.01 * (number % 20), size=1000, retries=number % 7 == 0, failed=number % 50 == 0)
+        crawl_metrics.metrics.parse(lambda html: 0 if number % 25 == 0 else len(html), "x" * 100)
+
+    return number
+
+
+def test_counters_are_shared_by_pool_workers():
+    pages = 200
+    metrics = CrawlMetrics(["boxofficemojo.com", "the-numbers.com"])
+
+    with metrics.stage("crawl"):
+        with multiprocessing.Pool(3, initializer=init_metrics, initargs=(metrics,)) as pool:
+            pool.map(record_page, range(pages), chunksize=8)
+
+    snapshot = metrics.snapshot()
+    hosts = snapshot["hosts"]
+
+    assert hosts["the-numbers.com"]["requests"] == sum(number % 3 == 0 for number in range(pages))
+    assert hosts["boxofficemojo.com"]["requests"] == sum(number % 3 != 0 for number in range(pages))
+    assert sum(stats["requests"] for stats in hosts.values()) == pages
+    assert sum(stats["failed_requests"] for stats in hosts.values()) == sum(number % 50 == 0 for number in range(pages))
+    assert sum(stats["retries"] for stats in hosts.values()) == sum(number % 7 == 0 for number in range(pages))
+    assert sum(stats["bytes"] for stats in hosts.values()) == 1000 * pages
+    assert sum(sum(stats["latency_buckets"]) for stats in hosts.values()) == pages
+
+    assert snapshot["parse"]["pages"] == pages
+    assert snapshot["parse"]["failed_pages"] == sum(number % 25 == 0 for number in range(pages))
+
+    assert 1 <= len(snapshot["workers"]) <= 3
+    assert sum(stats["tasks"] for stats in snapshot["workers"].values()) == pages
+    assert all(0 < stats["utilization"] <= 1 for stats in snapshot["workers"].values())
+
+    assert snapshot["stages"]["crawl"] > 0
+
+
+def test_latencies_go_in_the_first_bucket_they_fit():
+    metrics = CrawlMetrics()
+    for seconds in [0.01, LATENCY_BUCKETS[0], 0.3, 1000]:
+        metrics.observe_request("https://example.com/", seconds)
+
+    buckets = metrics.snapshot()["hosts"]["*"]["latency_buckets"]
+    assert buckets[0] == 2
+    assert buckets[LATENCY_BUCKETS.index(0.5)] == 1
+    assert buckets[-1] == 1
+
+
+def test_unknown_hosts_are_counted_under_the_default_host():
+    metrics = CrawlMetrics(["boxofficemojo.com"])
+    metrics.observe_request("https://boxofficemojo.com/movies/", 0.1)
+    metrics.observe_request("https://example.com/", 0.1)
+
+    assert {host: stats["requests"] for host, stats in metrics.snapshot()["hosts"].items()} == {"boxofficemojo.com": 1, "*": 1}
+
+
+def test_repeated_stages_add_up():
+    metrics = CrawlMetrics()
+    metrics.stages["load"] = 1.0
+    with metrics.stage("load"):
+        pass
+
+    assert metrics.snapshot()["stages"]["load"] >= 1.0
+
+
+def test_write_json_and_prometheus(tmp_path):
+    metrics = CrawlMetrics(["boxofficemojo.com"])
+    for seconds in [0.01, 0.2, 3]:
+        metrics.observe_request("https://www.boxofficemojo.com/movies/", seconds, size=10)
+    metrics.parse(len, "<html></html>")
+
+    metrics.write(str(tmp_path / "metrics.json"))
+    metrics.write(str(tmp_path / "metrics.prom"))
+
+    with open(tmp_path / "metrics.json") as input_file:
+        written = json.load(input_file)
+    assert written["hosts"]["boxofficemojo.com"]["requests"] == 3
+    assert written["hosts"]["boxofficemojo.com"]["bytes"] == 30
+
+    prometheus = (tmp_path / "metrics.prom").read_text()
+    assert 'crawl_request_latency_seconds_bucket{host="boxofficemojo.com",le="+Inf"} 3' in prometheus
+    assert 'crawl_request_latency_seconds_count{host="boxofficemojo.com"} 3' in prometheus
+    assert 'crawl_bytes_total{host="boxofficemojo.com"} 30' in prometheus
+    assert "crawl_parse_seconds_count 1" in prometheus
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = CrawlMetrics()
+    for seconds in [0.01, 0.01, 0.2, 20]:
+        metrics.observe_request("https://example.com/", seconds)
+
+    counts = [int(line.rsplit(" ", 1)[1]) for line in prometheus_text(metrics.snapshot()).splitlines() if line.startswith("crawl_request_latency_seconds_bucket")]
+    assert counts == sorted(counts)
+    assert counts[0] == 2
+    assert counts[-1] == 4
+
+
+def test_measure_parse_without_metrics():
+    init_metrics(None)
+    assert measure_parse(len, "abc") == 3
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from duplicates import make_outer_merged, resolve_consecutive_year_duplicates, resolve_with_loops
+
+MOJO_COLUMNS = ["title", "release_year", "release_date_mojo", "domestic_gross_mojo"]
+NUMBERS_COLUMNS = ["title", "release_year", "release_date_numbers", "production_budget_numbers"]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_rows_as_the_notebook_loops(seed):
+    frame = make_outer_merged(1500, np.random.RandomState(seed))
+
+    result = resolve_consecutive_year_duplicates(frame, MOJO_COLUMNS, NUMBERS_COLUMNS)
+
+    pd.testing.assert_frame_equal(result, resolve_with_loops(frame, MOJO_COLUMNS, NUMBERS_COLUMNS))
+    assert len(result) < len(frame)
+
+
+def test_consecutive_years_are_combined():
+    frame = pd.DataFrame({
+        "title": ["a", "a", "b", "b", "c"],
+        "release_year": pd.array([2001, 2000, 1990, 1995, 2000], dtype="Int64"),
+        "release_date_mojo": pd.to_datetime([None, "2000-06-01", "1990-01-01", None, "2000-01-01"]),
+        "domestic_gross_mojo": pd.array([None, 5, 7, None, 9], dtype="Int64"),
+        "release_date_numbers": pd.to_datetime(["2001-01-01", None, None, "1995-01-01", None]),
+        "production_budget_numbers": pd.array([100, None, None, 3, None], dtype="Int64"),
+    })
+
+    result = resolve_consecutive_year_duplicates(frame, MOJO_COLUMNS, NUMBERS_COLUMNS)
+
+    # "a" is one movie listed a year apart by the two websites; the two "b" rows are five years apart and stay separate
+    assert result["title"].tolist() == ["a", "b", "b", "c"]
+    assert result.iloc[0][["release_year", "domestic_gross_mojo", "production_budget_numbers"]].tolist() == [2001, 5, 100]
+    assert result.dtypes.equals(frame.dtypes)
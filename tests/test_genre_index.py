@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from genre_index import (
+    genre_columns, genre_counts, genre_index, genre_masks, genre_stats, genre_summary, genre_values, make_movies, summary_with_filtering, GENRES
+)
+
+
+@pytest.fixture(scope="module")
+def data():
+    return make_movies(20000, np.random.RandomState(0))
+
+
+def test_summary_matches_filtering(data):
+    masks = genre_masks(data["genres_mojo"])
+
+    pd.testing.assert_frame_equal(genre_summary(data, masks, "worldwide_adj"), summary_with_filtering(data.copy(), "worldwide_adj", GENRES))
+
+
+def test_stats_by_decade_match_filtering(data):
+    masks = genre_masks(data["genres_mojo"])
+    columns = genre_columns(masks)
+    stats = genre_stats(data, masks, ["worldwide_adj"], by=["release_decade"], statistics=("count", "mean"), index=genre_index(masks))
+
+    for genre in columns.columns:
+        expected = data[columns[genre]].groupby("release_decade")["worldwide_adj"].agg(["count", "mean"])
+        np.testing.assert_allclose(stats.loc[genre].to_numpy(dtype="float64"), expected.to_numpy(dtype="float64"))
+
+
+def test_masks():
+    masks = genre_masks(pd.Series(["Action Comedy", "Suspense", None, "Western", "Action Comedy"]))
+
+    assert masks.dtype == np.uint8
+    assert masks.tolist() == [0b101, 0b100000, 0, 0, 0b101]
+    assert genre_counts(masks).to_dict() == {"action": 2, "adventure": 0, "comedy": 2, "drama": 0, "horror": 0, "thriller_suspense": 1}
+    assert genre_counts(masks, by=["a", "a", "b", "b", "b"])["action"].to_dict() == {"a": 1, "b": 1}
+
+
+def test_values_are_spread_over_the_genres_of_each_movie():
+    masks = genre_masks(pd.Series(["Action Comedy", "Drama"]))
+    values = genre_values(pd.Series([10, 20]), masks, name="gross_{}")
+
+    assert values.loc[0, "gross_action"] == 10
+    assert values.loc[0, "gross_comedy"] == 10
+    assert values.loc[1, "gross_drama"] == 20
+    assert values.notna().sum().sum() == 3
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from normalize import make_benchmarks, parse_date, parse_money, parse_runtime, MOJO_DATE_FORMAT, NUMBERS_DATE_FORMAT
+
+
+@pytest.mark.parametrize("name, values, old_function, new_function", make_benchmarks(5000))
+def test_same_result_as_the_row_by_row_conversions(name, values, old_function, new_function):
+    old = old_function(values)
+    new = new_function(values)
+
+    assert new.index.equals(values.index)
+
+    if name == "release dates":
+        pd.testing.assert_series_equal(new.astype("datetime64[ns]"), old.astype("datetime64[ns]"), check_names=False)
+    else:
+        pd.testing.assert_series_equal(new.astype("float64"), old.astype("float64"), check_names=False)
+
+
+def test_parse_money():
+    values = pd.Series(["$1,234", "$30 million", "$1.5 million", "$2 billion", "N/A", None, "unknown"], index=range(10, 17))
+
+    assert parse_money(values).tolist() == [1234, 30000000, 1500000, 2000000000, pd.NA, pd.NA, pd.NA]
+    assert parse_money(values).dtype == "Int64"
+    assert parse_money(values).index.equals(values.index)
+
+
+def test_parse_runtime():
+    assert parse_runtime(pd.Series(["2 hrs. 4 min.", "1 hrs. 0 min.", "N/A", None, "2 hrs. 4 min."])).tolist() == [124, 60, pd.NA, pd.NA, 124]
+
+
+def test_parse_date_falls_back_to_other_formats():
+    dates = parse_date(pd.Series(["May 3, 2019", "2001-06-20", "N/A", None]), MOJO_DATE_FORMAT)
+
+    assert dates.tolist()[:2] == [pd.Timestamp("2019-05-03"), pd.Timestamp("2001-06-20")]
+    assert dates[2:].isna().all()
+
+
+def test_parse_numbers_dates():
+    assert parse_date(pd.Series(["Jun 20, 2001", "Dec 25, 1999"]), NUMBERS_DATE_FORMAT).tolist() == [pd.Timestamp("2001-06-20"), pd.Timestamp("1999-12-25")]
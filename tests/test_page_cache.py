@@ -0,0 +1,33 @@
+from page_cache import PageCache
+
+
+def test_latest_page_matches_the_url_exactly(tmp_path):
+    cache = PageCache(str(tmp_path / "cache"))
+    url = "https://example.com/movie/budgets_all/101"
+
+    # Urls a LIKE pattern made of `url` would also match: `_` is a wildcard and case is ignored
+    cache.put("https://example.com/movie/budgets-all/101", "other page", fetched_at=30)
+    cache.put("https://example.com/movie/BUDGETS_ALL/101", "other case", fetched_at=40)
+
+    assert cache.latest_page(url) is None
+    assert len(cache.latest_pages(url)) == 2
+
+    cache.put(url, "first", fetched_at=10)
+    cache.put(url, "second", fetched_at=20)
+    cache.put(url, "error page", status=500, fetched_at=50)
+
+    assert cache.get_text(cache.latest_page(url)) == "second"
+
+
+def test_latest_pages_keeps_the_newest_fetch_of_each_url(tmp_path):
+    cache = PageCache(str(tmp_path / "cache"))
+    cache.put("https://example.com/movies/?id=a.htm", "old a", fetched_at=1)
+    cache.put("https://example.com/movies/?id=a.htm", "new a", fetched_at=2)
+    cache.put("https://example.com/movies/?id=b.htm", "b", fetched_at=1)
+    cache.put("https://example.com/people/", "people", fetched_at=1)
+
+    pages = cache.latest_pages("%/movies/?id=%")
+
+    assert [url for url, _ in pages] == ["https://example.com/movies/?id=a.htm", "https://example.com/movies/?id=b.htm"]
+    assert cache.get_text(pages[0][1]) == "new a"
+    assert cache.latest(pages[0][0])["fetched_at"] == 2
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from movie_store import MOJO_COLUMNS
+from people_store import CreditTable, PEOPLE_COLUMNS, make_credits, row_credits, wide_columns
+
+
+@pytest.fixture(scope="module")
+def all_credits():
+    return make_credits(2000, np.random.RandomState(0))
+
+
+@pytest.fixture(scope="module")
+def table(all_credits):
+    table = CreditTable()
+    for movie_id, credits in enumerate(all_credits):
+        table.add_movie(movie_id, credits)
+
+    return table.build()
+
+
+def test_lookups_find_every_film(all_credits, table):
+    films = {}
+    for movie_id, credits in enumerate(all_credits):
+        for _, name in credits:
+            films.setdefault(name, set()).add(movie_id)
+
+    for name, movie_ids in films.items():
+        assert table.films_with(name).tolist() == sorted(movie_ids)
+
+
+def test_lookups_find_every_film_of_the_wide_columns(all_credits, table):
+    wide = wide_columns(all_credits)
+
+    for person_id in [0, 10, 1000, len(table.persons) - 1]:
+        name = table.persons.names[person_id]
+        scanned = np.flatnonzero((wide == name).any(axis=1).to_numpy())
+
+        assert np.isin(scanned, table.films_with(name)).all()
+
+    # The wide columns drop the credits past the first few of each role
+    assert int((wide != "N/A").to_numpy().sum()) < len(table)
+
+
+def test_saved_table_reads_back_the_same(table, tmp_path):
+    table.write(str(tmp_path / "people"))
+    saved = CreditTable.read(str(tmp_path / "people"))
+
+    pd.testing.assert_frame_equal(saved.to_frame(), table.to_frame())
+    assert saved.films_with(table.persons.names[0]).tolist() == table.films_with(table.persons.names[0]).tolist()
+
+
+def test_credits_of_a_movie():
+    table = CreditTable()
+    table.add_movie(0, [["director", "Ann Lee"], ["actor", "Bo Kim"], ["actor", "Ann Lee"], ["actor", "Bo Kim"], ["actor", "Cy Day"]])
+    table.add_movie(2, [["actor", "Cy Day"]])
+
+    assert table.credits_of(0) == [("director", "Ann Lee", 0), ("actor", "Bo Kim", 0), ("actor", "Ann Lee", 1), ("actor", "Cy Day", 2)]
+    assert table.credits_of(1) == []
+    assert table.credits_of(5) == []
+
+    assert table.films_with("Cy Day").tolist() == [0, 2]
+    assert table.films_with("Ann Lee", role="director").tolist() == [0]
+    assert table.films_with("Bo Kim", role="director").tolist() == []
+    assert table.films_with("Nobody").tolist() == []
+
+    # Movies added after a lookup are found by the next one
+    table.add_movie(3, [["composer", "Bo Kim"]])
+    assert table.films_with("Bo Kim").tolist() == [0, 3]
+    assert len(table.persons) == 3
+
+
+def test_row_credits():
+    people = ["N/A"] * len(PEOPLE_COLUMNS)
+    people[0] = "Ann Lee"
+    row = ["x"] * (len(MOJO_COLUMNS) - len(PEOPLE_COLUMNS)) + people
+
+    assert row_credits(row) == [["director", "Ann Lee"]]
+    assert row_credits(row + [[["actor", "Bo Kim"]]]) == [["actor", "Bo Kim"]]
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliation import apply_rule, make_merged, reconcile_sources, reconcile_with_apply
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_same_result_as_the_notebook_row_functions(seed):
+    frame = make_merged(2000, np.random.RandomState(seed))
+
+    pd.testing.assert_frame_equal(reconcile_sources(frame), reconcile_with_apply(frame))
+
+
+def test_rules():
+    frame = pd.DataFrame({
+        "gross_mojo": pd.array([10, None, 3, None], dtype="Int64"),
+        "gross_numbers": pd.array([20, 7, 4, None], dtype="Int64"),
+    })
+
+    assert apply_rule(frame, "gross", "prefer_mojo").astype("Int64").tolist() == [10, 7, 3, pd.NA]
+    assert apply_rule(frame, "gross", "prefer_numbers").astype("Int64").tolist() == [20, 7, 4, pd.NA]
+
+    # Half-way values round to even, like the notebook's `round`
+    assert apply_rule(frame, "gross", "average").astype("Int64").tolist() == [15, 7, 4, pd.NA]
+
+
+@pytest.mark.parametrize("rule", ["prefer_imdb", "median"])
+def test_unknown_rules_are_rejected(rule):
+    frame = pd.DataFrame({"gross_mojo": [1], "gross_numbers": [2]})
+
+    with pytest.raises(ValueError):
+        apply_rule(frame, "gross", rule)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from studio_classifier import classify_distributors, classify_with_contains, make_distributors, read_studio_mapping, studio_report
+
+
+def test_same_result_as_str_contains():
+    studios = read_studio_mapping()
+    distributors = make_distributors(20000, studios, np.random.RandomState(0))
+
+    result = classify_distributors(distributors, studios)
+    expected = classify_with_contains(distributors, studios)
+
+    pd.testing.assert_series_equal(result.astype("object").where(result.notna(), np.nan), expected, check_names=False)
+    assert list(result.cat.categories) == [studio for studio, _ in studios]
+
+
+def test_the_studio_listed_last_wins():
+    result = classify_distributors(pd.Series(["United International Pictures", "Universal", "Focus Features", "Foxtrot", None]))
+
+    assert result.tolist()[:3] == ["Paramount", "Universal", "Universal"]
+    assert result[3:].isna().all()
+
+
+def test_studio_report():
+    distributors = pd.Series(["Universal", "Universal", "Paramount", "Foxtrot"])
+    report = studio_report(distributors, classify_distributors(distributors))
+
+    assert report.to_dict() == {("Paramount", "Paramount"): 1, ("Universal", "Universal"): 2}
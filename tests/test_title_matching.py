@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from title_matching import candidate_pairs, link_titles, make_titles, normalize_titles
+
+
+def test_normalize_titles():
+    titles = pd.Series(["Matrix, The", "The Matrix", "AmÃ©lie", "Amélie", "Fast & Furious", "...", None])
+
+    assert normalize_titles(titles)[:6].tolist() == ["matrix", "matrix", "amelie", "amelie", "fast and furious", "..."]
+    assert pd.isna(normalize_titles(titles)[6])
+
+
+def test_links_titles_written_differently():
+    left = pd.DataFrame({"title": ["The Matrix", "Amélie", "Heat", "Alien"], "release_year": [1999, 2001, 1995, 1979]}, index=[10, 11, 12, 13])
+    right = pd.DataFrame({"title": ["AmÃ©lie", "Matrix, The", "Aliens", "Heat"], "release_year": [2002, 1999, 1986, 1995]}, index=[20, 21, 22, 23])
+
+    links = link_titles(left, right)
+
+    assert sorted(zip(links["left_index"], links["right_index"])) == [(10, 21), (11, 20), (12, 23)]
+    assert links.set_index("left_index")["confidence"].to_dict() == {10: 1.0, 11: 0.95, 12: 1.0}
+
+
+def test_precision_and_recall_on_made_up_titles():
+    rows = 5000
+    left, right = make_titles(rows, np.random.RandomState(0))
+
+    left_keys = pd.DataFrame({"normalized_title": normalize_titles(left["title"]), "release_year": left["release_year"].astype("float64")})
+    right_keys = pd.DataFrame({"normalized_title": normalize_titles(right["title"]).to_numpy(), "release_year": right["release_year"].astype("float64").to_numpy()})
+    candidates, _ = candidate_pairs(left_keys, right_keys)
+
+    links = link_titles(left, right)
+
+    # Titles that appear more than once in the same year can't be told apart, any of them counts as correct
+    true_keys = left["title"].str.lower() + left["release_year"].astype("str")
+    correct = (true_keys.loc[links["left_index"]].to_numpy() == true_keys.loc[links["right_index"]].to_numpy()).sum()
+
+    assert len(candidates) < 0.001 * rows * rows
+    assert correct / len(links) > 0.99
+    assert correct / rows > 0.9
@@ -0,0 +1,131 @@
+import multiprocessing
+
+import pytest
+
+from url_frontier import UrlFrontier, crawl_with_pool, canonical_url, INDEX, PAGE
+
+# A small site paginated like The Numbers' budget table: every index page links to the next three index pages,
+# to its own movie pages, and again to two movie pages of the index page before it (like the letter pages' duplicate links)
+INDEX_PAGES = 12
+MOVIES_PER_PAGE = 10
+
+# Movie pages that fail in the first run
+FLAKY_MOVIES = {7, 42}
+
+
+def site_links(url):
+    number = int(url.rsplit("/", 1)[1])
+
+    links = [("https://www.example.com/index/{}".format(following), INDEX) for following in range(number + 1, min(number + 4, INDEX_PAGES))]
+    links += [("https://example.com/movie/{}".format(number * MOVIES_PER_PAGE + movie), PAGE) for movie in range(MOVIES_PER_PAGE)]
+    links += [("https://WWW.example.com/movie/{}#cast".format(max(number - 1, 0) * MOVIES_PER_PAGE + movie), PAGE) for movie in range(2)]
+
+    return links
+
+
+def scrape_site(url, kind):
+    if kind == INDEX:
+        links = site_links(url)
+        return len(links), links
+
+    # Movie pages return their number plus one, since 0 is a failed page
+    return int(canonical_url(url).rsplit("/", 1)[1]) + 1, []
+
+
+def scrape_site_with_failures(url, kind):
+    result, links = scrape_site(url, kind)
+    if kind == PAGE and result - 1 in FLAKY_MOVIES:
+        return 0, []
+
+    return result, links
+
+
+def crawl(path, scrape_page, pending=None):
+    results = []
+
+    with multiprocessing.Pool(4) as pool:
+        with UrlFrontier(path, batch_size=7) as frontier:
+            frontier.add([("https://www.example.com/index/0", INDEX)])
+            crawl_with_pool(pool, frontier, scrape_page, pending, on_result=lambda url, kind, result: results.append((url, kind, result)), window=4)
+
+    return results
+
+
+def test_canonical_url():
+    assert canonical_url("https://www.BoxOfficeMojo.com/movies/?id=x.htm#top") == canonical_url("https://boxofficemojo.com/movies/?id=x.htm")
+    assert canonical_url("https://boxofficemojo.com/movies/?id=x.htm") != canonical_url("https://boxofficemojo.com/movies/?id=y.htm")
+
+
+def test_add_returns_only_new_links(tmp_path):
+    frontier = UrlFrontier(str(tmp_path / "frontier.jsonl"))
+
+    assert frontier.add([("https://www.example.com/a", PAGE), ("https://example.com/a#x", PAGE), ("https://example.com/b", INDEX)]) == [
+        ("https://www.example.com/a", PAGE), ("https://example.com/b", INDEX)
+    ]
+    assert frontier.add([("https://example.com/a", PAGE)]) == []
+    assert frontier.pending() == [("https://example.com/b", INDEX), ("https://www.example.com/a", PAGE)]
+
+
+def test_crawl_discovers_every_page_through_the_pagination(tmp_path):
+    results = crawl(str(tmp_path / "frontier.jsonl"), scrape_site)
+
+    index_pages = [url for url, kind, _ in results if kind == INDEX]
+    movies = [result for _, kind, result in results if kind == PAGE]
+
+    assert sorted(int(url.rsplit("/", 1)[1]) for url in index_pages) == list(range(INDEX_PAGES))
+    assert sorted(movies) == list(range(1, INDEX_PAGES * MOVIES_PER_PAGE + 1))
+
+
+def test_seen_set_persists_across_runs(tmp_path):
+    path = str(tmp_path / "frontier.jsonl")
+    crawl(path, scrape_site)
+
+    restarted = UrlFrontier(path)
+    assert len(restarted.urls(INDEX)) == INDEX_PAGES
+    assert len(restarted.urls(PAGE)) == INDEX_PAGES * MOVIES_PER_PAGE
+    assert restarted.pending() == []
+
+    # A second run fetches nothing, and known links aren't added again
+    assert crawl(path, scrape_site) == []
+    assert restarted.add(site_links("https://example.com/index/3")) == []
+
+    # Asking for the index again queues only the index pages
+    restarted.refresh(INDEX)
+    assert sorted(kind for _, kind in restarted.pending()) == [INDEX] * INDEX_PAGES
+
+
+def test_failed_pages_stay_pending(tmp_path):
+    path = str(tmp_path / "frontier.jsonl")
+    results = crawl(path, scrape_site_with_failures)
+
+    assert sum(result == 0 for _, _, result in results) == len(FLAKY_MOVIES)
+    assert sorted(canonical_url(url) for url, _ in UrlFrontier(path).pending()) == sorted(canonical_url("https://example.com/movie/{}".format(movie)) for movie in FLAKY_MOVIES)
+
+    # The next run only fetches the pages that failed
+    results = crawl(path, scrape_site)
+    assert sorted(result - 1 for _, _, result in results) == sorted(FLAKY_MOVIES)
+    assert UrlFrontier(path).pending() == []
+
+
+def test_half_written_line_is_skipped(tmp_path):
+    path = tmp_path / "frontier.jsonl"
+    with UrlFrontier(str(path)) as frontier:
+        frontier.add([("https://example.com/a", PAGE), ("https://example.com/b", PAGE)])
+        frontier.mark_done("https://example.com/a")
+
+    with open(path, "a") as seen_file:
+        seen_file.write('{"url": "https://example.com/c", "ki')
+
+    restarted = UrlFrontier(str(path))
+    assert restarted.urls(PAGE) == ["https://example.com/a", "https://example.com/b"]
+    assert restarted.pending() == [("https://example.com/b", PAGE)]
+
+
+@pytest.mark.parametrize("kind", [INDEX, PAGE])
+def test_mark_done_keeps_the_kind(tmp_path, kind):
+    path = str(tmp_path / "frontier.jsonl")
+    with UrlFrontier(path) as frontier:
+        frontier.add([("https://example.com/a", kind)])
+        frontier.mark_done("https://www.example.com/a")
+
+    assert UrlFrontier(path).urls(kind) == ["https://example.com/a"]
@@ -0,0 +1,157 @@
+import os
+import time
+from multiprocessing import Process
+
+from url_frontier import INDEX, PAGE
+from work_queue import WorkQueue, run_worker, DONE, FAILED, LEASED, PENDING
+
+INDEX_PAGES = 10
+MOVIES_PER_PAGE = 20
+
+
+# Scrape function for a fake site: index pages list 20 movie pages, and one movie page in ten fails on its first try.
+# The pages that already failed are marked with files in `marker_directory`, since the tries can happen in different workers.
+def scrape_site(url, kind, marker_directory):
+    time.sleep(0.01)
+    number = int(url.rsplit("/", 1)[1])
+
+    if kind == INDEX:
+        return MOVIES_PER_PAGE, [("https://example.com/movie/{}".format(number * MOVIES_PER_PAGE + movie), PAGE) for movie in range(MOVIES_PER_PAGE)]
+
+    failed_before = os.path.join(marker_directory, str(number))
+    if number % 10 == 0 and not os.path.exists(failed_before):
+        open(failed_before, "w").close()
+        return 0, []
+
+    return [number * 2], []
+
+
+def site_worker(path, marker_directory):
+    run_worker(WorkQueue(path, lease_seconds=1), lambda url, kind: scrape_site(url, kind, marker_directory), poll_seconds=0.1)
+
+
+def test_workers_can_die_and_join_mid_crawl(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    marker_directory = str(tmp_path)
+
+    queue = WorkQueue(path, lease_seconds=1)
+    queue.add(("https://example.com/index/{}".format(number), INDEX) for number in range(INDEX_PAGES))
+
+    processes = [Process(target=site_worker, args=(path, marker_directory)) for _ in range(3)]
+    for process in processes:
+        process.start()
+
+    # One worker leaves without handing back its leases, another joins
+    time.sleep(0.3)
+    processes[0].kill()
+    late = Process(target=site_worker, args=(path, marker_directory))
+    late.start()
+
+    for process in processes[1:] + [late]:
+        process.join(60)
+        assert process.exitcode == 0
+
+    # The killed worker was still crawling
+    processes[0].join()
+    assert processes[0].exitcode < 0
+
+    results = {url: result for url, kind, status, result in queue.tasks() if kind == PAGE and status == DONE}
+    expected = {"https://example.com/movie/{}".format(number): [number * 2] for number in range(INDEX_PAGES * MOVIES_PER_PAGE)}
+
+    assert results == expected
+    assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: INDEX_PAGES * (MOVIES_PER_PAGE + 1), FAILED: 0}
+
+
+def test_links_are_queued_once(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+
+    assert queue.add([("https://www.example.com/a", PAGE), ("https://example.com/a#x", PAGE), ("https://example.com/b", INDEX)]) == 2
+    assert queue.add([("https://example.com/a", PAGE)]) == 0
+
+    # Index pages are handed out first
+    assert queue.lease("worker", 5) == [("https://example.com/b", INDEX), ("https://www.example.com/a", PAGE)]
+
+
+def test_leased_tasks_go_to_one_worker(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.add([("https://example.com/{}".format(number), PAGE) for number in range(3)])
+
+    first = queue.lease("first", 2)
+    second = queue.lease("second", 2)
+
+    assert len(first) == 2
+    assert second == [("https://example.com/2", PAGE)]
+    assert queue.lease("third", 2) == []
+
+    # Only the worker holding the lease can complete a task
+    assert not queue.complete("second", first[0][0], [1])
+    assert queue.complete("first", first[0][0], [1])
+    assert queue.counts() == {PENDING: 0, LEASED: 2, DONE: 1, FAILED: 0}
+
+
+def test_expired_leases_are_handed_out_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=0.1)
+    queue.add([("https://example.com/a", PAGE)])
+
+    assert queue.lease("dead", 1) == [("https://example.com/a", PAGE)]
+    assert queue.lease("alive", 1) == []
+
+    time.sleep(0.2)
+    assert queue.lease("alive", 1) == [("https://example.com/a", PAGE)]
+
+    # The result of the worker that lost the lease is not stored
+    assert not queue.complete("dead", "https://example.com/a", [1])
+    assert queue.complete("alive", "https://example.com/a", [2])
+    assert [result for _, _, _, result in queue.tasks()] == [[2]]
+
+
+def test_tasks_fail_after_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.add([("https://example.com/a", PAGE)])
+
+    for _ in range(2):
+        assert queue.lease("worker", 1) == [("https://example.com/a", PAGE)]
+        assert queue.fail("worker", "https://example.com/a")
+
+    assert queue.lease("worker", 1) == []
+    assert queue.counts()[FAILED] == 1
+    assert queue.finished()
+
+
+def test_released_tasks_keep_their_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=1)
+    queue.add([("https://example.com/a", PAGE)])
+
+    queue.lease("leaving", 1)
+    queue.release("leaving")
+
+    assert queue.counts()[PENDING] == 1
+    assert queue.lease("worker", 1) == [("https://example.com/a", PAGE)]
+
+
+def test_run_worker_stops_when_the_queue_is_finished(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.add([("https://example.com/{}".format(number), PAGE) for number in range(5)])
+
+    def scrape_page(url, kind):
+        number = int(url.rsplit("/", 1)[1])
+        if number == 3:
+            raise ValueError("broken page")
+        return number + 1, []
+
+    assert run_worker(queue, scrape_page, owner="worker", poll_seconds=0.01) == 6
+    assert [(status, result) for _, _, status, result in queue.tasks()] == [
+        (DONE, 1), (DONE, 2), (DONE, 3), (FAILED, None), (DONE, 5)
+    ]
+
+
+def test_options_and_delete(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    queue = WorkQueue(path)
+    queue.set_option("cache_dir", "cache")
+
+    assert WorkQueue(path).option("cache_dir") == "cache"
+    assert WorkQueue(path).option("missing", "default") == "default"
+
+    queue.delete()
+    assert not os.path.exists(path)